@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+import argparse
+import random
+import time
+
+from cls_healthkit import HK_APPLE_DATETIME_FORMAT
+from utils import localize_dates_health_data
+import constants_apple_health_data as hd
+
+
+def strptime_localize(dt: str) -> str:
+    return datetime.strptime(dt, HK_APPLE_DATETIME_FORMAT).astimezone().strftime(HK_APPLE_DATETIME_FORMAT)
+
+
+def strptime_localize_dates(health_data: Dict[str, str]) -> Dict[str, str]:
+    health_data[hd.FIELD_CREATION_DATE] = strptime_localize(health_data[hd.FIELD_CREATION_DATE])
+    health_data[hd.FIELD_START_DATE] = strptime_localize(health_data[hd.FIELD_START_DATE])
+    health_data[hd.FIELD_END_DATE] = strptime_localize(health_data[hd.FIELD_END_DATE])
+    return health_data
+
+
+def heart_rate_rows(count: int, travel_ratio: float) -> List[Dict[str, str]]:
+    """Heart rate samples about every 5 minutes, like an Apple Watch's; travel_ratio of them are
+       recorded in a timezone other than the local one.
+    """
+    random.seed(0)
+    start = datetime(2018, 1, 1).astimezone()
+    other_timezone = timezone(start.utcoffset() + timedelta(hours=3))
+    rows = []
+
+    for i in range(count):
+        sample_date = (start + timedelta(seconds=i * 300 + random.randint(0, 59))).astimezone()
+
+        if random.random() < travel_ratio:
+            sample_date = sample_date.astimezone(other_timezone)
+
+        rows.append({
+            hd.FIELD_TYPE: hd.HK_REC_TYPE_HeartRate,
+            hd.FIELD_CREATION_DATE: (sample_date + timedelta(seconds=random.randint(1, 120))).strftime(
+                HK_APPLE_DATETIME_FORMAT),
+            hd.FIELD_START_DATE: sample_date.strftime(HK_APPLE_DATETIME_FORMAT),
+            hd.FIELD_END_DATE: sample_date.strftime(HK_APPLE_DATETIME_FORMAT),
+            hd.FIELD_VALUE: str(random.randint(50, 180))
+        })
+
+    return rows
+
+
+def timed(label: str, localize, rows: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    start = time.perf_counter()
+    localized = [localize(row.copy()) for row in rows]
+    print(f"{label}: {time.perf_counter() - start:.2f}s")
+    return localized
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog=__file__,
+                                     description='compares the datetime localization of utils.localize_dates_health_data '
+                                                 'with strptime, astimezone and strftime.')
+
+    parser.add_argument('-rows', type=int, default=1000000, help='number of heart rate rows; default is 1000000')
+    parser.add_argument('-travel-ratio', type=float, default=0.05,
+                        help='ratio of the rows that are not in the local timezone; default is 0.05')
+    args = parser.parse_args()
+
+    rows = heart_rate_rows(args.rows, args.travel_ratio)
+    print(f"{len(rows)} heart rate rows")
+
+    expected = timed('strptime/astimezone/strftime', strptime_localize_dates, rows)
+    localized = timed('localize_dates_health_data', localize_dates_health_data, rows)
+    timed('localize_dates_health_data(as_epoch=True)', lambda row: localize_dates_health_data(row, True), rows)
+
+    if localized != expected:
+        raise SystemExit('localize_dates_health_data differs from strptime/astimezone/strftime.')
+
+    print('localized dates are identical')
@@ -0,0 +1,139 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from cls_healthkit import HKRecordFactory
+from cls_sample_summary import DiscreteQuantitySampleSummary
+import constants_apple_health_data as hd
+
+
+@dataclass
+class DataclassHKRecord:
+    """HKRecord before it was backed by a namedtuple, for comparison."""
+    _type: str
+    _unit: str
+    _value: str
+    _source_name: str
+    _source_version: str
+    _device: str
+    _creation_date: str
+    _start_date: str
+    _end_date: str
+
+    @property
+    def type(self):
+        return self._type
+
+    @property
+    def unit(self):
+        return self._unit
+
+    @property
+    def value(self):
+        return self._value
+
+    @property
+    def device(self):
+        return self._device
+
+    @property
+    def start_date(self):
+        return self._start_date
+
+
+class DataclassHKRecordQuantityTypeIdentifier(DataclassHKRecord):
+    def __init__(self, record_type: str, unit: str, value: str, source_name: str, source_version: str, device: str,
+                 creation_date: str, start_date: str, end_date: str):
+        super().__init__(record_type, unit, value, source_name, source_version, device, creation_date, start_date,
+                         end_date)
+        self._value: float = float(self._value)
+
+
+def dataclass_create(attr: Dict[str, str]) -> DataclassHKRecord:
+    return DataclassHKRecordQuantityTypeIdentifier(
+        attr['type'],
+        attr.get('unit', ''),
+        attr.get('value', ''),
+        attr['sourceName'],
+        attr.get('sourceVersion', ''),
+        attr.get('device', ''),
+        attr.get('creationDate', ''),
+        attr['startDate'],
+        attr['endDate']
+    )
+
+
+def heart_rate_rows(count: int) -> List[Dict[str, str]]:
+    """Rows of a heart rate csv file: every field of Fieldnames_Record is present."""
+    random.seed(0)
+    device = '<<HKDevice: 0x283e1a080>, name:Apple Watch, manufacturer:Apple Inc., model:Watch, ' \
+             'hardware:Watch5,4, software:7.0.1>>'
+    rows = []
+
+    for i in range(count):
+        day, minutes = divmod(i * 5, 24 * 60)
+        start_date = f"2020-{1 + day // 28 % 12:02}-{1 + day % 28:02} {minutes // 60:02}:{minutes % 60:02}:00 -0700"
+        row = dict.fromkeys(hd.Fieldnames_Record, '')
+        row.update({
+            hd.FIELD_TYPE: hd.HK_REC_TYPE_HeartRate,
+            hd.FIELD_SOURCE_NAME: 'Apple Watch',
+            hd.FIELD_SOURCE_VERSION: '7.0.1',
+            hd.FIELD_UNIT: 'count/min',
+            hd.FIELD_DEVICE: device,
+            hd.FIELD_CREATION_DATE: start_date,
+            hd.FIELD_START_DATE: start_date,
+            hd.FIELD_END_DATE: start_date,
+            hd.FIELD_VALUE: str(random.randint(50, 180))
+        })
+        rows.append(row)
+
+    return rows
+
+
+def measure(label: str, create_all: Callable[[Iterable[Dict[str, str]]], List], rows: List[Dict[str, str]]):
+    gc.collect()
+    start = time.perf_counter()
+    records = create_all(rows)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    kept = create_all(rows)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+
+    gc.collect()
+    start = time.perf_counter()
+    summary = DiscreteQuantitySampleSummary(hd.HK_REC_TYPE_HeartRate, 'count/min')
+
+    for record in records:
+        summary.tally(record)
+
+    tally_elapsed = time.perf_counter() - start
+    print(f"{label}: create {elapsed:.2f}s, {size / len(records):.0f} bytes/record, tally {tally_elapsed:.2f}s")
+    return summary.collect()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog=__file__,
+                                     description='compares the namedtuple-backed HealthKit records with the '
+                                                 'dataclass records they replaced.')
+
+    parser.add_argument('-rows', type=int, default=1000000, help='number of heart rate rows; default is 1000000')
+    args = parser.parse_args()
+
+    rows = heart_rate_rows(args.rows)
+    print(f"{len(rows)} heart rate rows")
+
+    expected = measure('dataclass', lambda attrs: [dataclass_create(attr) for attr in attrs], rows)
+    created = measure('HKRecordFactory.create', lambda attrs: [HKRecordFactory.create(attr) for attr in attrs], rows)
+    batched = measure('HKRecordFactory.create_many', lambda attrs: list(HKRecordFactory.create_many(attrs)), rows)
+
+    if not expected == created == batched:
+        raise SystemExit('the summaries of the records differ.')
+
+    print('summaries are identical')
@@ -0,0 +1,88 @@
+from functools import lru_cache
+from typing import Dict
+import re
+
+__all__ = [
+    'AppleHealthDeviceRegistry',
+    'IPHONE_DEVICE',
+    'THIRD_PARTY_DEVICE',
+    'WATCH_DEVICE',
+    'device_registry'
+]
+
+
+WATCH_DEVICE = 'watch'
+IPHONE_DEVICE = 'iPhone'
+THIRD_PARTY_DEVICE = 'third-party'
+
+_re_iPhone_device = re.compile(r'.+HKDevice:.+, name:iPhone,')
+_re_watch_device = re.compile(r', (?:name:Apple Watch|model:Watch),')
+
+_DEVICE_ADDRESS_PREFIX = 'HKDevice: 0x'
+
+
+class AppleHealthDeviceRegistry:
+    """Classifies the device strings of Apple Health data as watch, iPhone or third-party devices.
+
+       A device string, e.g., <<HKDevice: 0x283e1a080>, name:Apple Watch, manufacturer:Apple Inc., ...>>,
+       names the object address of the device, which varies from record to record; the registry
+       classifies each device once, without its address, and memoizes the classification of the
+       maxsize most recent devices.
+    """
+    def __init__(self, maxsize: int = 1024):
+        self._devices: Dict[str, str] = {}
+        self._classify = lru_cache(maxsize=maxsize)(self._classify_device)
+
+    @staticmethod
+    def device_key(device: str) -> str:
+        """Returns the device string without the device's object address."""
+        start = device.find(_DEVICE_ADDRESS_PREFIX)
+
+        if start < 0:
+            return device
+
+        start += len(_DEVICE_ADDRESS_PREFIX) - 2
+        end = device.find('>', start)
+
+        if end < 0 or not device[start:end].isalnum():
+            return device
+
+        return device[:start] + device[end:]
+
+    def _classify_device(self, key: str) -> str:
+        if _re_iPhone_device.search(key) is not None:
+            kind = IPHONE_DEVICE
+        elif _re_watch_device.search(key) is not None:
+            kind = WATCH_DEVICE
+        else:
+            kind = THIRD_PARTY_DEVICE
+
+        self._devices[key] = kind
+        return kind
+
+    def classify(self, device: str) -> str:
+        return self._classify(self.device_key(device))
+
+    def is_iphone(self, device: str) -> bool:
+        return self.classify(device) == IPHONE_DEVICE
+
+    def is_watch(self, device: str) -> bool:
+        """Apple watch can also transmit exercise data from exercise equipment, e.g., treadmill,
+           so every device but the iPhone counts as a watch.
+        """
+        return self.classify(device) != IPHONE_DEVICE
+
+    def devices(self) -> Dict[str, str]:
+        """Returns the classification of every device seen, keyed by device_key."""
+        return dict(self._devices)
+
+    def cache_info(self):
+        """Returns the hits, misses, maxsize and currsize of the memoized classifications."""
+        return self._classify.cache_info()
+
+    def clear(self):
+        self._devices.clear()
+        self._classify.cache_clear()
+
+
+device_registry = AppleHealthDeviceRegistry()
@@ -1,27 +1,54 @@
 from abc import ABC, abstractmethod
 from datetime import datetime, timedelta
-from typing import Any, Dict, Iterator, Optional, Union
+from typing import Any, Callable, Dict, Iterator, List, Optional, TextIO, Union
 
-import csv
+import xml.etree.ElementTree as et
 
+from cls_apple_health_xml_parsers import ETREE_BACKEND
 from cls_apple_health_xml_streams import *
-from cls_healthkit import HK_APPLE_DATE_FORMAT
+from cls_compressed_files import open_text_output
+from cls_csv_batch_writer import CSV_WRITE_BUFFER_SIZE, CsvBatchWriter
+from cls_external_merge_sort import DEFAULT_SORT_MEMORY_BUDGET, external_sorted
+from cls_threaded_pipeline import PipelineQueueStats, ThreadedPipeline
+from cls_healthkit import HK_APPLE_DATE_FORMAT, HK_APPLE_DATETIME_FORMAT
 from utils import workout_element_to_dict, element_to_dict, localize_dates_health_data, \
-    between_dates_predicate, is_device_watch
+    between_dates_predicate, is_device_watch, apple_health_datetime_to_epoch
 
 import constants_apple_health_data as hd
 
 
+def record_element_to_row(elem: et.Element) -> Dict[str, str]:
+    return localize_dates_health_data(element_to_dict(elem))
+
+
+def workout_element_to_row(elem: et.Element) -> Dict[str, Any]:
+    return localize_dates_health_data(workout_element_to_dict(elem))
+
+
 class AppleHealthDataETLCsv(ABC):
+    fieldnames = hd.Fieldnames_Record
+    sort_supported = True
+
+    # an incremental run loads only the rows whose watermark field is later than the
+    # dataset's watermark, or equal to it if watermark_inclusive is set
+    watermark_field = hd.FIELD_CREATION_DATE
+    watermark_inclusive = False
+
+    # the month of a row's partition_field selects its csv file when the rows are partitioned by month
+    partition_field = hd.FIELD_START_DATE
+
     def __init__(self, xml_filepath: str,
                  csv_filepath: str,
                  start_date: Optional[Union[str, datetime]] = datetime(1970, 1, 1),
                  end_date: Optional[Union[str, datetime]] = datetime.now(),
-                 watch_data_only: bool = False):
+                 watch_data_only: bool = False,
+                 parser_backend: str = ETREE_BACKEND):
 
         self._xml_filepath: str = xml_filepath
         self._csv_filepath: str = csv_filepath
         self._watch_data_only = watch_data_only
+        self._parser_backend = parser_backend
+        self._pipeline: Optional[ThreadedPipeline] = None
 
         if start_date is None:
             self._start_date = datetime(1970, 1, 1)
@@ -52,68 +79,145 @@ class AppleHealthDataETLCsv(ABC):
                f"csv_filepath={self._csv_filepath}; " \
                f"start_date={self._start_date}; " \
                f"end_date={self._end_date}; " \
-               f"watch_data_only={self._watch_data_only}"
+               f"watch_data_only={self._watch_data_only}; " \
+               f"parser_backend={self._parser_backend}"
+
+    @property
+    def csv_filepath(self) -> str:
+        return self._csv_filepath
+
+    @property
+    @abstractmethod
+    def route_key(self) -> str:
+        """Key of the xml elements this ETL consumes: the record type of Record elements,
+           the tag of any other child of HealthData.
+        """
+        pass
 
     @abstractmethod
-    def transform(self) -> Iterator[Dict[str, Any]]:
+    def stream(self) -> Iterator[et.Element]:
         pass
 
+    @property
     @abstractmethod
-    def serialize(self, sort_data: bool):
+    def row_converter(self) -> Callable[[et.Element], Dict[str, Any]]:
+        """The function of element_to_row; it is picklable, so the processes that parse the xml file
+           can convert the elements to rows.
+        """
         pass
 
+    def element_to_row(self, elem: et.Element) -> Dict[str, Any]:
+        return self.row_converter(elem)
 
-class AppleHealthWorkoutETLCsv(AppleHealthDataETLCsv):
-    def transform(self) -> Iterator[Dict[str, Any]]:
-        stream = AppleHealthDataWorkoutStream(self._xml_filepath)
-        workout_dict = map(workout_element_to_dict, stream)
-        localized_workout_dict = map(localize_dates_health_data, workout_dict)
+    def include_row(self, row: Dict[str, Any]) -> bool:
+        return True
+
+    def sort_key(self, row: Dict[str, Any]) -> Any:
+        return row[hd.FIELD_START_DATE]
+
+    def watermark_key(self, value: str) -> Any:
+        return apple_health_datetime_to_epoch(value)
+
+    @property
+    def incremental_settings(self) -> str:
+        """The settings that must not change between the runs that append to a dataset."""
+        return f"start_date={self._start_date}; watch_data_only={self._watch_data_only}"
+
+    def malformed_row(self, row: Dict[str, Any], error: ValueError):
+        """Called with a row that has fields which are not in fieldnames; it stops the ETL by default."""
+        raise error
+
+    def csv_writer(self, outf: TextIO) -> CsvBatchWriter:
+        return CsvBatchWriter(outf, self.fieldnames, on_malformed=self.malformed_row)
+
+    def write_row(self, wrtr: CsvBatchWriter, row: Dict[str, Any]):
+        wrtr.writerow(row)
 
-        dates_bounded_workouts = filter(lambda row: self._date_boundaries_predicate(row[hd.FIELD_START_DATE]),
-                                        localized_workout_dict)
+    @property
+    def pipeline_stats(self) -> List[PipelineQueueStats]:
+        """The queue metrics of the latest pipelined transform."""
+        return [] if self._pipeline is None else self._pipeline.stats
 
-        device_filtered_workouts = filter(lambda row: is_device_watch(row[hd.FIELD_DEVICE]), dates_bounded_workouts) \
-            if self._watch_data_only else dates_bounded_workouts
+    def _parsed(self, stream: Iterator[Any], pipelined: bool) -> Iterator[Any]:
+        if not pipelined:
+            return stream
 
-        return device_filtered_workouts
+        self._pipeline = ThreadedPipeline(stream, 'parse')
+        return iter(self._pipeline)
 
-    def serialize(self, sort_data: bool = False):
-        with open(self._csv_filepath, 'w', encoding='utf-8') as outf:
-            wrtr = csv.DictWriter(outf, fieldnames=hd.Fieldnames_Workout_Csv)
+    def transform(self, pipelined: bool = False) -> Iterator[Dict[str, Any]]:
+        """Returns the rows of the stream's elements. If pipelined is set, the xml file is parsed by
+           a thread of its own while the elements are transformed, and written, by the caller's thread.
+        """
+        return filter(self.include_row, map(self.element_to_row, self._parsed(self.stream(), pipelined)))
+
+    def serialize(self, sort_data: bool = False, sort_memory_budget: int = DEFAULT_SORT_MEMORY_BUDGET,
+                  pipelined: bool = False):
+        with open_text_output(self._csv_filepath, 'w', buffering=CSV_WRITE_BUFFER_SIZE) as outf:
+            wrtr = self.csv_writer(outf)
             wrtr.writeheader()
-            workouts = self.transform()
+            rows = self.transform(pipelined)
+
+            if sort_data and self.sort_supported:
+                rows = external_sorted(rows, self.sort_key, sort_memory_budget)
+
+            for row in rows:
+                self.write_row(wrtr, row)
+
+            wrtr.flush()
+
+
+class AppleHealthWorkoutETLCsv(AppleHealthDataETLCsv):
+    fieldnames = hd.Fieldnames_Workout_Csv
+
+    @property
+    def route_key(self) -> str:
+        return hd.WORKOUT
+
+    def stream(self) -> Iterator[et.Element]:
+        return AppleHealthDataWorkoutStream(self._xml_filepath, self._parser_backend)
 
-            if sort_data:
-                workouts = iter(sorted(workouts, key=lambda row: row[hd.FIELD_START_DATE]))
+    @property
+    def row_converter(self) -> Callable[[et.Element], Dict[str, Any]]:
+        return workout_element_to_row
 
-            for row in workouts:
-                wrtr.writerow(row)
+    def include_row(self, row: Dict[str, Any]) -> bool:
+        return self._date_boundaries_predicate(row[hd.FIELD_START_DATE]) and \
+            (not self._watch_data_only or is_device_watch(row[hd.FIELD_DEVICE]))
 
 
 class AppleHealthActivitySummaryETLCsv(AppleHealthDataETLCsv):
-    def transform(self) -> Iterator[Dict[str, str]]:
-        stream = AppleHealthDataActivitySummaryStream(self._xml_filepath)
-        activity_summary_dict = map(element_to_dict, stream)
+    fieldnames = hd.Fieldnames_ActivitySummary
 
-        dates_bounded_active_summaries = filter(
-            lambda row: self._date_boundaries_predicate(datetime.strptime(row[hd.FIELD_DATE], HK_APPLE_DATE_FORMAT)),
-            activity_summary_dict)
+    # sort_data flag is ignored because the Activity Summary data
+    # appear to be in sorted order in the xml file
+    sort_supported = False
 
-        return dates_bounded_active_summaries
+    # the summary of the export's last day is incomplete; it is loaded again by the next run
+    watermark_field = hd.FIELD_DATE
+    watermark_inclusive = True
+    partition_field = hd.FIELD_DATE
 
-    def serialize(self, sort_data: bool):
-        with open(self._csv_filepath, 'w', encoding='utf-8') as outf:
-            wrtr = csv.DictWriter(outf, fieldnames=hd.Fieldnames_ActivitySummary)
-            wrtr.writeheader()
+    @property
+    def route_key(self) -> str:
+        return hd.ACTIVITY_SUMMARY
+
+    def stream(self) -> Iterator[et.Element]:
+        return AppleHealthDataActivitySummaryStream(self._xml_filepath, self._parser_backend)
+
+    @property
+    def row_converter(self) -> Callable[[et.Element], Dict[str, Any]]:
+        return element_to_dict
+
+    def include_row(self, row: Dict[str, str]) -> bool:
+        return self._date_boundaries_predicate(datetime.strptime(row[hd.FIELD_DATE], HK_APPLE_DATE_FORMAT))
 
-            # sort_data flag is ignored because the Activity Summary data
-            # appear to be in sorted order in the xml file
-            for row in self.transform():
-                try:
-                    wrtr.writerow(row)
-                except ValueError as e:
-                    print(f"* * * {e} * * * {row}")
-                    print()
+    def watermark_key(self, value: str) -> Any:
+        return value
+
+    def malformed_row(self, row: Dict[str, str], error: ValueError):
+        print(f"* * * {error} * * * {row}")
+        print()
 
 
 class AppleHealthRecordETLCsv(AppleHealthDataETLCsv):
@@ -123,33 +227,37 @@ class AppleHealthRecordETLCsv(AppleHealthDataETLCsv):
                  csv_filepath: str,
                  start_date: Optional[Union[str, datetime]],
                  end_date: Optional[Union[str, datetime]],
-                 watch_data_only: bool = False):
-        super().__init__(xml_filepath, csv_filepath, start_date, end_date, watch_data_only)
+                 watch_data_only: bool = False,
+                 parser_backend: str = ETREE_BACKEND):
+        super().__init__(xml_filepath, csv_filepath, start_date, end_date, watch_data_only, parser_backend)
         self._record_type = record_type
 
-    def transform(self) -> Iterator[Dict[str, str]]:
-        record = AppleHealthDataRecordTypeStream(self._xml_filepath, self._record_type)
-        record_dict = map(element_to_dict, record)
-        localized_record_dict = map(localize_dates_health_data, record_dict)
+    @property
+    def route_key(self) -> str:
+        return self._record_type
 
-        dates_bounded_records = filter(lambda row: self._date_boundaries_predicate(row[hd.FIELD_START_DATE]),
-                                       localized_record_dict)
+    def stream(self) -> Iterator[et.Element]:
+        return AppleHealthDataRecordTypeStream(self._xml_filepath, self._record_type, self._parser_backend)
 
-        # If a row doesn't have a device attribute, treat it as if it's a watch device
-        return filter(lambda row: True if hd.FIELD_DEVICE not in row else is_device_watch(row[hd.FIELD_DEVICE]),
-                      dates_bounded_records) if self._watch_data_only else dates_bounded_records
+    @property
+    def row_converter(self) -> Callable[[et.Element], Dict[str, Any]]:
+        return record_element_to_row
 
-    def serialize(self, sort_data: bool = False):
-        with open(self._csv_filepath, 'w', encoding='utf-8') as outf:
-            wrtr = csv.DictWriter(outf, fieldnames=hd.Fieldnames_Record)
-            wrtr.writeheader()
-            records = self.transform()
+    def attributes_to_row(self, attributes: Dict[str, str]) -> Dict[str, Any]:
+        """The row of a Record's attribute dict, like element_to_row of the Record."""
+        return localize_dates_health_data(attributes)
 
-            if sort_data:
-                records = iter(sorted(records, key=lambda row: row[hd.FIELD_START_DATE]))
+    def transform(self, pipelined: bool = False) -> Iterator[Dict[str, Any]]:
+        """Returns the rows of the Records' attribute dicts, which the regex backend scans without
+           building the elements; see AppleHealthDataRecordTypeRowsStream.
+        """
+        attributes = AppleHealthDataRecordTypeRowsStream(self._xml_filepath, self._record_type, self._parser_backend)
+        return filter(self.include_row, map(self.attributes_to_row, self._parsed(attributes, pipelined)))
 
-            for row in records:
-                wrtr.writerow(row)
+    def include_row(self, row: Dict[str, str]) -> bool:
+        # If a row doesn't have a device attribute, treat it as if it's a watch device
+        return self._date_boundaries_predicate(row[hd.FIELD_START_DATE]) and \
+            (not self._watch_data_only or hd.FIELD_DEVICE not in row or is_device_watch(row[hd.FIELD_DEVICE]))
 
 
 class AppleHealthActiveEnergyBurnedETLCsv(AppleHealthRecordETLCsv):
@@ -157,13 +265,15 @@ class AppleHealthActiveEnergyBurnedETLCsv(AppleHealthRecordETLCsv):
                  csv_filepath: str,
                  start_date: Optional[Union[str, datetime]],
                  end_date: Optional[Union[str, datetime]],
-                 watch_data_only: bool = False):
+                 watch_data_only: bool = False,
+                 parser_backend: str = ETREE_BACKEND):
         super().__init__(hd.HK_REC_TYPE_ActiveEnergyBurned,
                          xml_filepath,
                          csv_filepath,
                          start_date,
                          end_date,
-                         watch_data_only)
+                         watch_data_only,
+                         parser_backend)
 
 
 class AppleHealthBodyMassETLCsv(AppleHealthRecordETLCsv):
@@ -171,13 +281,15 @@ class AppleHealthBodyMassETLCsv(AppleHealthRecordETLCsv):
                  csv_filepath: str,
                  start_date: Optional[Union[str, datetime]],
                  end_date: Optional[Union[str, datetime]],
-                 watch_data_only: bool = False):
+                 watch_data_only: bool = False,
+                 parser_backend: str = ETREE_BACKEND):
         super().__init__(hd.HK_REC_TYPE_BodyMass,
                          xml_filepath,
                          csv_filepath,
                          start_date,
                          end_date,
-                         watch_data_only)
+                         watch_data_only,
+                         parser_backend)
 
 
 class AppleHealthDistanceWalkingRunningETLCsv(AppleHealthRecordETLCsv):
@@ -185,13 +297,15 @@ class AppleHealthDistanceWalkingRunningETLCsv(AppleHealthRecordETLCsv):
                  csv_filepath: str,
                  start_date: Optional[Union[str, datetime]],
                  end_date: Optional[Union[str, datetime]],
-                 watch_data_only: bool = False):
+                 watch_data_only: bool = False,
+                 parser_backend: str = ETREE_BACKEND):
         super().__init__(hd.HK_REC_TYPE_DistanceWalkingRunning,
                          xml_filepath,
                          csv_filepath,
                          start_date,
                          end_date,
-                         watch_data_only)
+                         watch_data_only,
+                         parser_backend)
 
 
 class AppleHealthExerciseTimeETLCsv(AppleHealthRecordETLCsv):
@@ -199,13 +313,15 @@ class AppleHealthExerciseTimeETLCsv(AppleHealthRecordETLCsv):
                  csv_filepath: str,
                  start_date: Optional[Union[str, datetime]],
                  end_date: Optional[Union[str, datetime]],
-                 watch_data_only: bool = False):
+                 watch_data_only: bool = False,
+                 parser_backend: str = ETREE_BACKEND):
         super().__init__(hd.HK_REC_TYPE_AppleExerciseTime,
                          xml_filepath,
                          csv_filepath,
                          start_date,
                          end_date,
-                         watch_data_only)
+                         watch_data_only,
+                         parser_backend)
 
 
 class AppleHealthRestingHeartRateETLCsv(AppleHealthRecordETLCsv):
@@ -213,13 +329,15 @@ class AppleHealthRestingHeartRateETLCsv(AppleHealthRecordETLCsv):
                  csv_filepath: str,
                  start_date: Optional[Union[str, datetime]],
                  end_date: Optional[Union[str, datetime]],
-                 watch_data_only_data: bool = False):
+                 watch_data_only_data: bool = False,
+                 parser_backend: str = ETREE_BACKEND):
         super().__init__(hd.HK_REC_TYPE_RestingHeartRate,
                          xml_filepath,
                          csv_filepath,
                          start_date,
                          end_date,
-                         watch_data_only_data)
+                         watch_data_only_data,
+                         parser_backend)
 
 
 class AppleHealthHeartRateETLCsv(AppleHealthRecordETLCsv):
@@ -227,13 +345,15 @@ class AppleHealthHeartRateETLCsv(AppleHealthRecordETLCsv):
                  csv_filepath: str,
                  start_date: Optional[Union[str, datetime]],
                  end_date: Optional[Union[str, datetime]],
-                 watch_data_only_data: bool = False):
+                 watch_data_only_data: bool = False,
+                 parser_backend: str = ETREE_BACKEND):
         super().__init__(hd.HK_REC_TYPE_HeartRate,
                          xml_filepath,
                          csv_filepath,
                          start_date,
                          end_date,
-                         watch_data_only_data)
+                         watch_data_only_data,
+                         parser_backend)
 
 
 
@@ -242,13 +362,15 @@ class AppleHealthStepCountETLCsv(AppleHealthRecordETLCsv):
                  csv_filepath: str,
                  start_date: Optional[Union[str, datetime]],
                  end_date: Optional[Union[str, datetime]],
-                 watch_data_only: bool = False):
+                 watch_data_only: bool = False,
+                 parser_backend: str = ETREE_BACKEND):
         super().__init__(hd.HK_REC_TYPE_StepCount,
                          xml_filepath,
                          csv_filepath,
                          start_date,
                          end_date,
-                         watch_data_only)
+                         watch_data_only,
+                         parser_backend)
 
 
 class AppleHealthVo2MaxETLCsv(AppleHealthRecordETLCsv):
@@ -256,13 +378,15 @@ class AppleHealthVo2MaxETLCsv(AppleHealthRecordETLCsv):
                  csv_filepath: str,
                  start_date: Optional[Union[str, datetime]],
                  end_date: Optional[Union[str, datetime]],
-                 watch_data_only: bool = False):
+                 watch_data_only: bool = False,
+                 parser_backend: str = ETREE_BACKEND):
         super().__init__(hd.HK_REC_TYPE_VO2Max,
                          xml_filepath,
                          csv_filepath,
                          start_date,
                          end_date,
-                         watch_data_only)
+                         watch_data_only,
+                         parser_backend)
 
 
 class AppleHealthWaist2PiR_ETLCsv(AppleHealthRecordETLCsv):
@@ -270,10 +394,12 @@ class AppleHealthWaist2PiR_ETLCsv(AppleHealthRecordETLCsv):
                  csv_filepath: str,
                  start_date: Optional[Union[str, datetime]],
                  end_date: Optional[Union[str, datetime]],
-                 watch_data_only: bool = False):
+                 watch_data_only: bool = False,
+                 parser_backend: str = ETREE_BACKEND):
         super().__init__(hd.HK_REC_TYPE_WaistCircumference,
                          xml_filepath,
                          csv_filepath,
                          start_date,
                          end_date,
-                         watch_data_only)
+                         watch_data_only,
+                         parser_backend)
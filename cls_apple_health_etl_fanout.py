@@ -0,0 +1,467 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, TextIO, Tuple, Union
+import os
+import xml.etree.ElementTree as et
+
+from cls_apple_health_etl_csv import AppleHealthDataETLCsv
+from cls_apple_health_etl_watermarks import AppleHealthDataWatermarks, DatasetWatermark
+from cls_apple_health_xml_parallel import AppleHealthDataParallelElementsStream
+from cls_apple_health_xml_parsers import ETREE_BACKEND
+from cls_apple_health_xml_streams import AppleHealthDataElementsStream
+from cls_compressed_files import is_compressed_file, open_text_output
+from cls_csv_batch_writer import CSV_WRITE_BUFFER_SIZE, CsvBatchWriter
+from cls_external_merge_sort import DEFAULT_SORT_MEMORY_BUDGET, ExternalMergeSort
+from cls_threaded_pipeline import PipelineQueueStats, ThreadedPipeline
+from utils import SimplePublisher, ymd_path_str
+
+import constants_apple_health_data as hd
+
+__all__ = [
+    'AppleHealthDataCsvSink',
+    'AppleHealthDataETLFanOut',
+    'AppleHealthDataIncrementalCsvSink',
+    'AppleHealthDataPartitionedCsvSink',
+    'CsvFilePool'
+]
+
+
+class AppleHealthDataCsvSink:
+    """Writes the rows of an ETL's elements to the ETL's csv file.
+
+       The sink applies the ETL's element_to_row and include_row, so the ETL's
+       filters behave as they do in AppleHealthDataETLCsv.serialize. With sort_data,
+       the rows are sorted by an ExternalMergeSort within sort_memory_budget bytes.
+    """
+    def __init__(self, etl: AppleHealthDataETLCsv, sort_data: bool = False,
+                 sort_memory_budget: int = DEFAULT_SORT_MEMORY_BUDGET):
+        self._etl = etl
+        self._sort_data = sort_data and etl.sort_supported
+        self._outf = None
+        self._wrtr: Optional[CsvBatchWriter] = None
+        self._rows = ExternalMergeSort(etl.sort_key, sort_memory_budget)
+        self._failed = False
+
+    @property
+    def route_key(self) -> str:
+        return self._etl.route_key
+
+    @property
+    def name(self) -> str:
+        return self._etl.csv_filepath
+
+    def open(self):
+        self._outf = open_text_output(self._etl.csv_filepath, 'w', buffering=CSV_WRITE_BUFFER_SIZE)
+        self._wrtr = self._etl.csv_writer(self._outf)
+        self._wrtr.writeheader()
+
+    @property
+    def row_converter(self) -> Callable[[et.Element], Dict[str, Any]]:
+        return self._etl.row_converter
+
+    def send(self, elem: et.Element):
+        if self._failed:
+            return
+
+        try:
+            row = self._etl.element_to_row(elem)
+        except Exception as e:
+            self.fail(e)
+            return
+
+        self.send_row(row)
+
+    def send_row(self, row: Dict[str, Any]):
+        """Sends the row of an element that was converted by the sink's row_converter, e.g., by a worker."""
+        if self._failed:
+            return
+
+        try:
+            if not self.include_row(row):
+                return
+
+            if self._sort_data:
+                self._rows.add(row)
+            else:
+                self.write_row(row)
+        except Exception as e:
+            self.fail(e)
+
+    def fail(self, error: Exception):
+        # stop feeding a broken dataset but let the other sinks carry on
+        self._failed = True
+        print(f"{self.name}: {error}\n")
+
+    def include_row(self, row: Dict[str, Any]) -> bool:
+        return self._etl.include_row(row)
+
+    def write_row(self, row: Dict[str, Any]):
+        self._etl.write_row(self._wrtr, row)
+
+    def _write_sorted_rows(self):
+        for row in self._rows:
+            self.write_row(row)
+
+    def close(self):
+        if self._outf is None:
+            return
+
+        try:
+            if self._sort_data and not self._failed:
+                self._write_sorted_rows()
+
+            self._wrtr.flush()
+        finally:
+            self._rows.close()
+            self._outf.close()
+            self._outf = None
+
+
+class AppleHealthDataIncrementalCsvSink(AppleHealthDataCsvSink):
+    """Appends the rows that are newer than the dataset's watermark to the csv file of the previous run.
+
+       The csv file is written from scratch if it has no watermark, if it changed since the previous run,
+       or if the ETL's incremental settings changed. With sort_data, only the appended rows are sorted.
+    """
+    def __init__(self, etl: AppleHealthDataETLCsv, watermarks: AppleHealthDataWatermarks, sort_data: bool = False,
+                 sort_memory_budget: int = DEFAULT_SORT_MEMORY_BUDGET):
+        if is_compressed_file(etl.csv_filepath):
+            raise ValueError(f"{etl.csv_filepath}: a compressed csv file cannot be loaded incrementally.")
+
+        super().__init__(etl, sort_data, sort_memory_budget)
+        self._watermarks = watermarks
+        self._previous_key: Any = None
+        self._generation = 1
+        self._watermark: Optional[str] = None
+        self._watermark_key: Any = None
+        # the last row that include_row let through and its watermark key, which write_row reuses
+        self._row_key: Tuple[Optional[Dict[str, Any]], Any] = (None, None)
+        self._tail_offset = 0
+
+    def _is_appendable(self, previous: Optional[DatasetWatermark]) -> bool:
+        csv_filepath = self._etl.csv_filepath
+        return previous is not None and previous.settings == self._etl.incremental_settings and \
+            os.path.isfile(csv_filepath) and os.path.getsize(csv_filepath) == previous.csv_size
+
+    def open(self):
+        previous = self._watermarks.get(self._etl.csv_filepath)
+
+        if not self._is_appendable(previous):
+            self._generation = 1 if previous is None else previous.generation + 1
+            super().open()
+            self._tail_offset = self.tell()
+            return
+
+        self._generation = previous.generation
+        self._watermark = previous.watermark
+        self._watermark_key = None if previous.watermark is None else self._etl.watermark_key(previous.watermark)
+        self._previous_key = self._watermark_key
+
+        if self._etl.watermark_inclusive and previous.tail_offset < previous.csv_size:
+            # the rows that share the watermark are loaded again
+            with open(self._etl.csv_filepath, 'r+b') as outf:
+                outf.truncate(previous.tail_offset)
+
+            self._generation += 1
+
+        self._outf = open_text_output(self._etl.csv_filepath, 'a', buffering=CSV_WRITE_BUFFER_SIZE)
+        self._wrtr = self._etl.csv_writer(self._outf)
+        self._tail_offset = self.tell()
+
+    def tell(self) -> int:
+        """The offset of the end of the rows written so far."""
+        self._wrtr.flush()
+        return self._outf.tell()
+
+    def include_row(self, row: Dict[str, Any]) -> bool:
+        if not super().include_row(row):
+            return False
+
+        key = self._etl.watermark_key(row[self._etl.watermark_field])
+
+        if self._previous_key is not None and \
+                not (key >= self._previous_key if self._etl.watermark_inclusive else key > self._previous_key):
+            return False
+
+        self._row_key = row, key
+        return True
+
+    def write_row(self, row: Dict[str, Any]):
+        value = row[self._etl.watermark_field]
+        last_row, key = self._row_key
+
+        if last_row is not row:
+            # a row of the sort, written after the other rows were included
+            key = self._etl.watermark_key(value)
+
+        if self._watermark_key is None or key > self._watermark_key:
+            if self._etl.watermark_inclusive:
+                self._tail_offset = self.tell()
+
+            self._watermark, self._watermark_key = value, key
+
+        super().write_row(row)
+
+    def close(self):
+        if self._outf is None:
+            return
+
+        super().close()
+        csv_filepath = self._etl.csv_filepath
+
+        if self._failed:
+            # the next run writes the dataset from scratch
+            self._watermarks.discard(csv_filepath)
+            return
+
+        csv_size = os.path.getsize(csv_filepath)
+        self._watermarks.set(csv_filepath, DatasetWatermark(self._watermark,
+                                                            self._etl.incremental_settings,
+                                                            self._generation,
+                                                            csv_size,
+                                                            self._tail_offset if self._etl.watermark_inclusive
+                                                            else csv_size))
+
+
+class CsvFilePool:
+    """Keeps at most max_open csv files open; opening another file closes the least recently used one.
+
+       A file is written from scratch, with a header, the first time the pool opens it and appended to
+       when it is opened again.
+    """
+    def __init__(self, max_open: int = 64):
+        if max_open < 1:
+            raise ValueError('max_open must be positive.')
+
+        self._max_open = max_open
+        self._files: 'OrderedDict[str, Tuple[TextIO, CsvBatchWriter]]' = OrderedDict()
+        self._written: Set[str] = set()
+
+    def writer(self, filepath: str, fieldnames: List[str],
+               on_malformed: Optional[Callable[[Dict[str, Any], ValueError], None]] = None) -> CsvBatchWriter:
+        entry = self._files.get(filepath)
+
+        if entry is not None:
+            self._files.move_to_end(filepath)
+            return entry[1]
+
+        if len(self._files) >= self._max_open:
+            _, (outf, wrtr) = self._files.popitem(last=False)
+            self._close(outf, wrtr)
+
+        if filepath in self._written:
+            outf = open_text_output(filepath, 'a')
+            wrtr = CsvBatchWriter(outf, fieldnames, on_malformed=on_malformed)
+        else:
+            os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+            outf = open_text_output(filepath, 'w')
+            wrtr = CsvBatchWriter(outf, fieldnames, on_malformed=on_malformed)
+            wrtr.writeheader()
+            self._written.add(filepath)
+
+        self._files[filepath] = (outf, wrtr)
+        return wrtr
+
+    def close(self, filepath: Optional[str] = None):
+        """Closes filepath, or every open file if filepath is None."""
+        filepaths = list(self._files) if filepath is None else [filepath]
+
+        for filepath in filepaths:
+            entry = self._files.pop(filepath, None)
+
+            if entry is not None:
+                self._close(*entry)
+
+    @staticmethod
+    def _close(outf: TextIO, wrtr: CsvBatchWriter):
+        try:
+            wrtr.flush()
+        finally:
+            outf.close()
+
+
+class AppleHealthDataPartitionedCsvSink(AppleHealthDataCsvSink):
+    """Writes each row of an ETL to the csv file of its month, {csv_prefix_path}/{yyyymm}/{filename},
+       where the month is that of the row's partition_field and filename that of the ETL's csv file.
+
+       The csv files are opened by pool, which may be shared by the sinks of a fan-out. Only the months
+       that have rows get a csv file.
+    """
+    def __init__(self, etl: AppleHealthDataETLCsv, csv_prefix_path: str, pool: CsvFilePool,
+                 sort_data: bool = False, sort_memory_budget: int = DEFAULT_SORT_MEMORY_BUDGET):
+        super().__init__(etl, sort_data, sort_memory_budget)
+        self._csv_prefix_path = str(csv_prefix_path)
+        self._filename = os.path.basename(str(etl.csv_filepath))
+        self._pool = pool
+        self._filepaths: Dict[str, str] = {}
+        self._opened = False
+
+    @property
+    def name(self) -> str:
+        return f"{self._csv_prefix_path}/yyyymm/{self._filename}"
+
+    @property
+    def filepaths(self) -> List[str]:
+        return list(self._filepaths.values())
+
+    def open(self):
+        self._opened = True
+
+    def partition_filepath(self, row: Dict[str, Any]) -> str:
+        month = row[self._etl.partition_field][:7]
+        filepath = self._filepaths.get(month)
+
+        if filepath is None:
+            filepath = f"{self._csv_prefix_path}/{ymd_path_str(int(month[:4]), int(month[5:]))}/{self._filename}"
+            self._filepaths[month] = filepath
+
+        return filepath
+
+    def write_row(self, row: Dict[str, Any]):
+        wrtr = self._pool.writer(self.partition_filepath(row), self._etl.fieldnames, self._etl.malformed_row)
+        self._etl.write_row(wrtr, row)
+
+    def close(self):
+        if not self._opened:
+            return
+
+        try:
+            if self._sort_data and not self._failed:
+                self._write_sorted_rows()
+        finally:
+            self._rows.close()
+            self._opened = False
+
+            for filepath in self._filepaths.values():
+                self._pool.close(filepath)
+
+
+# the route key of an element and, for each sink of the route, the row of the element or the error
+# of its conversion
+RoutedRows = Tuple[str, List[Union[Dict[str, Any], Exception]]]
+
+
+class _ElementRowsConverter:
+    """Converts an element to the rows of the sinks of its route in the processes that parse the xml file;
+       the elements without a sink are converted to None, so they are not sent back to the fan-out.
+    """
+    def __init__(self, row_converters: Dict[str, List[Callable[[et.Element], Dict[str, Any]]]]):
+        self._row_converters = row_converters
+
+    def __call__(self, elem: et.Element) -> Optional[RoutedRows]:
+        route_key = AppleHealthDataETLFanOut.route_key(elem)
+        row_converters = self._row_converters.get(route_key)
+
+        if row_converters is None:
+            return None
+
+        rows = []
+
+        for row_converter in row_converters:
+            try:
+                rows.append(row_converter(elem))
+            except Exception as e:
+                rows.append(e)
+
+        return route_key, rows
+
+
+class AppleHealthDataETLFanOut:
+    """Parses the xml file once and routes each child element of HealthData
+       to the sinks registered for the element's route key.
+
+       If max_workers is set, the xml file is parsed by a pool of max_workers processes, which also convert
+       the elements to the sinks' rows. If pipelined is set, the elements are parsed by a thread of their own
+       while the sinks transform and write them.
+    """
+    def __init__(self, xml_filepath: str, max_workers: Optional[int] = None, parser_backend: str = ETREE_BACKEND,
+                 pipelined: bool = False):
+        self._xml_filepath = xml_filepath
+        self._max_workers = max_workers
+        self._parser_backend = parser_backend
+        self._pipelined = pipelined
+        self._pipeline: Optional[ThreadedPipeline] = None
+        self._sinks: List[AppleHealthDataCsvSink] = []
+
+    @staticmethod
+    def route_key(elem: et.Element) -> str:
+        return elem.get(hd.FIELD_TYPE, '') if elem.tag == hd.RECORD else elem.tag
+
+    @property
+    def pipeline_stats(self) -> List[PipelineQueueStats]:
+        return [] if self._pipeline is None else self._pipeline.stats
+
+    def register(self, sink: AppleHealthDataCsvSink):
+        self._sinks.append(sink)
+
+    def register_etl(self, etl: AppleHealthDataETLCsv, sort_data: bool = False,
+                     sort_memory_budget: int = DEFAULT_SORT_MEMORY_BUDGET):
+        self.register(AppleHealthDataCsvSink(etl, sort_data, sort_memory_budget))
+
+    def _open_sinks(self) -> List[AppleHealthDataCsvSink]:
+        """Opens the sinks and returns those that opened; a sink that cannot be opened fails alone."""
+        sinks = []
+
+        for sink in self._sinks:
+            try:
+                sink.open()
+            except Exception as e:
+                sink.fail(e)
+                continue
+
+            sinks.append(sink)
+
+        return sinks
+
+    @staticmethod
+    def _routes(sinks: List[AppleHealthDataCsvSink]) -> Dict[str, List[AppleHealthDataCsvSink]]:
+        routes: Dict[str, List[AppleHealthDataCsvSink]] = {}
+
+        for sink in sinks:
+            routes.setdefault(sink.route_key, []).append(sink)
+
+        return routes
+
+    def _pipe(self, stream: Iterator[Any]) -> Iterator[Any]:
+        if not self._pipelined:
+            return stream
+
+        self._pipeline = ThreadedPipeline(stream, 'parse')
+        return iter(self._pipeline)
+
+    def _run_serial(self, sinks: List[AppleHealthDataCsvSink]):
+        publisher = SimplePublisher({sink.route_key for sink in sinks})
+
+        for sink in sinks:
+            publisher.register(sink.route_key, sink.send)
+
+        for elem in self._pipe(AppleHealthDataElementsStream(self._xml_filepath, self._parser_backend)):
+            publisher.dispatch(self.route_key(elem), elem)
+
+    def _run_parallel(self, sinks: List[AppleHealthDataCsvSink]):
+        routes = self._routes(sinks)
+        converter = _ElementRowsConverter({route_key: [sink.row_converter for sink in sinks]
+                                           for route_key, sinks in routes.items()})
+
+        with AppleHealthDataParallelElementsStream(self._xml_filepath, converter, self._max_workers,
+                                                   parser_backend=self._parser_backend) as stream:
+            for route_key, rows in self._pipe(stream):
+                for sink, row in zip(routes[route_key], rows):
+                    if isinstance(row, Exception):
+                        sink.fail(row)
+                    else:
+                        sink.send_row(row)
+
+    def run(self):
+        try:
+            sinks = self._open_sinks()
+
+            if self._max_workers is None:
+                self._run_serial(sinks)
+            else:
+                self._run_parallel(sinks)
+        finally:
+            if self._pipeline is not None:
+                self._pipeline.close()
+
+            for sink in self._sinks:
+                sink.close()
@@ -0,0 +1,241 @@
+from array import array
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+import json
+import os
+import xml.etree.ElementTree as et
+
+import numpy as np
+
+from cls_apple_health_devices import device_registry
+from cls_apple_health_etl_csv import AppleHealthRecordETLCsv
+from cls_apple_health_etl_fanout import AppleHealthDataCsvSink
+from cls_apple_health_xml_parsers import ETREE_BACKEND
+from cls_external_merge_sort import DEFAULT_SORT_MEMORY_BUDGET, external_sorted
+from cls_healthkit import HKRecordQuantityTypeIdentifier
+from utils import element_to_dict, epoch_to_local_apple_health_datetime_str, localize_dates_health_data
+
+import constants_apple_health_data as hd
+
+__all__ = [
+    'AppleHealthDataNpySink',
+    'AppleHealthRecordColumns',
+    'AppleHealthRecordColumnsWriter',
+    'AppleHealthRecordETLNpy',
+    'DATE_COLUMNS',
+    'DICTIONARY_COLUMNS',
+    'VALUE_COLUMN',
+    'record_element_to_epoch_row'
+]
+
+
+# epoch seconds, int64
+DATE_COLUMNS = (hd.FIELD_CREATION_DATE, hd.FIELD_START_DATE, hd.FIELD_END_DATE)
+
+# float64
+VALUE_COLUMN = hd.FIELD_VALUE
+
+# int32 codes of the strings of the column's dictionary
+DICTIONARY_COLUMNS = (hd.FIELD_UNIT, hd.FIELD_SOURCE_NAME, hd.FIELD_SOURCE_VERSION, hd.FIELD_DEVICE)
+
+_COLUMNS_FILENAME = 'columns.json'
+
+
+def _column_filepath(folder: str, column: str) -> str:
+    return os.path.join(folder, f"{column}.npy")
+
+
+class AppleHealthRecordColumnsWriter:
+    """Accumulates the rows of a record type as typed columns and saves each column in a .npy file of folder.
+
+       The dates of a row are epoch seconds, e.g., the dates of localize_dates_health_data(row, as_epoch=True).
+       A device string is stored without its object address (see AppleHealthDeviceRegistry.device_key).
+    """
+    def __init__(self, folder: str, record_type: str):
+        self._folder = str(folder)
+        self._record_type = record_type
+        self._dates = {column: array('q') for column in DATE_COLUMNS}
+        self._values = array('d')
+        self._codes = {column: array('i') for column in DICTIONARY_COLUMNS}
+        self._dictionaries: Dict[str, Dict[str, int]] = {column: {} for column in DICTIONARY_COLUMNS}
+
+    def __len__(self):
+        return len(self._values)
+
+    def _encode(self, column: str, value: str) -> int:
+        dictionary = self._dictionaries[column]
+        code = dictionary.get(value)
+
+        if code is None:
+            code = dictionary[value] = len(dictionary)
+
+        return code
+
+    def append(self, row: Dict[str, Any]):
+        value = float(row[VALUE_COLUMN])
+
+        for column in DATE_COLUMNS:
+            self._dates[column].append(row[column])
+
+        self._values.append(value)
+
+        for column in DICTIONARY_COLUMNS:
+            value = row.get(column, '')
+
+            if column == hd.FIELD_DEVICE:
+                value = device_registry.device_key(value)
+
+            self._codes[column].append(self._encode(column, value))
+
+    def save(self):
+        os.makedirs(self._folder, exist_ok=True)
+
+        for column, dates in self._dates.items():
+            np.save(_column_filepath(self._folder, column), np.frombuffer(dates, dtype=np.int64))
+
+        np.save(_column_filepath(self._folder, VALUE_COLUMN), np.frombuffer(self._values, dtype=np.float64))
+
+        for column, codes in self._codes.items():
+            np.save(_column_filepath(self._folder, column), np.frombuffer(codes, dtype=np.int32))
+
+        # the dictionary of a column lists its strings in the order of their codes
+        with open(os.path.join(self._folder, _COLUMNS_FILENAME), 'w', encoding='utf-8') as outf:
+            json.dump({
+                'record_type': self._record_type,
+                'rows': len(self),
+                'dictionaries': {column: list(dictionary) for column, dictionary in self._dictionaries.items()}
+            }, outf, indent=2)
+
+
+class AppleHealthRecordColumns:
+    """Reads the columns of a record type saved by AppleHealthRecordColumnsWriter.
+
+       The columns are memory-mapped unless mmap_mode is None; see numpy.load.
+    """
+    def __init__(self, folder: str, mmap_mode: Optional[str] = 'r'):
+        self._folder = str(folder)
+
+        with open(os.path.join(self._folder, _COLUMNS_FILENAME), 'r', encoding='utf-8') as inf:
+            columns = json.load(inf)
+
+        self._record_type: str = columns['record_type']
+        self._rows: int = columns['rows']
+        self._dictionaries: Dict[str, List[str]] = columns['dictionaries']
+        self._columns: Dict[str, np.ndarray] = {
+            column: np.load(_column_filepath(self._folder, column), mmap_mode=mmap_mode)
+            for column in DATE_COLUMNS + (VALUE_COLUMN,) + DICTIONARY_COLUMNS
+        }
+
+    def __len__(self):
+        return self._rows
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self._columns[column]
+
+    @property
+    def record_type(self) -> str:
+        return self._record_type
+
+    def dictionary(self, column: str) -> List[str]:
+        return self._dictionaries[column]
+
+    def code(self, column: str, value: str) -> Optional[int]:
+        """Returns the code of value in the dictionary column, None if the column does not have value."""
+        try:
+            return self._dictionaries[column].index(value)
+        except ValueError:
+            return None
+
+    def decode(self, column: str) -> np.ndarray:
+        """Returns the strings of the dictionary column."""
+        return np.array(self._dictionaries[column], dtype=object)[self._columns[column]]
+
+    def records(self) -> Iterator[HKRecordQuantityTypeIdentifier]:
+        """Returns the rows as records with localized dates, e.g., for the sample summaries."""
+        new = tuple.__new__
+        to_local = epoch_to_local_apple_health_datetime_str
+        dictionaries = [self._dictionaries[column] for column in DICTIONARY_COLUMNS]
+        units, source_names, source_versions, devices = dictionaries
+        columns = [self._columns[column].tolist() for column in
+                   (VALUE_COLUMN,) + DICTIONARY_COLUMNS + DATE_COLUMNS]
+
+        for value, unit, source_name, source_version, device, creation_date, start_date, end_date in zip(*columns):
+            yield new(HKRecordQuantityTypeIdentifier, (self._record_type,
+                                                       units[unit],
+                                                       value,
+                                                       source_names[source_name],
+                                                       source_versions[source_version],
+                                                       devices[device],
+                                                       to_local(creation_date),
+                                                       to_local(start_date),
+                                                       to_local(end_date)))
+
+
+def record_element_to_epoch_row(elem: et.Element) -> Dict[str, Any]:
+    return localize_dates_health_data(element_to_dict(elem), as_epoch=True)
+
+
+class AppleHealthRecordETLNpy(AppleHealthRecordETLCsv):
+    """Loads the records of a quantity type in the columns of npy_folder instead of a csv file."""
+    def __init__(self,
+                 record_type: str,
+                 xml_filepath: str,
+                 npy_folder: str,
+                 start_date: Optional[Union[str, datetime]],
+                 end_date: Optional[Union[str, datetime]],
+                 watch_data_only: bool = False,
+                 parser_backend: str = ETREE_BACKEND):
+        super().__init__(record_type, xml_filepath, npy_folder, start_date, end_date, watch_data_only,
+                         parser_backend)
+
+    @property
+    def npy_folder(self) -> str:
+        return self._csv_filepath
+
+    @property
+    def row_converter(self) -> Callable[[et.Element], Dict[str, Any]]:
+        return record_element_to_epoch_row
+
+    def attributes_to_row(self, attributes: Dict[str, str]) -> Dict[str, Any]:
+        return localize_dates_health_data(attributes, as_epoch=True)
+
+    def serialize(self, sort_data: bool = False, sort_memory_budget: int = DEFAULT_SORT_MEMORY_BUDGET,
+                  pipelined: bool = False):
+        writer = AppleHealthRecordColumnsWriter(self.npy_folder, self._record_type)
+        rows = self.transform(pipelined)
+
+        if sort_data:
+            rows = external_sorted(rows, self.sort_key, sort_memory_budget)
+
+        for row in rows:
+            writer.append(row)
+
+        writer.save()
+
+
+class AppleHealthDataNpySink(AppleHealthDataCsvSink):
+    """Writes the rows of an AppleHealthRecordETLNpy to its columns; see AppleHealthDataETLFanOut."""
+    def __init__(self, etl: AppleHealthRecordETLNpy, sort_data: bool = False,
+                 sort_memory_budget: int = DEFAULT_SORT_MEMORY_BUDGET):
+        super().__init__(etl, sort_data, sort_memory_budget)
+        self._writer: Optional[AppleHealthRecordColumnsWriter] = None
+
+    def open(self):
+        self._writer = AppleHealthRecordColumnsWriter(self._etl.npy_folder, self.route_key)
+
+    def write_row(self, row: Dict[str, Any]):
+        self._writer.append(row)
+
+    def close(self):
+        if self._writer is None:
+            return
+
+        try:
+            if not self._failed:
+                if self._sort_data:
+                    self._write_sorted_rows()
+
+                self._writer.save()
+        finally:
+            self._rows.close()
+            self._writer = None
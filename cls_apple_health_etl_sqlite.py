@@ -0,0 +1,177 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import sqlite3
+
+from cls_apple_health_etl_csv import AppleHealthActivitySummaryETLCsv, AppleHealthDataETLCsv, \
+    AppleHealthRecordETLCsv, AppleHealthWorkoutETLCsv
+from cls_apple_health_etl_fanout import AppleHealthDataCsvSink
+from cls_external_merge_sort import DEFAULT_SORT_MEMORY_BUDGET
+
+import constants_apple_health_data as hd
+
+__all__ = [
+    'ACTIVITY_SUMMARY_TABLE',
+    'AppleHealthDataSqliteDatabase',
+    'AppleHealthDataSqliteSink',
+    'RECORD_TABLE',
+    'WORKOUT_TABLE'
+]
+
+
+RECORD_TABLE = 'record'
+WORKOUT_TABLE = 'workout'
+ACTIVITY_SUMMARY_TABLE = 'activity_summary'
+
+_REAL_COLUMNS = {
+    hd.FIELD_VALUE,
+    hd.FIELD_DURATION,
+    hd.FIELD_TOTAL_DISTANCE,
+    hd.FIELD_TOTAL_ENERGY_BURNED,
+    'activeEnergyBurned',
+    'activeEnergyBurnedGoal',
+    'appleMoveTime',
+    'appleMoveTimeGoal',
+    'appleExerciseTime',
+    'appleExerciseTimeGoal',
+    'appleStandHours',
+    'appleStandHoursGoal'
+}
+
+_tables = {
+    RECORD_TABLE: hd.Fieldnames_Record,
+    WORKOUT_TABLE: hd.Fieldnames_Workout_Csv,
+    ACTIVITY_SUMMARY_TABLE: hd.Fieldnames_ActivitySummary
+}
+
+_indexes = {
+    f"{RECORD_TABLE}_type_start_date": (RECORD_TABLE, (hd.FIELD_TYPE, hd.FIELD_START_DATE)),
+    f"{WORKOUT_TABLE}_activity_start_date": (WORKOUT_TABLE, (hd.FIELD_WORKOUT_ACTIVITY, hd.FIELD_START_DATE)),
+    f"{ACTIVITY_SUMMARY_TABLE}_date": (ACTIVITY_SUMMARY_TABLE, (hd.FIELD_DATE,))
+}
+
+
+class AppleHealthDataSqliteDatabase:
+    """SQLite database of the records, workouts and activity summaries of Apple Health data.
+
+       The rows are inserted with executemany in batches of batch_size rows, in a single transaction
+       that commits when the database is closed. The date indexes are built after the rows are loaded.
+    """
+    def __init__(self, db_filepath: str, batch_size: int = 10000):
+        if batch_size < 1:
+            raise ValueError('batch_size must be positive.')
+
+        self._db_filepath = str(db_filepath)
+        self._batch_size = batch_size
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close(commit=exc_type is None)
+
+    @property
+    def batch_size(self) -> int:
+        return self._batch_size
+
+    def open(self):
+        # transactions are begun and committed explicitly
+        self._connection = sqlite3.connect(self._db_filepath, isolation_level=None)
+
+        for table, fieldnames in _tables.items():
+            columns = ', '.join(f"{name} {'REAL' if name in _REAL_COLUMNS else 'TEXT'}" for name in fieldnames)
+            self._connection.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+
+        self._connection.execute('BEGIN')
+
+    def delete(self, table: str, record_type: Optional[str] = None):
+        """Deletes the rows of table, only those of record_type if it is set."""
+        if record_type is None:
+            self._connection.execute(f"DELETE FROM {table}")
+        else:
+            self._connection.execute(f"DELETE FROM {table} WHERE {hd.FIELD_TYPE} = ?", (record_type,))
+
+    def insert_many(self, table: str, rows: Sequence[Tuple[Any, ...]]):
+        """Inserts rows whose values are in the order of the table's fieldnames."""
+        fieldnames = _tables[table]
+        self._connection.executemany(f"INSERT INTO {table} ({', '.join(fieldnames)}) "
+                                     f"VALUES ({', '.join('?' * len(fieldnames))})", rows)
+
+    def query(self, sql: str, parameters: Sequence[Any] = ()) -> List[Tuple[Any, ...]]:
+        return self._connection.execute(sql, parameters).fetchall()
+
+    def close(self, commit: bool = True):
+        if self._connection is None:
+            return
+
+        try:
+            if commit:
+                for index, (table, columns) in _indexes.items():
+                    self._connection.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({', '.join(columns)})")
+
+                self._connection.execute('COMMIT')
+            else:
+                self._connection.execute('ROLLBACK')
+        finally:
+            self._connection.close()
+            self._connection = None
+
+
+class AppleHealthDataSqliteSink(AppleHealthDataCsvSink):
+    """Loads the rows of an ETL in the database table of its data, replacing the rows of a previous load.
+
+       The sink applies the ETL's element_to_row and include_row, like AppleHealthDataCsvSink.
+    """
+    def __init__(self, etl: AppleHealthDataETLCsv, database: AppleHealthDataSqliteDatabase, sort_data: bool = False,
+                 sort_memory_budget: int = DEFAULT_SORT_MEMORY_BUDGET):
+        super().__init__(etl, sort_data, sort_memory_budget)
+        self._database = database
+        self._fieldnames = _tables[self.table]
+        self._batch: List[Tuple[Any, ...]] = []
+        self._opened = False
+
+    @property
+    def table(self) -> str:
+        if isinstance(self._etl, AppleHealthWorkoutETLCsv):
+            return WORKOUT_TABLE
+
+        if isinstance(self._etl, AppleHealthActivitySummaryETLCsv):
+            return ACTIVITY_SUMMARY_TABLE
+
+        if isinstance(self._etl, AppleHealthRecordETLCsv):
+            return RECORD_TABLE
+
+        raise ValueError(f"{type(self._etl).__name__} does not have a table.")
+
+    @property
+    def name(self) -> str:
+        return f"{self.table} {self.route_key}"
+
+    def open(self):
+        self._database.delete(self.table, self.route_key if self.table == RECORD_TABLE else None)
+        self._opened = True
+
+    def write_row(self, row: Dict[str, Any]):
+        self._batch.append(tuple(map(row.get, self._fieldnames)))
+
+        if len(self._batch) >= self._database.batch_size:
+            self._flush()
+
+    def _flush(self):
+        self._database.insert_many(self.table, self._batch)
+        self._batch = []
+
+    def close(self):
+        if not self._opened:
+            return
+
+        try:
+            if not self._failed:
+                if self._sort_data:
+                    self._write_sorted_rows()
+
+                self._flush()
+        finally:
+            self._rows.close()
+            self._batch = []
+            self._opened = False
@@ -0,0 +1,143 @@
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional
+
+from cls_apple_health_etl_csv import AppleHealthDataETLCsv
+from cls_apple_health_etl_fanout import AppleHealthDataCsvSink
+from cls_external_merge_sort import DEFAULT_SORT_MEMORY_BUDGET
+from cls_sample_summary import SampleSummary, WorkoutSummary
+from summary_quantity_sample import quantity_sample_types, tally_sample_rows, write_sample_summary_file
+from summary_workout_all import tally_workout_rows, write_workout_summary_file
+
+__all__ = [
+    'AppleHealthDataSummarySink',
+    'QuantitySampleSummaryFile',
+    'SummaryFile',
+    'WorkoutSummaryFile'
+]
+
+
+# rows tallied at a time
+_TALLY_ROWS = 1000
+
+
+class SummaryFile(ABC):
+    """A summary file that is tallied from the rows of a dataset, e.g., the rows of a csv file."""
+    def __init__(self, filepath: str):
+        self._filepath = str(filepath)
+
+    @property
+    def filepath(self) -> str:
+        return self._filepath
+
+    @abstractmethod
+    def tally(self, rows: List[Dict[str, Any]]):
+        pass
+
+    @abstractmethod
+    def write(self):
+        """Writes the summary file, unless no row was tallied."""
+        pass
+
+
+class QuantitySampleSummaryFile(SummaryFile):
+    """The daily summary of a quantity sample type's records, like create_sample_summary_file's."""
+    def __init__(self, quantity_sample_type: str, filepath: str, fieldnames: List[str]):
+        if quantity_sample_type not in quantity_sample_types:
+            raise ValueError(f"{quantity_sample_type} is not a valid type.")
+
+        super().__init__(filepath)
+        self._quantity_sample_type = quantity_sample_type
+        self._fieldnames = fieldnames
+        self._summary: Optional[SampleSummary] = None
+
+    def tally(self, rows: List[Dict[str, Any]]):
+        self._summary = tally_sample_rows(self._quantity_sample_type, rows, self._summary)
+
+    def write(self):
+        if self._summary is not None:
+            write_sample_summary_file(self._summary, self._filepath, self._fieldnames)
+
+
+class WorkoutSummaryFile(SummaryFile):
+    """The daily summary of the workouts that include_workout accepts, like create_workout_summary_file's."""
+    def __init__(self, filepath: str, include_workout: Callable[[str], bool], watch_only_data: bool = False):
+        super().__init__(filepath)
+        self._include_workout = include_workout
+        self._watch_only_data = watch_only_data
+        self._summary: Optional[WorkoutSummary] = None
+
+    def tally(self, rows: List[Dict[str, Any]]):
+        self._summary = tally_workout_rows(rows, self._include_workout, self._watch_only_data, self._summary)
+
+    def write(self):
+        if self._summary is not None:
+            write_workout_summary_file(self._summary, self._filepath)
+
+
+class AppleHealthDataSummarySink(AppleHealthDataCsvSink):
+    """Tallies the rows of an ETL's elements in summary files while the xml file is parsed, instead of
+       reading the ETL's csv file after it is written; see AppleHealthDataETLFanOut.
+
+       The rows are tallied in the order they are written to the csv file, sorted if sort_data is set,
+       so the summary files are those of the csv file. The csv file is written only if write_csv is set.
+    """
+    def __init__(self, etl: AppleHealthDataETLCsv, summary_files: List[SummaryFile], write_csv: bool = True,
+                 sort_data: bool = False, sort_memory_budget: int = DEFAULT_SORT_MEMORY_BUDGET):
+        super().__init__(etl, sort_data, sort_memory_budget)
+        self._summary_files = summary_files
+        self._write_csv = write_csv
+        self._pending: List[Dict[str, Any]] = []
+        self._opened = False
+
+    @property
+    def summary_filepaths(self) -> List[str]:
+        return [summary_file.filepath for summary_file in self._summary_files]
+
+    def open(self):
+        if self._write_csv:
+            super().open()
+
+        self._opened = True
+
+    def write_row(self, row: Dict[str, Any]):
+        if self._write_csv:
+            super().write_row(row)
+
+        self._pending.append(row)
+
+        if len(self._pending) >= _TALLY_ROWS:
+            self._tally()
+
+    def _tally(self):
+        for summary_file in self._summary_files:
+            summary_file.tally(self._pending)
+
+        self._pending = []
+
+    def close(self):
+        if not self._opened:
+            return
+
+        self._opened = False
+
+        if self._write_csv:
+            super().close()
+        else:
+            try:
+                if self._sort_data and not self._failed:
+                    self._write_sorted_rows()
+            finally:
+                self._rows.close()
+
+        if self._failed:
+            return
+
+        try:
+            self._tally()
+
+            for summary_file in self._summary_files:
+                summary_file.write()
+        except Exception as e:
+            # the other sinks of the fan-out are closed regardless
+            self._failed = True
+            print(f"{self.name}: {e}\n")
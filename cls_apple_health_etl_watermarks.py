@@ -0,0 +1,58 @@
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional
+import json
+import os
+
+__all__ = [
+    'AppleHealthDataWatermarks',
+    'DatasetWatermark'
+]
+
+
+@dataclass
+class DatasetWatermark:
+    """State of a csv dataset after an incremental ETL run.
+
+       watermark is the latest value of the ETL's watermark field in the dataset; csv_size is the size
+       of the csv file after the run; the rows at and after tail_offset share the watermark value.
+       generation changes whenever the csv file is rewritten or truncated instead of appended to.
+    """
+    watermark: Optional[str]
+    settings: str
+    generation: int
+    csv_size: int
+    tail_offset: int
+
+
+class AppleHealthDataWatermarks:
+    """The watermarks of the csv datasets of a folder, persisted in the folder."""
+    FILENAME = 'etl-watermarks.json'
+
+    def __init__(self, csv_folder: str):
+        self._filepath = os.path.join(str(csv_folder), self.FILENAME)
+        self._datasets: Dict[str, DatasetWatermark] = {}
+
+        if os.path.isfile(self._filepath):
+            with open(self._filepath, 'r', encoding='utf-8') as inf:
+                self._datasets = {name: DatasetWatermark(**state) for name, state in json.load(inf).items()}
+
+    @staticmethod
+    def _dataset_name(csv_filepath: str) -> str:
+        return os.path.basename(str(csv_filepath))
+
+    def get(self, csv_filepath: str) -> Optional[DatasetWatermark]:
+        return self._datasets.get(self._dataset_name(csv_filepath))
+
+    def set(self, csv_filepath: str, watermark: DatasetWatermark):
+        self._datasets[self._dataset_name(csv_filepath)] = watermark
+
+    def discard(self, csv_filepath: str):
+        self._datasets.pop(self._dataset_name(csv_filepath), None)
+
+    def save(self):
+        temp_filepath = f"{self._filepath}.tmp"
+
+        with open(temp_filepath, 'w', encoding='utf-8') as outf:
+            json.dump({name: asdict(state) for name, state in self._datasets.items()}, outf, indent=2)
+
+        os.replace(temp_filepath, self._filepath)
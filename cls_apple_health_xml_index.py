@@ -0,0 +1,194 @@
+from typing import BinaryIO, Dict, List, Optional, Tuple
+import io
+import json
+import os
+import xml.parsers.expat
+
+from constants_apple_health_data import *
+from utils import is_compressed_export
+
+__all__ = [
+    'AppleHealthDataSectionIndex',
+    'AppleHealthDataSectionsReader'
+]
+
+
+ByteRange = Tuple[int, int]
+
+
+class AppleHealthDataSectionsReader(io.RawIOBase):
+    """Reads byte ranges of the xml file as a well-formed HealthData document.
+
+       The ranges are wrapped in a HealthData root element, so the reader can be
+       parsed like the xml file itself.
+    """
+    _HEAD = b'<HealthData>'
+    _TAIL = b'</HealthData>'
+
+    def __init__(self, xml_filepath: str, byte_ranges: List[ByteRange]):
+        self._xml_filepath = xml_filepath
+        self._pending: List[ByteRange] = list(byte_ranges)
+        self._inf: Optional[BinaryIO] = None
+        self._head = self._HEAD
+        self._tail = self._TAIL
+        self._remaining = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        view = memoryview(b)
+
+        if self._head:
+            return self._copy_into(view, '_head')
+
+        while self._remaining == 0 and self._pending:
+            start, end = self._pending.pop(0)
+
+            if self._inf is None:
+                self._inf = open(self._xml_filepath, 'rb')
+
+            self._inf.seek(start)
+            self._remaining = end - start
+
+        if self._remaining > 0:
+            n = self._inf.readinto(view[:min(len(view), self._remaining)])
+
+            if n == 0:
+                raise EOFError(f'{self._xml_filepath} is shorter than its section index.')
+
+            self._remaining -= n
+            return n
+
+        self._close_input()
+        return self._copy_into(view, '_tail')
+
+    def _copy_into(self, view: memoryview, attr: str) -> int:
+        data = getattr(self, attr)
+        n = min(len(view), len(data))
+        view[:n] = data[:n]
+        setattr(self, attr, data[n:])
+        return n
+
+    def _close_input(self):
+        if self._inf is not None:
+            self._inf.close()
+            self._inf = None
+
+    def close(self):
+        self._close_input()
+        super().close()
+
+
+class AppleHealthDataSectionIndex:
+    """Maps each record type, Workout and ActivitySummary to the byte ranges of the
+       xml file that contain them.
+
+       Apple Health clusters the elements of a record type together, so the index of
+       an export has a handful of ranges per key. The index is persisted next to the
+       xml file and is discarded once the xml file's size or modification time change.
+    """
+    SIDECAR_SUFFIX = '.index.json'
+
+    def __init__(self, xml_filepath: str, size: int, mtime_ns: int, sections: Dict[str, List[ByteRange]]):
+        self._xml_filepath = str(xml_filepath)
+        self._size = size
+        self._mtime_ns = mtime_ns
+        self._sections = sections
+
+    @classmethod
+    def sidecar_path(cls, xml_filepath: str) -> str:
+        return f"{xml_filepath}{cls.SIDECAR_SUFFIX}"
+
+    @staticmethod
+    def section_key(tag: str, attrs: Dict[str, str]) -> str:
+        return attrs.get(FIELD_TYPE, '') if tag == RECORD else tag
+
+    @classmethod
+    def build(cls, xml_filepath: str) -> 'AppleHealthDataSectionIndex':
+        if is_compressed_export(xml_filepath):
+            raise ValueError(f'{xml_filepath} is compressed; only an uncompressed xml file can be indexed.')
+
+        stat = os.stat(xml_filepath)
+        parser = xml.parsers.expat.ParserCreate()
+        sections: Dict[str, List[ByteRange]] = {}
+        depth = 0
+        section_key: Optional[str] = None
+        section_start = 0
+
+        def close_section(end: int):
+            if section_key is not None:
+                sections.setdefault(section_key, []).append((section_start, end))
+
+        def start_element(tag: str, attrs: Dict[str, str]):
+            nonlocal depth, section_key, section_start
+            depth += 1
+
+            # children of the HealthData root
+            if depth == 2:
+                key = cls.section_key(tag, attrs)
+
+                if key != section_key:
+                    close_section(parser.CurrentByteIndex)
+                    section_key, section_start = key, parser.CurrentByteIndex
+
+        def end_element(tag: str):
+            nonlocal depth
+            depth -= 1
+
+            if depth == 0:
+                close_section(parser.CurrentByteIndex)
+
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+
+        with open(xml_filepath, 'rb') as inf:
+            parser.ParseFile(inf)
+
+        return cls(xml_filepath, stat.st_size, stat.st_mtime_ns, sections)
+
+    def save(self):
+        with open(self.sidecar_path(self._xml_filepath), 'w', encoding='utf-8') as outf:
+            json.dump({
+                'size': self._size,
+                'mtime_ns': self._mtime_ns,
+                'sections': self._sections
+            }, outf)
+
+    @classmethod
+    def load(cls, xml_filepath: str) -> Optional['AppleHealthDataSectionIndex']:
+        """Returns the persisted index of the xml file; None if there is no index or it is stale."""
+        sidecar = cls.sidecar_path(xml_filepath)
+
+        if is_compressed_export(xml_filepath) or not os.path.isfile(sidecar):
+            return None
+
+        with open(sidecar, 'r', encoding='utf-8') as inf:
+            saved = json.load(inf)
+
+        stat = os.stat(xml_filepath)
+
+        if saved['size'] != stat.st_size or saved['mtime_ns'] != stat.st_mtime_ns:
+            return None
+
+        sections = {key: [tuple(byte_range) for byte_range in ranges] for key, ranges in saved['sections'].items()}
+        return cls(xml_filepath, saved['size'], saved['mtime_ns'], sections)
+
+    @classmethod
+    def load_or_build(cls, xml_filepath: str) -> 'AppleHealthDataSectionIndex':
+        index = cls.load(xml_filepath)
+
+        if index is None:
+            index = cls.build(xml_filepath)
+            index.save()
+
+        return index
+
+    def keys(self) -> List[str]:
+        return list(self._sections.keys())
+
+    def sections(self, key: str) -> List[ByteRange]:
+        return self._sections.get(key, [])
+
+    def open_sections(self, key: str) -> AppleHealthDataSectionsReader:
+        return AppleHealthDataSectionsReader(self._xml_filepath, self.sections(key))
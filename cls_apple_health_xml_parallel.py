@@ -0,0 +1,162 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Deque, List, Optional, Tuple
+import io
+import os
+import re
+import xml.etree.ElementTree as et
+
+from cls_apple_health_xml_parsers import ETREE_BACKEND
+from cls_apple_health_xml_streams import AppleHealthDataElementsStream
+from utils import is_compressed_export
+
+__all__ = [
+    'AppleHealthDataParallelElementsStream',
+    'xml_chunk_boundaries'
+]
+
+
+ByteRange = Tuple[int, int]
+
+# Apple Health indents the children of HealthData with one space; nested elements,
+# e.g., the Records of a Correlation, are indented further.
+_re_root_child_start = re.compile(rb'\n <(?:Record|Correlation|Workout|ActivitySummary|ClinicalRecord|Audiogram)[\s/>]')
+_re_health_data_start = re.compile(rb'<HealthData[^>]*>')
+_HEALTH_DATA_END = b'</HealthData>'
+_PROLOG_SCAN_SIZE = 1 << 20
+_BOUNDARY_SCAN_SIZE = 1 << 20
+
+
+def _health_data_body(inf, size: int) -> ByteRange:
+    inf.seek(0)
+    prolog = inf.read(min(size, _PROLOG_SCAN_SIZE))
+    match = _re_health_data_start.search(prolog)
+
+    if match is None:
+        raise ValueError('HealthData element is not found.')
+
+    tail_start = max(0, size - 4096)
+    inf.seek(tail_start)
+    end = inf.read().rfind(_HEALTH_DATA_END)
+
+    if end < 0:
+        raise ValueError('HealthData end tag is not found.')
+
+    return match.end(), tail_start + end
+
+
+def _next_root_child_start(inf, offset: int, body_end: int) -> int:
+    while offset < body_end:
+        inf.seek(offset)
+        buffer = inf.read(min(_BOUNDARY_SCAN_SIZE, body_end - offset))
+        match = _re_root_child_start.search(buffer)
+
+        if match is not None:
+            return offset + match.start() + 1
+
+        # keep enough bytes to match a boundary that straddles two reads
+        offset += max(1, len(buffer) - 32)
+
+    return body_end
+
+
+def xml_chunk_boundaries(xml_filepath: str, chunk_size: int) -> List[ByteRange]:
+    """Splits the children of HealthData into byte ranges of about chunk_size bytes.
+       Every range starts at a child of HealthData.
+    """
+    if is_compressed_export(xml_filepath):
+        raise ValueError(f'{xml_filepath} is compressed; only an uncompressed xml file can be split into chunks.')
+
+    size = os.path.getsize(xml_filepath)
+
+    with open(xml_filepath, 'rb') as inf:
+        body_start, body_end = _health_data_body(inf, size)
+        boundaries = []
+        start = body_start
+
+        while start < body_end:
+            end = _next_root_child_start(inf, start + chunk_size, body_end) if start + chunk_size < body_end \
+                else body_end
+            boundaries.append((start, end))
+            start = end
+
+    return boundaries
+
+
+def _parse_chunk(xml_filepath: str,
+                 byte_range: ByteRange,
+                 converter: Optional[Callable[[et.Element], Any]],
+                 parser_backend: str) -> List[Any]:
+    start, end = byte_range
+
+    with open(xml_filepath, 'rb') as inf:
+        inf.seek(start)
+        chunk = b'<HealthData>' + inf.read(end - start) + b'</HealthData>'
+
+    elements = AppleHealthDataElementsStream(io.BytesIO(chunk), parser_backend)
+
+    if converter is None:
+        return list(elements)
+
+    return [converted for converted in map(converter, elements) if converted is not None]
+
+
+class AppleHealthDataParallelElementsStream:
+    """Returns the same elements as AppleHealthDataElementsStream, in the same order,
+       by parsing chunks of the xml file in a process pool.
+
+       converter must be picklable, e.g., utils.element_to_dict; the stream returns
+       the converted elements, except those converted to None. The elements are converted
+       by the processes, so only the converted elements are pickled back to the receiver.
+    """
+    def __init__(self, xml_filepath: str,
+                 converter: Optional[Callable[[et.Element], Any]] = None,
+                 max_workers: Optional[int] = None,
+                 chunk_size: int = 32 << 20,
+                 parser_backend: str = ETREE_BACKEND):
+        self._xml_filepath = str(xml_filepath)
+        self._converter = converter
+        self._parser_backend = parser_backend
+        self._max_workers = max_workers or os.cpu_count() or 1
+        self._chunks: Deque[ByteRange] = deque(xml_chunk_boundaries(self._xml_filepath, chunk_size))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: Deque[Future] = deque()
+        self._parsed: Deque[Any] = deque()
+
+    def __enter__(self):
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while not self._parsed:
+            if not self._pending and not self._chunks:
+                self.close()
+                raise StopIteration
+
+            self._submit_chunks()
+            self._parsed.extend(self._pending.popleft().result())
+
+        return self._parsed.popleft()
+
+    def _submit_chunks(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self._max_workers)
+
+        # keep the workers busy without reading far ahead of the receiver
+        while self._chunks and len(self._pending) < 2 * self._max_workers:
+            self._pending.append(self._executor.submit(_parse_chunk, self._xml_filepath,
+                                                       self._chunks.popleft(), self._converter,
+                                                       self._parser_backend))
+
+    def close(self):
+        if self._executor is not None:
+            for future in self._pending:
+                future.cancel()
+
+            self._executor.shutdown()
+            self._executor = None
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,386 @@
+from collections import deque
+from typing import BinaryIO, Callable, Deque, Dict, Iterator, List, Optional, Pattern, Tuple, Union
+import mmap
+import os
+import re
+import xml.etree.ElementTree as et
+import xml.parsers.expat
+
+from constants_apple_health_data import *
+
+__all__ = [
+    'ETREE_BACKEND',
+    'EXPAT_BACKEND',
+    'REGEX_BACKEND',
+    'XML_PARSER_BACKENDS',
+    'expat_health_elements',
+    'regex_health_elements',
+    'regex_record_rows'
+]
+
+
+ETREE_BACKEND = 'etree'
+EXPAT_BACKEND = 'expat'
+REGEX_BACKEND = 'regex'
+
+XmlSource = Union[str, os.PathLike, BinaryIO]
+
+_BLOCK_SIZE = 1 << 20
+
+
+class _HealthElementsBuilder:
+    """Builds the elements whose tags are in HEALTH_ROOT_CHILDREN, including their
+       children, and drops everything else, e.g., the HealthData root.
+
+       If record_type is set, the Records of other types that are children of the root are dropped,
+       and the builder is exhausted at the first child of the root that follows the Records of
+       record_type, like AppleHealthDataRecordTypeStream.
+    """
+    def __init__(self, record_type: Optional[str] = None):
+        self._record_type = record_type
+        self._record_type_found = False
+        self._stack: List[Optional[et.Element]] = []
+        self.completed: Deque[et.Element] = deque()
+        self.exhausted = False
+
+    @property
+    def depth(self) -> int:
+        return len(self._stack)
+
+    @property
+    def record_type_found(self) -> bool:
+        return self._record_type_found
+
+    def start(self, tag: str, attrs: Dict[str, str]):
+        parent = self._stack[-1] if self._stack else None
+
+        if parent is not None:
+            elem = et.SubElement(parent, tag, attrs)
+        elif tag in HEALTH_ROOT_CHILDREN and self._stack and not self.exhausted:
+            elem = et.Element(tag, attrs) if self._is_wanted(tag, attrs) else None
+        else:
+            elem = None
+
+        self._stack.append(elem)
+
+    def _is_wanted(self, tag: str, attrs: Dict[str, str]) -> bool:
+        if self._record_type is None:
+            return True
+
+        if tag == RECORD and attrs.get(FIELD_TYPE) == self._record_type:
+            self._record_type_found = True
+            return True
+
+        # records of the same record type are clustered together in the xml file
+        self.exhausted = self._record_type_found
+        return False
+
+    def end(self, tag: str = ''):
+        elem = self._stack.pop()
+
+        if elem is not None and elem.tag in HEALTH_ROOT_CHILDREN:
+            self.completed.append(elem)
+
+
+def _read_blocks(source: XmlSource, block_size: int) -> Iterator[bytes]:
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as inf:
+            yield from iter(lambda: inf.read(block_size), b'')
+    else:
+        yield from iter(lambda: source.read(block_size), b'')
+
+
+def expat_health_elements(source: XmlSource,
+                          record_type: Optional[str] = None,
+                          block_size: int = _BLOCK_SIZE) -> Iterator[et.Element]:
+    """Returns the elements of AppleHealthDataElementsStream, in the same order, using
+       expat handlers that create the elements straight from expat's attribute dicts.
+
+       If record_type is set, the Records of other types are not returned.
+    """
+    builder = _HealthElementsBuilder(record_type)
+    parser = xml.parsers.expat.ParserCreate()
+    parser.StartElementHandler = builder.start
+    parser.EndElementHandler = builder.end
+
+    for block in _read_blocks(source, block_size):
+        parser.Parse(block, False)
+
+        while builder.completed:
+            yield builder.completed.popleft()
+
+        if builder.exhausted:
+            return
+
+    parser.Parse(b'', True)
+
+    while builder.completed:
+        yield builder.completed.popleft()
+
+
+# Apple Health writes attribute values in double quotes and escapes '<' and '>'
+_re_tag = re.compile(rb'<(/?)([A-Za-z_][\w.:-]*)([^>]*)>')
+_re_attribute = re.compile(r'([^\s=]+)\s*=\s*"([^"]*)"')
+_re_reference = re.compile(r'&(#x[0-9a-fA-F]+|#[0-9]+|lt|gt|amp|quot|apos);')
+_re_attribute_whitespace = re.compile(r'\r\n|[\t\n\r]')
+
+_entities = {'lt': '<', 'gt': '>', 'amp': '&', 'quot': '"', 'apos': "'"}
+
+
+def _replace_reference(match) -> str:
+    name = match.group(1)
+
+    if name[0] != '#':
+        return _entities[name]
+
+    return chr(int(name[2:], 16)) if name[1] == 'x' else chr(int(name[1:]))
+
+
+def _normalize_attribute_value(value: str) -> str:
+    """Replaces literal whitespace characters with spaces and then resolves the references,
+       like an xml parser's attribute-value normalization.
+    """
+    if '\n' in value or '\t' in value or '\r' in value:
+        value = _re_attribute_whitespace.sub(' ', value)
+
+    if '&' not in value:
+        return value
+
+    if '&#' in value:
+        return _re_reference.sub(_replace_reference, value)
+
+    # '&amp;' is replaced last so that the escaped references, e.g., '&amp;lt;', stay literal
+    return value.replace('&lt;', '<').replace('&gt;', '>').replace('&quot;', '"').replace('&apos;', "'") \
+        .replace('&amp;', '&')
+
+
+def _attribute_dict(text: str) -> Dict[str, str]:
+    attrs = dict(_re_attribute.findall(text))
+
+    if '&' in text or '\n' in text or '\t' in text or '\r' in text:
+        for name, value in attrs.items():
+            attrs[name] = _normalize_attribute_value(value)
+
+    return attrs
+
+
+def _scan_tags(builder: _HealthElementsBuilder, buffer, start: int, end: int,
+               record_start: Optional[Pattern] = None) -> Iterator[et.Element]:
+    pos = start
+
+    while not builder.exhausted:
+        if record_start is not None and builder.depth == 1:
+            if builder.record_type_found:
+                # the Records of the requested type end at the first tag that does not start one
+                pos = buffer.find(b'<', pos, end)
+
+                if pos < 0:
+                    return
+
+                if record_start.match(buffer, pos) is None:
+                    builder.exhausted = True
+                    return
+            else:
+                # skip to the first Record of the requested type
+                match = record_start.search(buffer, pos, end)
+
+                if match is None:
+                    return
+
+                pos = match.start()
+
+        match = _re_tag.search(buffer, pos, end)
+
+        if match is None:
+            return
+
+        pos = match.end()
+        closing, tag, attributes = match.groups()
+
+        if closing:
+            builder.end()
+        else:
+            text = attributes.decode('utf-8')
+            builder.start(tag.decode('utf-8'), _attribute_dict(text))
+
+            if text.endswith('/'):
+                builder.end()
+
+        while builder.completed:
+            yield builder.completed.popleft()
+
+
+def regex_health_elements(source: XmlSource,
+                          record_type: Optional[str] = None,
+                          block_size: int = 16 * _BLOCK_SIZE) -> Iterator[et.Element]:
+    """Returns the elements of AppleHealthDataElementsStream, in the same order, by scanning
+       the tags of the xml file with a regular expression.
+
+       If record_type is set, only Records of record_type are returned, and the scanner jumps
+       from one Record of the type to the next without parsing the elements in between.
+
+       An xml file path is memory-mapped. The scanner relies on the layout of Apple Health
+       exports: no markup in comments or CDATA sections of the HealthData element, attribute
+       values in double quotes, and type as the first attribute of a Record. Use the etree or
+       expat backends for other xml files.
+    """
+    builder = _HealthElementsBuilder(record_type)
+    record_start = None
+
+    if record_type is not None:
+        record_start = re.compile(b'<' + RECORD.encode('utf-8') + b' ' + FIELD_TYPE.encode('utf-8') + b'="' +
+                                  re.escape(record_type.encode('utf-8')) + b'"')
+        # the Records are children of the HealthData root that is skipped over
+        builder.start(HEALTH_DATA, {})
+
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as inf, mmap.mmap(inf.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield from _scan_tags(builder, buffer, 0, len(buffer), record_start)
+    else:
+        carry = b''
+
+        for block in _read_blocks(source, block_size):
+            buffer = carry + block
+            end = buffer.rfind(b'>') + 1
+            yield from _scan_tags(builder, buffer, 0, end, record_start)
+
+            if builder.exhausted:
+                return
+
+            carry = buffer[end:]
+
+        yield from _scan_tags(builder, carry, 0, len(carry), record_start)
+
+
+_re_attribute_name = re.compile(r'\s*([A-Za-z_][\w.:-]*)\s*=\s*')
+_re_tag_tail = re.compile(r'\s*/?')
+
+
+def _attribute_names(parts: Tuple[str, ...]) -> Optional[Tuple[str, ...]]:
+    """Returns the names of the attributes whose values are between the parts, e.g., ('type=', ' unit=', '/'),
+       or None if the parts are not those of double-quoted attributes.
+    """
+    matches = [_re_attribute_name.fullmatch(part) for part in parts[:-1]]
+
+    if None in matches or _re_tag_tail.fullmatch(parts[-1]) is None:
+        return None
+
+    return tuple(match.group(1) for match in matches)
+
+
+class _RecordRowsScanner:
+    """Scans the Records of a record type into their attribute dicts a buffer at a time."""
+    def __init__(self, record_type: str):
+        record_tag = b'<' + RECORD.encode('utf-8')
+        type_attribute = FIELD_TYPE.encode('utf-8') + b'="' + record_type.encode('utf-8') + b'"'
+        self._record_start = record_tag + b' ' + type_attribute
+        self._record = re.compile(re.escape(record_tag) + rb'\s(' + re.escape(type_attribute) + rb'[^>]*)>')
+        # a child of HealthData, indented by a space, that is not a Record of the type
+        self._records_end = re.compile(rb'\n <(?!/|' + re.escape(self._record_start[1:]) + rb'[\s/>])')
+        self._child_start = b'\n <'
+        self._layouts: Dict[Tuple[str, ...], Optional[Tuple[str, ...]]] = {}
+        self.found = False
+        self.exhausted = False
+
+    def scan(self, buffer, start: int, end: int, final: bool) -> Tuple[List[Dict[str, str]], int]:
+        """Returns the rows of the Records in buffer[start:end] and the offset to scan from with more data."""
+        if not self.found:
+            pos = buffer.find(self._record_start, start, end)
+
+            if pos < 0:
+                return [], max(start, end - len(self._record_start))
+
+            self.found = True
+        else:
+            pos = start
+
+        # the Records are complete up to the last child of HealthData that starts in the buffer
+        limit = end if final else buffer.rfind(self._child_start, pos, end)
+
+        if limit <= pos:
+            return [], pos
+
+        match = self._records_end.search(buffer, pos, end)
+
+        if match is not None and match.start() < limit:
+            limit = match.start()
+            self.exhausted = True
+
+        return self._rows(self._record.findall(buffer, pos, limit)), limit
+
+    def _rows(self, found: List[bytes]) -> List[Dict[str, str]]:
+        if not found:
+            return []
+
+        rows = []
+
+        for attributes in b'\0'.join(found).decode('utf-8').split('\0'):
+            text = attributes
+
+            if '\n' in text or '\t' in text or '\r' in text:
+                text = _re_attribute_whitespace.sub(' ', text)
+
+            if '&' in text:
+                if '&quot;' in text or '&#' in text:
+                    # the references may be quotes, which the split below cannot tell from the delimiters
+                    rows.append(_attribute_dict(attributes))
+                    continue
+
+                # '&amp;' is replaced last so that the escaped references, e.g., '&amp;lt;', stay literal
+                text = text.replace('&lt;', '<').replace('&gt;', '>').replace('&apos;', "'").replace('&amp;', '&')
+
+            parts = text.split('"')
+            separators = tuple(parts[0::2])
+            names = self._layouts.get(separators, False)
+
+            if names is False:
+                names = self._layouts[separators] = _attribute_names(separators)
+
+            rows.append(_attribute_dict(attributes) if names is None else dict(zip(names, parts[1::2])))
+
+        return rows
+
+
+def regex_record_rows(source: XmlSource,
+                      record_type: str,
+                      block_size: int = 16 * _BLOCK_SIZE) -> Iterator[Dict[str, str]]:
+    """Returns the attribute dicts of the Records of regex_health_elements(source, record_type),
+       the rows of utils.element_to_dict, without building their elements: the start tags of the
+       Records are split into dicts a block at a time.
+
+       Besides the layout that regex_health_elements relies on, the scanner relies on the indentation
+       of Apple Health exports, a space before each child of HealthData, to find where the Records of
+       record_type end.
+    """
+    scanner = _RecordRowsScanner(record_type)
+
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as inf, mmap.mmap(inf.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            start = end = 0
+
+            while not scanner.exhausted and end < len(buffer):
+                # a block without a complete Record is scanned again with the next one
+                end = min(max(start, end) + block_size, len(buffer))
+                rows, start = scanner.scan(buffer, start, end, end == len(buffer))
+                yield from rows
+    else:
+        carry = b''
+
+        for block in _read_blocks(source, block_size):
+            buffer = carry + block
+            rows, start = scanner.scan(buffer, 0, len(buffer), False)
+            yield from rows
+
+            if scanner.exhausted:
+                return
+
+            carry = buffer[start:]
+
+        rows, _ = scanner.scan(carry, 0, len(carry), True)
+        yield from rows
+
+
+XML_PARSER_BACKENDS: Dict[str, Callable[[XmlSource, Optional[str]], Iterator[et.Element]]] = {
+    EXPAT_BACKEND: expat_health_elements,
+    REGEX_BACKEND: regex_health_elements
+}
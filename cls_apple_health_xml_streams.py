@@ -1,29 +1,73 @@
+from typing import BinaryIO, Dict, Iterator, Optional, Union
+import os
 import xml.etree.ElementTree as et
 
+from cls_apple_health_xml_index import AppleHealthDataSectionIndex
+from cls_apple_health_xml_parsers import ETREE_BACKEND, REGEX_BACKEND, XML_PARSER_BACKENDS, regex_record_rows
 from constants_apple_health_data import *
+from utils import element_to_dict, is_compressed_export, open_health_export_xml
 
 __all__ = [
     'AppleHealthDataElementsStream',
     'AppleHealthDataActivitySummaryStream',
     'AppleHealthDataRecordStream',
     'AppleHealthDataRecordTypeStream',
+    'AppleHealthDataRecordTypeRowsStream',
     'AppleHealthDataWorkoutStream'
 ]
 
 
+def indexed_source(xml_filepath: str, section_key: str) -> Union[str, BinaryIO]:
+    """Returns a reader of the sections of section_key if the xml file has an up-to-date
+       section index; otherwise returns the xml file path.
+    """
+    if is_compressed_export(xml_filepath):
+        return xml_filepath
+
+    index = AppleHealthDataSectionIndex.load(xml_filepath)
+    return xml_filepath if index is None else index.open_sections(section_key)
+
+
 class XmlStream:
-    def __init__(self, filepath: str):
+    """Returns the elements of the xml file as their end tags are parsed.
+
+       parser_backend selects the parser: etree (xml.etree.ElementTree.iterparse), expat or
+       regex (see cls_apple_health_xml_parsers). The expat and regex backends return only the
+       elements whose tags are in HEALTH_ROOT_CHILDREN, with their children, and they skip the
+       Records that are not of record_type if record_type is set.
+
+       filepath can also be the export archive (.zip) or a gzip-compressed xml file (.gz);
+       the archive's export.xml is decompressed as it is parsed.
+    """
+    def __init__(self, filepath: Union[str, os.PathLike, BinaryIO],
+                 parser_backend: str = ETREE_BACKEND,
+                 record_type: Optional[str] = None):
+        self._export_file: Optional[BinaryIO] = None
+
+        if isinstance(filepath, (str, os.PathLike)) and is_compressed_export(filepath):
+            self._export_file = filepath = open_health_export_xml(filepath)
+
         self._filepath = filepath
         self._context = None
         self._root = None
-        self._context = et.iterparse(self._filepath, events=("start", "end"))
-        self._clear_root: bool = False
-        event, self._root = next(self._context)
+        self._elements = None
+
+        if parser_backend == ETREE_BACKEND:
+            self._context = et.iterparse(self._filepath, events=("start", "end"))
+            self._clear_root: bool = False
+            event, self._root = next(self._context)
+        elif parser_backend in XML_PARSER_BACKENDS:
+            self._elements = XML_PARSER_BACKENDS[parser_backend](self._filepath, record_type)
+        else:
+            raise ValueError(f'{parser_backend} parser backend is not supported.')
 
     def __enter__(self):
         return self
 
     def __next__(self):
+        if self._elements is not None:
+            return next(self._elements)
+
         if self._clear_root:
             self._root.clear()
             self._clear_root = False
@@ -41,6 +85,11 @@ class XmlStream:
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self._context = None
+        self._elements = None
+
+        if self._export_file is not None:
+            self._export_file.close()
+            self._export_file = None
 
 
 class AppleHealthDataElementsStream(XmlStream):
@@ -57,8 +106,8 @@ class AppleHealthDataElementsStream(XmlStream):
 
 
 class AppleHealthDataActivitySummaryStream(AppleHealthDataElementsStream):
-    def __init__(self, xml_filepath: str):
-        super().__init__(xml_filepath)
+    def __init__(self, xml_filepath: str, parser_backend: str = ETREE_BACKEND):
+        super().__init__(indexed_source(xml_filepath, ACTIVITY_SUMMARY), parser_backend)
         self._activity_summary_found = False
 
     def __next__(self):
@@ -72,8 +121,8 @@ class AppleHealthDataActivitySummaryStream(AppleHealthDataElementsStream):
 
 
 class AppleHealthDataRecordStream(AppleHealthDataElementsStream):
-    def __init__(self, xml_filepath: str):
-        super().__init__(xml_filepath)
+    def __init__(self, xml_filepath: str, parser_backend: str = ETREE_BACKEND):
+        super().__init__(xml_filepath, parser_backend)
         self._record_found = False
 
     def __next__(self):
@@ -118,12 +167,12 @@ class AppleHealthDataRecordStream(AppleHealthDataElementsStream):
 
 
 class AppleHealthDataRecordTypeStream(AppleHealthDataElementsStream):
-    def __init__(self, xml_filepath: str, record_type: str):
-        super().__init__(xml_filepath)
-
+    def __init__(self, xml_filepath: str, record_type: str, parser_backend: str = ETREE_BACKEND):
         if not AppleHealthDataRecordStream.is_supported_record_type(record_type):
             raise ValueError(f'{record_type} is not supported.')
 
+        super().__init__(indexed_source(xml_filepath, record_type), parser_backend, record_type)
+
         self._record_type = record_type
         self._record_type_found = False
 
@@ -142,8 +191,8 @@ class AppleHealthDataRecordTypeStream(AppleHealthDataElementsStream):
 
 
 class AppleHealthDataWorkoutStream(AppleHealthDataElementsStream):
-    def __init__(self, xml_filepath: str):
-        super().__init__(xml_filepath)
+    def __init__(self, xml_filepath: str, parser_backend: str = ETREE_BACKEND):
+        super().__init__(indexed_source(xml_filepath, WORKOUT), parser_backend)
         self._workout_found = False
 
     def __next__(self):
@@ -156,3 +205,42 @@ class AppleHealthDataWorkoutStream(AppleHealthDataElementsStream):
                 raise StopIteration
 
 
+class AppleHealthDataRecordTypeRowsStream:
+    """Returns the attribute dicts of the elements of AppleHealthDataRecordTypeStream, i.e., their
+       element_to_dict rows.
+
+       The regex backend splits the Records' start tags straight into the dicts, without building
+       the elements (see regex_record_rows); the other backends convert the elements.
+    """
+    def __init__(self, xml_filepath: str, record_type: str, parser_backend: str = ETREE_BACKEND):
+        self._export_file: Optional[BinaryIO] = None
+
+        if parser_backend != REGEX_BACKEND:
+            self._rows: Iterator[Dict[str, str]] = map(element_to_dict,
+                                                      AppleHealthDataRecordTypeStream(xml_filepath, record_type,
+                                                                                      parser_backend))
+            return
+
+        if not AppleHealthDataRecordStream.is_supported_record_type(record_type):
+            raise ValueError(f'{record_type} is not supported.')
+
+        source = indexed_source(xml_filepath, record_type)
+
+        if isinstance(source, (str, os.PathLike)) and is_compressed_export(source):
+            self._export_file = source = open_health_export_xml(source)
+
+        self._rows = regex_record_rows(source, record_type)
+
+    def __enter__(self):
+        return self
+
+    def __next__(self) -> Dict[str, str]:
+        return next(self._rows)
+
+    def __iter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._export_file is not None:
+            self._export_file.close()
+            self._export_file = None
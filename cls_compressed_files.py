@@ -0,0 +1,175 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Optional, TextIO, Union
+import bz2
+import gzip
+import io
+import lzma
+import os
+import threading
+
+__all__ = [
+    'COMPRESSION_SUFFIXES',
+    'DEFAULT_COMPRESSION_BLOCK_SIZE',
+    'ParallelBlockCompressor',
+    'compression_suffix',
+    'is_compressed_file',
+    'open_text_input',
+    'open_text_output'
+]
+
+
+DEFAULT_COMPRESSION_BLOCK_SIZE = 1024 * 1024
+
+_COMPRESSION_WORKERS = os.cpu_count() or 1
+
+
+def _gzip_block(block: bytes) -> bytes:
+    # mtime=0 keeps the output of the same rows identical from run to run
+    return gzip.compress(block, compresslevel=6, mtime=0)
+
+
+# each block is compressed to a gzip member, a bz2 stream or an xz stream of its own; gzip.open, bz2.open
+# and lzma.open read the concatenated members or streams of a file as a single file
+_compressors: Dict[str, Callable[[bytes], bytes]] = {
+    '.gz': _gzip_block,
+    '.bz2': bz2.compress,
+    '.xz': lzma.compress
+}
+
+_openers = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open
+}
+
+COMPRESSION_SUFFIXES = tuple(_compressors)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _compression_executor() -> ThreadPoolExecutor:
+    """The threads that compress the blocks of every ParallelBlockCompressor.
+       zlib, bz2 and lzma release the GIL while they compress a block.
+    """
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_COMPRESSION_WORKERS, thread_name_prefix='compress')
+
+        return _executor
+
+
+def compression_suffix(filepath: Union[str, os.PathLike]) -> Optional[str]:
+    """Returns the compression suffix of filepath, e.g., '.gz' of heart-rate.csv.gz, None if it has none."""
+    lower_filepath = str(filepath).lower()
+
+    for suffix in COMPRESSION_SUFFIXES:
+        if lower_filepath.endswith(suffix):
+            return suffix
+
+    return None
+
+
+def is_compressed_file(filepath: Union[str, os.PathLike]) -> bool:
+    return compression_suffix(filepath) is not None
+
+
+class ParallelBlockCompressor(io.BufferedIOBase):
+    """A binary stream that compresses what is written to it in independent blocks of block_size bytes.
+
+       The blocks are compressed by a pool of threads shared by the compressors, and the compressed blocks
+       are written to raw in the order of the blocks. The writer waits for the oldest block only when
+       max_pending blocks are being compressed. The file is not seekable.
+    """
+    def __init__(self, raw: io.RawIOBase, compress: Callable[[bytes], bytes],
+                 block_size: int = DEFAULT_COMPRESSION_BLOCK_SIZE, max_pending: Optional[int] = None):
+        super().__init__()
+
+        if block_size < 1:
+            raise ValueError('block_size must be positive.')
+
+        self._raw = raw
+        self._compress = compress
+        self._block_size = block_size
+        self._executor = _compression_executor()
+        self._max_pending = max_pending or 2 * _COMPRESSION_WORKERS
+        self._block = bytearray()
+        self._pending: Deque[Future] = deque()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        if self.closed:
+            raise ValueError('write to closed file.')
+
+        self._block += b
+
+        while len(self._block) >= self._block_size:
+            self._submit(bytes(self._block[:self._block_size]))
+            del self._block[:self._block_size]
+
+        return len(b)
+
+    def _submit(self, block: bytes):
+        while len(self._pending) >= self._max_pending:
+            self._raw.write(self._pending.popleft().result())
+
+        self._pending.append(self._executor.submit(self._compress, block))
+
+    def _write_compressed(self, wait: bool):
+        while self._pending and (wait or self._pending[0].done()):
+            self._raw.write(self._pending.popleft().result())
+
+    def flush(self):
+        # a partial block is compressed when it is full or when the file is closed, not when it is flushed,
+        # so that flushes do not shrink the blocks
+        if not self.closed:
+            self._write_compressed(wait=False)
+
+    def close(self):
+        if self.closed:
+            return
+
+        try:
+            if self._block:
+                self._submit(bytes(self._block))
+                self._block.clear()
+
+            self._write_compressed(wait=True)
+        finally:
+            self._pending.clear()
+            self._raw.close()
+            super().close()
+
+
+def open_text_output(filepath: Union[str, os.PathLike], mode: str = 'w', encoding: str = 'utf-8',
+                     buffering: int = -1, block_size: int = DEFAULT_COMPRESSION_BLOCK_SIZE) -> TextIO:
+    """Opens filepath for writing, mode 'w', or appending, mode 'a', as a text file.
+
+       A .gz, .bz2 or .xz file is compressed by a ParallelBlockCompressor; an appended file gets
+       blocks of its own after the blocks of the file. buffering applies only to uncompressed files.
+    """
+    if mode not in ('w', 'a'):
+        raise ValueError(f"mode must be 'w' or 'a', not {mode!r}.")
+
+    suffix = compression_suffix(filepath)
+
+    if suffix is None:
+        return open(filepath, mode, encoding=encoding, buffering=buffering)
+
+    compressor = ParallelBlockCompressor(open(filepath, f"{mode}b", buffering=0), _compressors[suffix], block_size)
+    return io.TextIOWrapper(compressor, encoding=encoding)
+
+
+def open_text_input(filepath: Union[str, os.PathLike], encoding: str = 'utf-8') -> TextIO:
+    """Opens filepath for reading as a text file; a .gz, .bz2 or .xz file is decompressed as it is read."""
+    suffix = compression_suffix(filepath)
+
+    if suffix is None:
+        return open(filepath, 'r', encoding=encoding)
+
+    return _openers[suffix](filepath, 'rt', encoding=encoding)
@@ -0,0 +1,74 @@
+from itertools import repeat
+from typing import Any, Callable, Dict, List, Optional, Sequence, TextIO, Tuple
+import csv
+
+__all__ = [
+    'CSV_WRITE_BUFFER_SIZE',
+    'CsvBatchWriter',
+    'DEFAULT_CSV_BATCH_ROWS'
+]
+
+
+DEFAULT_CSV_BATCH_ROWS = 1000
+
+# buffering of the csv files that are written one at a time
+CSV_WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+class CsvBatchWriter:
+    """A csv.DictWriter replacement for the known fieldnames of a dataset.
+
+       writerow renders a row dict to a tuple in the order of fieldnames, a missing field as '', and the
+       tuples are written by csv.writer.writerows in batches of batch_rows. A row that has a field which is
+       not in fieldnames is malformed: it is passed to on_malformed, with the ValueError that DictWriter would
+       have raised, and left out; without on_malformed the ValueError is raised.
+
+       flush writes the pending rows to outf; it must be called before outf is closed or its position is read.
+    """
+    def __init__(self, outf: TextIO, fieldnames: Sequence[str], batch_rows: int = DEFAULT_CSV_BATCH_ROWS,
+                 on_malformed: Optional[Callable[[Dict[str, Any], ValueError], None]] = None):
+        if batch_rows < 1:
+            raise ValueError('batch_rows must be positive.')
+
+        self._fieldnames = list(fieldnames)
+        self._fieldset = frozenset(self._fieldnames)
+        self._restvals = tuple(repeat('', len(self._fieldnames)))
+        self._writer = csv.writer(outf)
+        self._batch_rows = batch_rows
+        self._on_malformed = on_malformed
+        self._pending: List[Tuple[Any, ...]] = []
+
+    @property
+    def fieldnames(self) -> List[str]:
+        return self._fieldnames
+
+    def writeheader(self):
+        self._pending.append(tuple(self._fieldnames))
+
+    def _malformed(self, row: Dict[str, Any]):
+        wrong_fields = [field for field in row if field not in self._fieldset]
+        error = ValueError("dict contains fields not in fieldnames: " + ", ".join(map(repr, wrong_fields)))
+
+        if self._on_malformed is None:
+            raise error
+
+        self._on_malformed(row, error)
+
+    def writerow(self, row: Dict[str, Any]):
+        if not row.keys() <= self._fieldset:
+            self._malformed(row)
+            return
+
+        self._pending.append(tuple(map(row.get, self._fieldnames, self._restvals)))
+
+        if len(self._pending) >= self._batch_rows:
+            self.flush()
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def flush(self):
+        if self._pending:
+            self._writer.writerows(self._pending)
+            self._pending.clear()
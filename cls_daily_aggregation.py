@@ -0,0 +1,280 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import time
+
+import numpy as np
+
+from cls_apple_health_etl_npy import AppleHealthRecordColumns
+from cls_healthkit import HKRecord
+from cls_sample_summary import QuantitySampleSummaryRecord
+from utils import is_device_watch
+
+import constants_apple_health_data as hd
+
+__all__ = [
+    'DEFAULT_AGGREGATION_BATCH_ROWS',
+    'STATISTICS',
+    'DailyQuantityAggregation',
+    'aggregate_record_columns',
+    'local_day_numbers'
+]
+
+
+STATISTICS = ('sum', 'mean', 'min', 'max', 'count', 'std')
+
+DEFAULT_AGGREGATION_BATCH_ROWS = 1 << 22
+
+_SECONDS_PER_DAY = 86400
+_SECONDS_PER_HOUR = 3600
+
+
+def _utc_offset(epoch: int) -> int:
+    return time.localtime(epoch).tm_gmtoff
+
+
+def _utc_offset_transitions(first: int, last: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns the epochs from which the local timezone's utc offset holds between first and last, starting
+       with first, and the offsets. The offset is assumed to change at most once an hour.
+    """
+    epochs = [first]
+    offsets = [_utc_offset(first)]
+    previous = first
+
+    for hour in range(first - first % _SECONDS_PER_HOUR + _SECONDS_PER_HOUR, last + _SECONDS_PER_HOUR,
+                      _SECONDS_PER_HOUR):
+        epoch = min(hour, last)
+        offset = _utc_offset(epoch)
+
+        if offset != offsets[-1]:
+            # the first second of the new offset
+            low, high = previous, epoch
+
+            while high - low > 1:
+                middle = (low + high) // 2
+
+                if _utc_offset(middle) == offsets[-1]:
+                    low = middle
+                else:
+                    high = middle
+
+            epochs.append(high)
+            offsets.append(offset)
+
+        previous = epoch
+
+    return np.array(epochs, dtype=np.int64), np.array(offsets, dtype=np.int64)
+
+
+def _day_number_to_ymd(day: Any) -> str:
+    return str(np.datetime64(int(day), 'D'))
+
+
+def local_day_numbers(epochs: np.ndarray) -> np.ndarray:
+    """Returns the days since 1970-01-01 of the local dates of epochs, i.e., the days of their
+       epoch_to_local_apple_health_datetime_str dates.
+    """
+    epochs = np.asarray(epochs, dtype=np.int64)
+
+    if len(epochs) == 0:
+        return epochs.copy()
+
+    transitions, offsets = _utc_offset_transitions(int(epochs.min()), int(epochs.max()))
+    return (epochs + offsets[np.searchsorted(transitions, epochs, side='right') - 1]) // _SECONDS_PER_DAY
+
+
+class DailyQuantityAggregation:
+    """Reduces the values of a quantity sample type to daily statistics with NumPy grouped reductions.
+
+       The values are tallied in batches of day keys and values. The day of a value is the date of its
+       record's start date, like the keys of the SampleSummary classes; the days of collect are listed in the
+       order they were first tallied. The sum of a day adds its values one by one in the order they were
+       tallied (np.bincount), so the sums and means equal those of CumulativeQuantitySampleSummary and
+       DiscreteQuantitySampleSummary. std is the population standard deviation.
+
+       min, max and std cost a sort or an extra pass of each batch; statistics selects the ones to compute.
+    """
+    def __init__(self, type: str, unit: str, statistics: Sequence[str] = STATISTICS):
+        unknown = set(statistics) - set(STATISTICS)
+
+        if unknown:
+            raise ValueError(f"{', '.join(sorted(unknown))} is not a statistic of {STATISTICS}.")
+
+        self._type = type
+        self._unit = unit
+        self._statistics = tuple(statistics)
+        self._slots: Dict[str, int] = {}
+        self._sums = np.zeros(0)
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._mins = np.zeros(0)
+        self._maxs = np.zeros(0)
+        self._means = np.zeros(0)
+        self._m2s = np.zeros(0)
+
+    def __len__(self):
+        return len(self._slots)
+
+    @property
+    def days(self) -> List[str]:
+        return list(self._slots)
+
+    def _grow(self, size: int):
+        grow = size - len(self._sums)
+
+        if grow > 0:
+            self._sums = np.concatenate([self._sums, np.zeros(grow)])
+            self._counts = np.concatenate([self._counts, np.zeros(grow, dtype=np.int64)])
+            self._mins = np.concatenate([self._mins, np.full(grow, np.inf)])
+            self._maxs = np.concatenate([self._maxs, np.full(grow, -np.inf)])
+            self._means = np.concatenate([self._means, np.zeros(grow)])
+            self._m2s = np.concatenate([self._m2s, np.zeros(grow)])
+
+    def _slot_codes(self, keys: np.ndarray, to_day: Callable[[Any], str]) -> np.ndarray:
+        """Maps the day keys of a batch to the slots of their days, adding the new days in the order
+           of their first key.
+        """
+        if len(keys) and not np.any(keys[1:] < keys[:-1]):
+            # the keys of rows sorted by date are runs, so they need no sort
+            first_indices = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+            unique_keys = keys[first_indices]
+            inverse = np.cumsum(np.concatenate([[False], keys[1:] != keys[:-1]]))
+        else:
+            unique_keys, first_indices, inverse = np.unique(keys, return_index=True, return_inverse=True)
+
+        slots = np.empty(len(unique_keys), dtype=np.int64)
+
+        for i in np.argsort(first_indices, kind='stable').tolist():
+            day = to_day(unique_keys[i])
+            slot = self._slots.get(day)
+
+            if slot is None:
+                slot = self._slots[day] = len(self._slots)
+
+            slots[i] = slot
+
+        self._grow(len(self._slots))
+        return slots[inverse.reshape(-1)]
+
+    def tally_day_numbers(self, day_numbers: np.ndarray, values: np.ndarray):
+        """Tallies values by their days since 1970-01-01, e.g., the local_day_numbers of their start dates."""
+        self._tally(self._slot_codes(np.asarray(day_numbers, dtype=np.int64), _day_number_to_ymd),
+                    np.asarray(values, dtype=np.float64))
+
+    def tally_dates(self, dates: Sequence[str], values: Sequence[float]):
+        """Tallies values by their dates, e.g., the start dates of HK_APPLE_DATETIME_FORMAT of their records."""
+        self._tally(self._slot_codes(np.array(dates, dtype='U10'), str), np.asarray(values, dtype=np.float64))
+
+    def tally_records(self, records: Iterable[HKRecord], batch_rows: int = DEFAULT_AGGREGATION_BATCH_ROWS):
+        dates: List[str] = []
+        values: List[float] = []
+
+        for record in records:
+            dates.append(record.start_date)
+            values.append(record.value)
+
+            if len(dates) >= batch_rows:
+                self.tally_dates(dates, values)
+                dates, values = [], []
+
+        if dates:
+            self.tally_dates(dates, values)
+
+    def _tally(self, codes: np.ndarray, values: np.ndarray):
+        if len(codes) == 0:
+            return
+
+        size = len(self._slots)
+        counts = np.bincount(codes, minlength=size)
+        present = np.flatnonzero(counts)
+
+        # each day's sum so far comes first, so that bincount adds the values to it one by one
+        self._sums[present] = np.bincount(np.concatenate([present, codes]),
+                                          np.concatenate([self._sums[present], values]), minlength=size)[present]
+
+        if 'min' in self._statistics or 'max' in self._statistics:
+            if np.any(codes[1:] < codes[:-1]):
+                order = np.argsort(codes, kind='stable')
+                sorted_codes, sorted_values = codes[order], values[order]
+            else:
+                sorted_codes, sorted_values = codes, values
+
+            starts = np.flatnonzero(np.concatenate([[True], sorted_codes[1:] != sorted_codes[:-1]]))
+            slots = sorted_codes[starts]
+            self._mins[slots] = np.minimum(self._mins[slots], np.minimum.reduceat(sorted_values, starts))
+            self._maxs[slots] = np.maximum(self._maxs[slots], np.maximum.reduceat(sorted_values, starts))
+
+        if 'std' in self._statistics:
+            # Chan et al.'s update of the running means and sums of squared deviations by those of the batch
+            batch_counts = counts[present]
+            batch_means = np.bincount(codes, values, minlength=size)[present] / batch_counts
+            means = np.zeros(size)
+            means[present] = batch_means
+            deviations = values - means[codes]
+            batch_m2s = np.bincount(codes, deviations * deviations, minlength=size)[present]
+            previous_counts = self._counts[present]
+            totals = previous_counts + batch_counts
+            deltas = batch_means - self._means[present]
+            self._means[present] += deltas * batch_counts / totals
+            self._m2s[present] += batch_m2s + deltas * deltas * previous_counts * batch_counts / totals
+
+        self._counts += counts
+
+    def statistic(self, name: str) -> np.ndarray:
+        """Returns the statistic of every day, in the order of days."""
+        if name not in self._statistics:
+            raise ValueError(f"{name} is not a statistic of the aggregation.")
+
+        size = len(self._slots)
+        counts = self._counts[:size]
+
+        if name == 'sum':
+            return self._sums[:size].copy()
+
+        if name == 'mean':
+            return self._sums[:size] / counts
+
+        if name == 'count':
+            return counts.copy()
+
+        if name == 'min':
+            return self._mins[:size].copy()
+
+        if name == 'max':
+            return self._maxs[:size].copy()
+
+        return np.sqrt(self._m2s[:size] / counts)
+
+    def collect(self, name: str = 'sum') -> List[QuantitySampleSummaryRecord]:
+        """Returns the daily statistic like the collect of a SampleSummary, e.g., the sums of
+           CumulativeQuantitySampleSummary.collect or the means of DiscreteQuantitySampleSummary.collect.
+        """
+        return [QuantitySampleSummaryRecord(day, self._type, value, self._unit)
+                for day, value in zip(self._slots, self.statistic(name).tolist())]
+
+
+def aggregate_record_columns(columns: AppleHealthRecordColumns, statistics: Sequence[str] = STATISTICS,
+                             watch_only_data: bool = True,
+                             batch_rows: int = DEFAULT_AGGREGATION_BATCH_ROWS) -> Optional[DailyQuantityAggregation]:
+    """Aggregates the values of the record columns by the local dates of their start dates, only those of
+       watch devices if watch_only_data is set, like the summary_quantity_sample functions. Returns None if
+       the columns have no rows; the unit is that of the first row.
+    """
+    if len(columns) == 0:
+        return None
+
+    units = columns[hd.FIELD_UNIT]
+    aggregation = DailyQuantityAggregation(columns.record_type, columns.dictionary(hd.FIELD_UNIT)[int(units[0])],
+                                           statistics)
+    watch_devices = np.array([is_device_watch(device) for device in columns.dictionary(hd.FIELD_DEVICE)],
+                             dtype=bool)
+
+    for start in range(0, len(columns), batch_rows):
+        stop = start + batch_rows
+        start_dates = np.asarray(columns[hd.FIELD_START_DATE][start:stop])
+        values = np.asarray(columns[hd.FIELD_VALUE][start:stop])
+
+        if watch_only_data:
+            watch_rows = watch_devices[columns[hd.FIELD_DEVICE][start:stop]]
+            start_dates, values = start_dates[watch_rows], values[watch_rows]
+
+        aggregation.tally_day_numbers(local_day_numbers(start_dates), values)
+
+    return aggregation
@@ -0,0 +1,221 @@
+from sys import getsizeof
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, List, Optional
+import heapq
+import itertools
+import pickle
+import tempfile
+
+__all__ = [
+    'DEFAULT_SORT_MEMORY_BUDGET',
+    'ExternalMergeSort',
+    'external_sorted'
+]
+
+
+DEFAULT_SORT_MEMORY_BUDGET = 256 * 1024 * 1024
+
+# rows are pickled to the runs in chunks of _CHUNK_ROWS rows
+_CHUNK_ROWS = 1000
+
+
+def _row_size(row: Any) -> int:
+    if isinstance(row, dict):
+        return getsizeof(row) + sum(map(getsizeof, row.values()))
+
+    return getsizeof(row)
+
+
+def _write_run(rows: Iterable[Any], run: Optional[BinaryIO] = None) -> BinaryIO:
+    """Appends rows to run, a new temporary file if None, in chunks of _CHUNK_ROWS rows."""
+    if run is None:
+        run = tempfile.TemporaryFile()
+
+    chunk = []
+
+    for row in rows:
+        chunk.append(row)
+
+        if len(chunk) == _CHUNK_ROWS:
+            pickle.dump(chunk, run, pickle.HIGHEST_PROTOCOL)
+            chunk = []
+
+    if chunk:
+        pickle.dump(chunk, run, pickle.HIGHEST_PROTOCOL)
+
+    return run
+
+
+def _read_run(run: BinaryIO) -> Iterator[Any]:
+    run.seek(0)
+
+    while True:
+        try:
+            chunk = pickle.load(run)
+        except EOFError:
+            return
+
+        yield from chunk
+
+
+class ExternalMergeSort:
+    """Sorts rows by key like sorted(rows, key=key), holding about memory_budget bytes of rows in memory at most;
+       the other rows are spilled to sorted runs in temporary files, which are merged when the rows are read.
+
+       Rows that arrive in order are kept in memory up to memory_budget and are not sorted; beyond it, they are
+       appended to the first run. An already-sorted input is thus returned as it came, from memory if it fits.
+       The sort is stable.
+    """
+    def __init__(self, key: Callable[[Any], Any], memory_budget: int = DEFAULT_SORT_MEMORY_BUDGET,
+                 max_merge_runs: int = 64):
+        if memory_budget < 1:
+            raise ValueError('memory_budget must be positive.')
+
+        if max_merge_runs < 2:
+            raise ValueError('max_merge_runs must be at least 2.')
+
+        self._key = key
+        self._memory_budget = memory_budget
+        self._max_merge_runs = max_merge_runs
+        self._reset()
+
+    def _reset(self):
+        self._runs: List[BinaryIO] = []
+        self._in_order = True
+        self._ordered_run: Optional[BinaryIO] = None
+        self._ordered_rows: List[Any] = []
+        self._ordered_size = 0
+        self._last_key: Any = None
+        self._rows: List[Any] = []
+        self._rows_size = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def in_order(self) -> bool:
+        """True if the rows added so far are sorted."""
+        return self._in_order
+
+    @property
+    def run_count(self) -> int:
+        return len(self._runs) + (self._ordered_run is not None)
+
+    def add(self, row: Any):
+        if self._in_order:
+            key = self._key(row)
+
+            if self._count == 0 or not key < self._last_key:
+                self._count += 1
+                self._last_key = key
+                self._ordered_rows.append(row)
+                self._ordered_size += _row_size(row)
+
+                if self._ordered_size >= self._memory_budget:
+                    self._flush_ordered_rows()
+
+                return
+
+            # the rows in order so far are the first run
+            self._in_order = False
+            self._last_key = None
+
+            if self._ordered_run is not None:
+                self._flush_ordered_rows()
+                self._runs.append(self._ordered_run)
+                self._ordered_run = None
+            else:
+                self._rows, self._rows_size = self._ordered_rows, self._ordered_size
+
+            self._ordered_rows = []
+            self._ordered_size = 0
+
+        self._count += 1
+        self._rows.append(row)
+        self._rows_size += _row_size(row)
+
+        if self._rows_size >= self._memory_budget:
+            self._spill()
+
+    def extend(self, rows: Iterable[Any]):
+        for row in rows:
+            self.add(row)
+
+    def _flush_ordered_rows(self):
+        self._ordered_run = _write_run(self._ordered_rows, self._ordered_run)
+        self._ordered_rows = []
+        self._ordered_size = 0
+
+    def _spill(self):
+        self._rows.sort(key=self._key)
+        self._runs.append(_write_run(self._rows))
+        self._rows = []
+        self._rows_size = 0
+
+        if len(self._runs) >= self._max_merge_runs:
+            # the runs are merged in the order they were written, which keeps the sort stable
+            runs = self._runs
+            self._runs = [_write_run(heapq.merge(*map(_read_run, runs), key=self._key))]
+
+            for run in runs:
+                run.close()
+
+    def __iter__(self) -> Iterator[Any]:
+        """Returns the rows in order and releases them and their runs; the sort is empty afterwards."""
+        runs, ordered_run, ordered_rows, rows = self._runs, self._ordered_run, self._ordered_rows, self._rows
+        self._reset()
+
+        if ordered_run is not None:
+            # every row is in order: the run and then the rows in memory
+            return self._stream(ordered_run, ordered_rows)
+
+        if ordered_rows:
+            # every row is in order and in memory
+            return iter(ordered_rows)
+
+        if not runs:
+            rows.sort(key=self._key)
+            return iter(rows)
+
+        return self._merge(runs, rows)
+
+    @staticmethod
+    def _stream(run: BinaryIO, rows: List[Any]) -> Iterator[Any]:
+        try:
+            yield from itertools.chain(_read_run(run), rows)
+        finally:
+            run.close()
+
+    def _merge(self, runs: List[BinaryIO], rows: List[Any]) -> Iterator[Any]:
+        try:
+            if len(runs) == 1 and not rows:
+                yield from _read_run(runs[0])
+            else:
+                rows.sort(key=self._key)
+                yield from heapq.merge(*map(_read_run, runs), rows, key=self._key)
+        finally:
+            for run in runs:
+                run.close()
+
+    def close(self):
+        for run in self._runs:
+            run.close()
+
+        if self._ordered_run is not None:
+            self._ordered_run.close()
+
+        self._reset()
+
+
+def external_sorted(rows: Iterable[Any], key: Callable[[Any], Any],
+                    memory_budget: int = DEFAULT_SORT_MEMORY_BUDGET) -> Iterator[Any]:
+    """Returns rows sorted by key like sorted(rows, key=key), within memory_budget; see ExternalMergeSort."""
+    rows_sort = ExternalMergeSort(key, memory_budget)
+
+    try:
+        rows_sort.extend(rows)
+    except BaseException:
+        rows_sort.close()
+        raise
+
+    return iter(rows_sort)
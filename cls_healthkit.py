@@ -1,5 +1,6 @@
-from dataclasses import dataclass
-from typing import Dict
+from collections import namedtuple
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator
 
 
 HK_APPLE_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S %z"
@@ -7,21 +8,42 @@ HK_APPLE_DATE_FORMAT = "%Y-%m-%d"
 HK_APPLE_TIMEZONE = '-0700'
 
 
-@dataclass
-class HKWorkout:
-    _workout_activity_type: str
-    _duration: float
-    _duration_unit: str
-    _total_distance: float
-    _total_distance_unit: str
-    _total_energy_burned: float
-    _total_energy_burned_unit: str
-    _source_name: str
-    _source_version: str
-    _device: str
-    _creation_date: str
-    _start_date: str
-    _end_date: str
+_HKWorkoutFields = namedtuple('_HKWorkoutFields', (
+    'workout_activity_type',
+    'duration',
+    'duration_unit',
+    'total_distance',
+    'total_distance_unit',
+    'total_energy_burned',
+    'total_energy_burned_unit',
+    'source_name',
+    'source_version',
+    'device',
+    'creation_date',
+    'start_date',
+    'end_date'
+))
+
+# the attributes of a workout row of Fieldnames_Workout_Csv, in the order of _HKWorkoutFields
+_workout_attributes = itemgetter(
+    'workoutActivityType',
+    'duration',
+    'durationUnit',
+    'totalDistance',
+    'totalDistanceUnit',
+    'totalEnergyBurned',
+    'totalEnergyBurnedUnit',
+    'sourceName',
+    'sourceVersion',
+    'device',
+    'creationDate',
+    'startDate',
+    'endDate'
+)
+
+
+class HKWorkout(_HKWorkoutFields):
+    __slots__ = ()
 
     @classmethod
     def create(cls, attr: Dict[str, str]) -> 'HKWorkout':
@@ -41,101 +63,36 @@ class HKWorkout:
             attr['endDate']
         )
 
-    @property
-    def workout_activity_type(self):
-        return self._workout_activity_type
-
-    @property
-    def duration(self):
-        return self._duration
-
-    @property
-    def duration_unit(self):
-        return self._duration_unit
-
-    @property
-    def total_distance(self):
-        return self._total_distance
-
-    @property
-    def total_distance_unit(self):
-        return self._total_distance_unit
-
-    @property
-    def total_energy_burned(self):
-        return self._total_energy_burned
-
-    @property
-    def total_energy_burned_unit(self):
-        return self._total_energy_burned_unit
-
-    @property
-    def source_name(self):
-        return self._source_name
-
-    @property
-    def source_version(self):
-        return self._source_version
-
-    @property
-    def device(self):
-        return self._device
-
-    @property
-    def creation_date(self):
-        return self._creation_date
-
-    @property
-    def start_date(self):
-        return self._start_date
-
-    @property
-    def end_date(self):
-        return self._end_date
-
-
-class HKWorkoutWithMetaData(HKWorkout):
-    def __init__(self,
-                 _workout_activity_type: str,
-                 _duration: float,
-                 _duration_unit: str,
-                 _total_distance: float,
-                 _total_distance_unit: str,
-                 _total_energy_burned: float,
-                 _total_energy_burned_unit: str,
-                 _source_name: str,
-                 _source_version: str,
-                 _device: str,
-                 _creation_date: str,
-                 _start_date: str,
-                 _end_date: str,
-                 _is_indoor: bool,
-                 _average_mets: str,
-                 _weather_temperature: str,
-                 _weather_humidity: str,
-                 _timezone: str,
-                 _elevation_ascended: str
-                 ):
-        super().__init__(_workout_activity_type,
-                         _duration,
-                         _duration_unit,
-                         _total_distance,
-                         _total_distance_unit,
-                         _total_energy_burned,
-                         _total_energy_burned_unit,
-                         _source_name,
-                         _source_version,
-                         _device,
-                         _creation_date,
-                         _start_date,
-                         _end_date
-                         )
-        self._is_indoor = _is_indoor
-        self._average_mets = _average_mets
-        self._weather_temperature = _weather_temperature
-        self._weather_humidity = _weather_humidity
-        self._timezone = _timezone
-        self._elevation_ascended = _elevation_ascended
+    @classmethod
+    def create_many(cls, attrs: Iterable[Dict[str, str]]) -> Iterator['HKWorkout']:
+        """Creates the workouts of attribute dicts, e.g., the rows of a workout csv file.
+           A dict that lacks a workout attribute is created by create.
+        """
+        new = tuple.__new__
+
+        for attr in attrs:
+            try:
+                values = _workout_attributes(attr)
+            except KeyError:
+                yield cls.create(attr)
+                continue
+
+            yield new(cls, (values[0], float(values[1]), values[2], float(values[3]), values[4], float(values[5]),
+                            values[6], values[7], values[8], values[9], values[10], values[11], values[12]))
+
+
+_HKWorkoutWithMetaDataFields = namedtuple('_HKWorkoutWithMetaDataFields', _HKWorkoutFields._fields + (
+    'is_indoor',
+    'average_mets',
+    'weather_temperature',
+    'weather_humidity',
+    'timezone',
+    'elevation_ascended'
+))
+
+
+class HKWorkoutWithMetaData(_HKWorkoutWithMetaDataFields, HKWorkout):
+    __slots__ = ()
 
     @classmethod
     def create(cls, attr: Dict[str, str]) -> 'HKWorkoutWithMetaData':
@@ -161,104 +118,65 @@ class HKWorkoutWithMetaData(HKWorkout):
             attr['HKElevationAscended']
         )
 
-    @property
-    def is_indoor(self):
-        return self._is_indoor
-
-    @property
-    def average_mets(self):
-        return self._average_mets
-
-    @property
-    def weather_temperature(self):
-        return self._weather_temperature
-
-    @property
-    def weather_humidity(self):
-        return self._weather_humidity
-
-    @property
-    def timezone(self):
-        return self._timezone
-
-    @property
-    def elevation_ascended(self):
-        return self._elevation_ascended
-
-
-@dataclass
-class HKRecord:
-    _type: str
-    _unit: str
-    _value: str
-    _source_name: str
-    _source_version: str
-    _device: str
-    _creation_date: str
-    _start_date: str
-    _end_date: str
-
-    @property
-    def type(self):
-        return self._type
-
-    @property
-    def unit(self):
-        return self._unit
-
-    @property
-    def value(self):
-        return self._value
-
-    @property
-    def source_name(self):
-        return self._source_name
-
-    @property
-    def source_version(self):
-        return self._source_version
-
-    @property
-    def device(self):
-        return self._device
-
-    @property
-    def creation_date(self):
-        return self._creation_date
-
-    @property
-    def start_date(self):
-        return self._start_date
-
-    @property
-    def end_date(self):
-        return self._end_date
+    @classmethod
+    def create_many(cls, attrs: Iterable[Dict[str, str]]) -> Iterator['HKWorkoutWithMetaData']:
+        return map(cls.create, attrs)
+
+
+_HKRecordFields = namedtuple('_HKRecordFields', (
+    'type',
+    'unit',
+    'value',
+    'source_name',
+    'source_version',
+    'device',
+    'creation_date',
+    'start_date',
+    'end_date'
+))
+
+# the attributes of a record row of Fieldnames_Record, in the order of _HKRecordFields
+_record_attributes = itemgetter(
+    'type',
+    'unit',
+    'value',
+    'sourceName',
+    'sourceVersion',
+    'device',
+    'creationDate',
+    'startDate',
+    'endDate'
+)
+
+
+class HKRecord(_HKRecordFields):
+    __slots__ = ()
 
 
 class HKRecordQuantityTypeIdentifier(HKRecord):
-    def __init__(self,
-                 record_type: str,
-                 unit: str,
-                 value: str,
-                 source_name: str,
-                 source_version: str,
-                 device: str,
-                 creation_date: str,
-                 start_date: str,
-                 end_date: str):
-        super().__init__(
+    __slots__ = ()
+
+    def __new__(cls,
+                record_type: str,
+                unit: str,
+                value: str,
+                source_name: str,
+                source_version: str,
+                device: str,
+                creation_date: str,
+                start_date: str,
+                end_date: str):
+        return tuple.__new__(cls, (
             record_type,
             unit,
-            value,
+            float(value),
             source_name,
             source_version,
             device,
             creation_date,
             start_date,
             end_date
-        )
-
-        self._value: float = float(self._value)
+        ))
 
 
 class HKRecordFactory:
@@ -308,19 +226,49 @@ class HKRecordFactory:
         except KeyError:
             raise ValueError(f"{type} is not supported.")
 
-
-@dataclass
-class HKActivitySummary:
-    _date_components: str
-    _active_energy_burned: float
-    _active_energy_burned_goal: float
-    _active_energy_burned_unit: str
-    _apple_move_minutes: float
-    _apple_move_minutes_goal: float
-    _apple_exercise_time: float
-    _apple_exercise_time_goal: float
-    _apple_stand_hours: int
-    _apple_stand_hours_goal: int
+    @staticmethod
+    def create_many(attrs: Iterable[Dict[str, str]]) -> Iterator[HKRecord]:
+        """Creates the records of attribute dicts, e.g., the rows of a record csv file, like create.
+           A dict that lacks a record attribute is created by create.
+        """
+        record_types = HKRecordFactory._HKRecordTypes
+        new = tuple.__new__
+
+        for attr in attrs:
+            try:
+                values = _record_attributes(attr)
+            except KeyError:
+                yield HKRecordFactory.create(attr)
+                continue
+
+            try:
+                record_type = record_types[values[0]]
+            except KeyError:
+                raise ValueError(f"{values[0]} is not supported.")
+
+            if record_type is HKRecordQuantityTypeIdentifier:
+                yield new(record_type, (values[0], values[1], float(values[2]), values[3], values[4], values[5],
+                                        values[6], values[7], values[8]))
+            else:
+                yield new(record_type, values)
+
+
+_HKActivitySummaryFields = namedtuple('_HKActivitySummaryFields', (
+    'date_components',
+    'active_energy_burned',
+    'active_energy_burned_goal',
+    'active_energy_burned_unit',
+    'apple_move_minutes',
+    'apple_move_minutes_goal',
+    'apple_exercise_time',
+    'apple_exercise_time_goal',
+    'apple_stand_hours',
+    'apple_stand_hours_goal'
+))
+
+
+class HKActivitySummary(_HKActivitySummaryFields):
+    __slots__ = ()
 
     @classmethod
     def create(cls, attr: Dict[str, str]) -> 'HKActivitySummary':
@@ -337,43 +285,6 @@ class HKActivitySummary:
             int(attr.get('appleStandHoursGoal', 0))
         )
 
-    @property
-    def date_components(self):
-        return self._date_components
-
-    @property
-    def active_energy_burned(self):
-        return self._active_energy_burned
-
-    @property
-    def active_energy_burned_goal(self):
-        return self._active_energy_burned_goal
-
-    @property
-    def active_energy_burned_unit(self):
-        return self._active_energy_burned_unit
-
-    @property
-    def apple_move_minutes(self):
-        return self._apple_move_minutes
-
-    @property
-    def apple_move_minutes_goal(self):
-        return self._apple_move_minutes_goal
-
-    @property
-    def apple_exercise_time(self):
-        return self._apple_exercise_time
-
-    @property
-    def apple_exercise_time_goal(self):
-        return self._apple_exercise_time_goal
-
-    @property
-    def apple_stand_hours(self):
-        return self._apple_stand_hours
-
-    @property
-    def apple_stand_hours_goal(self):
-        return self._apple_stand_hours_goal
-
+    @classmethod
+    def create_many(cls, attrs: Iterable[Dict[str, str]]) -> Iterator['HKActivitySummary']:
+        return map(cls.create, attrs)
@@ -0,0 +1,191 @@
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+import heapq
+import math
+
+from cls_healthkit import HK_APPLE_DATETIME_FORMAT, HKRecord
+from cls_sample_summary import QuantitySampleSummaryRecord
+from utils import apple_health_datetime_to_epoch, is_device_watch
+
+__all__ = [
+    'CumulativeSampleSweep',
+    'device_priority'
+]
+
+
+def device_priority(device: str) -> int:
+    """The default priority of a sample's source: the watch's samples over the iPhone's."""
+    return 1 if is_device_watch(device) else 0
+
+
+_SECONDS_PER_DAY = 86400
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+@lru_cache(maxsize=256)
+def _utc_offset_seconds(utc_offset: str) -> Optional[int]:
+    if len(utc_offset) == 6 and utc_offset[0] == ' ' and utc_offset[1] in '+-' and utc_offset[2:].isdigit():
+        offset = int(utc_offset[2:4]) * 3600 + int(utc_offset[4:]) * 60
+        return -offset if utc_offset[1] == '-' else offset
+
+    return None
+
+
+def _utc_offset(dt: str) -> int:
+    """Returns the utc offset of dt, a date of HK_APPLE_DATETIME_FORMAT, in seconds."""
+    offset = _utc_offset_seconds(dt[19:])
+
+    if offset is None:
+        return int(datetime.strptime(dt, HK_APPLE_DATETIME_FORMAT).utcoffset().total_seconds())
+
+    return offset
+
+
+@lru_cache(maxsize=1 << 16)
+def _ymd(day_number: int) -> str:
+    return date.fromordinal(day_number + _EPOCH_ORDINAL).isoformat()
+
+
+def _day_of(epoch: int, start: int, start_offset: int, end_offset: int) -> Tuple[str, int]:
+    """Returns the day of a sample that epoch is in and the epoch of the midnight that ends the day. The midnight
+       that ends the day of the sample's start is in the start's utc offset; the later midnights are in the end's,
+       since time zones change in the early hours of a day.
+    """
+    day_number = (start + start_offset) // _SECONDS_PER_DAY
+    midnight = (day_number + 1) * _SECONDS_PER_DAY - start_offset
+
+    if epoch >= midnight:
+        day_number = max(day_number + 1, (epoch + end_offset) // _SECONDS_PER_DAY)
+        midnight = (day_number + 1) * _SECONDS_PER_DAY - end_offset
+
+    return _ymd(day_number), midnight
+
+
+# an active sample of the sweep: its heap key, the priority, start and arrival of the sample, then its end, value
+# and the utc offsets of its start and end
+_Active = Tuple[int, int, int, int, float, int, int]
+
+
+class CumulativeSampleSweep:
+    """Adds up the values of a cumulative quantity type, e.g., step count, by day without counting twice the
+       time that samples of several sources overlap, e.g., a walk recorded by both the iPhone and the watch.
+
+       The samples are swept in the order of their start dates. At any time, the sample that counts is the
+       active sample of the highest priority, then the earliest start, then the earliest tally; the
+       others are ignored while it is active. A sample that only partly counts contributes its value
+       prorated by the time it counts, and the value of a sample that counts across midnight is prorated
+       between the days. The days of a sample are those of the utc offsets of its dates, like the start
+       dates that the other summaries group by, not those of the local time zone. A sample without duration
+       counts fully unless a sample of a higher priority is active then.
+
+       Each sample is pushed on and popped from a heap, so the sweep of n samples takes O(n log n) time and
+       the memory of the samples that overlap. tally must be given the samples in the order of their start
+       dates, e.g., the rows of a sorted csv file; tally_unsorted sorts them first.
+    """
+    def __init__(self, type: str, unit: str, priority: Callable[[str], int] = device_priority):
+        self._type = type
+        self._unit = unit
+        self._priority = priority
+        self._active: List[_Active] = []
+        self._instants: List[Tuple[int, int, float, int]] = []
+        self._time: Optional[int] = None
+        self._arrivals = 0
+        self._totals: Dict[str, float] = {}
+
+    def _sample(self, record: HKRecord) -> Tuple[int, int, float, int, int, int]:
+        return (apple_health_datetime_to_epoch(record.start_date),
+                apple_health_datetime_to_epoch(record.end_date),
+                record.value,
+                self._priority(record.device),
+                _utc_offset(record.start_date),
+                _utc_offset(record.end_date))
+
+    def tally(self, record: HKRecord):
+        self.tally_sample(*self._sample(record))
+
+    def tally_unsorted(self, records: List[HKRecord]):
+        for sample in sorted(map(self._sample, records)):
+            self.tally_sample(*sample)
+
+    def tally_sample(self, start: int, end: int, value: float, priority: int, start_offset: int = 0,
+                     end_offset: Optional[int] = None):
+        """Tallies a sample from epoch start to epoch end; start_offset and end_offset are the utc offsets
+           of its dates in seconds, which set its days. end_offset defaults to start_offset.
+        """
+        if self._time is not None and start < self._time:
+            raise ValueError(f"The sample starting at {start} is not in the order of the start dates.")
+
+        if end < start:
+            end = start
+
+        if end_offset is None:
+            end_offset = start_offset
+
+        if self._time is None or start > self._time:
+            self._resolve_instants(self._active, self._totals)
+            self._instants = []
+            self._advance(start, self._active, self._totals)
+            self._time = start
+
+        if end == start:
+            self._instants.append((start, priority, value, start_offset))
+        else:
+            heapq.heappush(self._active, (-priority, start, self._arrivals, end, value, start_offset, end_offset))
+
+        self._arrivals += 1
+
+    def _resolve_instants(self, active: List[_Active], totals: Dict[str, float]):
+        """Counts the samples without duration that started at the current time, now that all the samples
+           that start then are active.
+        """
+        if not self._instants:
+            return
+
+        while active and active[0][3] <= self._time:
+            heapq.heappop(active)
+
+        top_priority = -active[0][0] if active else -math.inf
+
+        for start, priority, value, start_offset in self._instants:
+            if priority >= top_priority:
+                day = _ymd((start + start_offset) // _SECONDS_PER_DAY)
+                totals[day] = totals.get(day, 0) + value
+
+    def _advance(self, until: float, active: List[_Active], totals: Dict[str, float]):
+        """Adds the values of the samples that count from the current time until until."""
+        now = self._time
+
+        while active and now < until:
+            _, start, _, end, value, start_offset, end_offset = active[0]
+
+            if end <= now:
+                heapq.heappop(active)
+                continue
+
+            stop = min(end, until)
+
+            while now < stop:
+                day, midnight = _day_of(now, start, start_offset, end_offset)
+                piece_end = min(stop, midnight)
+                piece = value if piece_end - now == end - start else value * (piece_end - now) / (end - start)
+                totals[day] = totals.get(day, 0) + piece
+                now = piece_end
+
+    def totals(self) -> Dict[str, float]:
+        """Returns the daily totals of the samples tallied so far, in the order of the days; the sweep
+           can go on with more samples afterwards.
+        """
+        if self._time is None:
+            return {}
+
+        totals = dict(self._totals)
+        active = list(self._active)
+        self._resolve_instants(active, totals)
+        self._advance(math.inf, active, totals)
+        return totals
+
+    def collect(self) -> List[QuantitySampleSummaryRecord]:
+        return [QuantitySampleSummaryRecord(day, self._type, value, self._unit)
+                for day, value in self.totals().items()]
@@ -0,0 +1,216 @@
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import date
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import math
+
+from cls_healthkit import HKRecord
+import constants_apple_health_data as hd
+
+__all__ = [
+    'GRANULARITIES',
+    'GRANULARITY_DAY',
+    'GRANULARITY_HOUR',
+    'GRANULARITY_MONTH',
+    'GRANULARITY_WEEK',
+    'GRANULARITY_YEAR',
+    'QuantityRollupCube',
+    'RollupCell',
+    'RollupRecord'
+]
+
+
+GRANULARITY_HOUR = 'hour'
+GRANULARITY_DAY = 'day'
+GRANULARITY_WEEK = 'week'
+GRANULARITY_MONTH = 'month'
+GRANULARITY_YEAR = 'year'
+
+GRANULARITIES = (GRANULARITY_HOUR, GRANULARITY_DAY, GRANULARITY_WEEK, GRANULARITY_MONTH, GRANULARITY_YEAR)
+
+
+@lru_cache(maxsize=1 << 16)
+def _iso_week(day: str) -> str:
+    year, week, _ = date.fromisoformat(day).isocalendar()
+    return f"{year:04}-W{week:02}"
+
+
+# the finer level that a level is rolled up from, and the period of a finer period; e.g., the hours
+# 2020-10-01 08 and 2020-10-01 09 are rolled up in the day 2020-10-01.
+_ROLLUPS: Dict[str, Tuple[str, Callable[[str], str]]] = {
+    GRANULARITY_DAY: (GRANULARITY_HOUR, lambda hour: hour[:10]),
+    GRANULARITY_WEEK: (GRANULARITY_DAY, _iso_week),
+    GRANULARITY_MONTH: (GRANULARITY_DAY, lambda day: day[:7]),
+    GRANULARITY_YEAR: (GRANULARITY_MONTH, lambda month: month[:4])
+}
+
+
+class RollupCell:
+    """The count, sum, min and max of the values of a period; cells are merged by adding them up."""
+    __slots__ = ('count', 'sum', 'min', 'max')
+
+    def __init__(self, count: int = 0, sum: float = 0.0, min: float = math.inf, max: float = -math.inf):
+        self.count = count
+        self.sum = sum
+        self.min = min
+        self.max = max
+
+    def __eq__(self, other):
+        return isinstance(other, RollupCell) and self.to_list() == other.to_list()
+
+    def __repr__(self):
+        return f"RollupCell(count={self.count}, sum={self.sum}, min={self.min}, max={self.max})"
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count
+
+    def add(self, value: float):
+        self.count += 1
+        self.sum += value
+
+        if value < self.min:
+            self.min = value
+
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: 'RollupCell') -> 'RollupCell':
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def to_list(self) -> List[Any]:
+        return [self.count, self.sum, self.min, self.max]
+
+
+@dataclass
+class RollupRecord:
+    granularity: str
+    period: str
+    type: str
+    count: int
+    sum: float
+    mean: float
+    min: float
+    max: float
+    unit: str
+
+    @staticmethod
+    def field_names():
+        return ['granularity', 'period', 'count', 'sum', 'mean', 'min', 'max', hd.csv_unit]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'granularity': self.granularity,
+            'period': self.period,
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.mean,
+            'min': self.min,
+            'max': self.max,
+            hd.csv_unit: self.unit
+        }
+
+
+class QuantityRollupCube:
+    """Aggregates the values of a quantity type by hour, day, ISO week, month and year in one scan.
+
+       Only the hourly cells are tallied from the records, by the hours of their start dates; each coarser
+       level is rolled up from the cells of a finer one (days from hours, weeks and months from days, years
+       from months) when it is first read after a tally. The periods of a level are kept sorted, so that the
+       cells of a range of periods are looked up by bisection.
+
+       The sums of a coarser level add up the sums of its finer cells, so they may differ from the sums of
+       the values in the last digits, e.g., from those of CumulativeQuantitySampleSummary.
+    """
+    def __init__(self, type: str, unit: str):
+        self._type = type
+        self._unit = unit
+        self._hours: Dict[str, RollupCell] = {}
+        self._levels: Dict[str, Tuple[List[str], Dict[str, RollupCell]]] = {}
+
+    def tally(self, record: HKRecord):
+        key = record.start_date[:13]
+        cell = self._hours.get(key)
+
+        if cell is None:
+            cell = self._hours[key] = RollupCell()
+
+        cell.add(record.value)
+        self._levels.clear()
+
+    def merge(self, other: 'QuantityRollupCube') -> 'QuantityRollupCube':
+        if other._type != self._type or other._unit != self._unit:
+            raise ValueError(f"The cube of {other._type} ({other._unit}) cannot be merged with the cube of "
+                             f"{self._type} ({self._unit}).")
+
+        for key, cell in other._hours.items():
+            self._hours.setdefault(key, RollupCell()).merge(cell)
+
+        self._levels.clear()
+        return self
+
+    def _level(self, granularity: str) -> Tuple[List[str], Dict[str, RollupCell]]:
+        level = self._levels.get(granularity)
+
+        if level is not None:
+            return level
+
+        if granularity == GRANULARITY_HOUR:
+            cells = self._hours
+        elif granularity in _ROLLUPS:
+            finer, period_of = _ROLLUPS[granularity]
+            _, finer_cells = self._level(finer)
+            cells = {}
+
+            for finer_period, finer_cell in finer_cells.items():
+                period = period_of(finer_period)
+                cell = cells.get(period)
+
+                if cell is None:
+                    cell = cells[period] = RollupCell()
+
+                cell.merge(finer_cell)
+        else:
+            raise ValueError(f"{granularity} is not one of {GRANULARITIES}.")
+
+        periods = sorted(cells)
+        level = self._levels[granularity] = (periods, {period: cells[period] for period in periods})
+        return level
+
+    def periods(self, granularity: str) -> List[str]:
+        return list(self._level(granularity)[0])
+
+    def cell(self, granularity: str, period: str) -> Optional[RollupCell]:
+        return self._level(granularity)[1].get(period)
+
+    def cells(self, granularity: str, first: Optional[str] = None,
+              last: Optional[str] = None) -> List[Tuple[str, RollupCell]]:
+        """Returns the cells of the periods of granularity from first to last, both included, e.g.,
+           cells('month', '2020-01', '2020-06'); all of them if first and last are None.
+        """
+        periods, cells = self._level(granularity)
+        start = 0 if first is None else bisect_left(periods, first)
+        stop = len(periods) if last is None else bisect_right(periods, last)
+        return [(period, cells[period]) for period in periods[start:stop]]
+
+    def collect(self, granularity: str) -> List[RollupRecord]:
+        return [RollupRecord(granularity, period, self._type, cell.count, cell.sum, cell.mean, cell.min, cell.max,
+                             self._unit) for period, cell in self.cells(granularity)]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'type': self._type,
+            'unit': self._unit,
+            'hours': {key: cell.to_list() for key, cell in self._hours.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> 'QuantityRollupCube':
+        cube = cls(state['type'], state['unit'])
+        cube._hours = {key: RollupCell(*cell) for key, cell in state['hours'].items()}
+        return cube
@@ -1,8 +1,9 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Sequence
 
 from cls_healthkit import HKWorkout, HKRecord
+from cls_quantile_sketch import DEFAULT_KLL_K, KllSketch
 import constants_apple_health_data as hd
 
 
@@ -18,6 +19,18 @@ class SampleSummary(ABC):
     def collect(self) -> List[Any]:
         pass
 
+    @abstractmethod
+    def merge(self, other: 'SampleSummary') -> 'SampleSummary':
+        """Adds the tallies of other, e.g., those of another shard of the data, and returns self. The days
+           that only other has are collected after the days of self, in other's order.
+        """
+        pass
+
+    def _check_mergeable(self, other: 'SampleSummary', *attributes: str):
+        if type(other) is not type(self) or \
+                any(getattr(self, attribute) != getattr(other, attribute) for attribute in attributes):
+            raise ValueError(f"{type(other).__name__} cannot be merged with {type(self).__name__}.")
+
 
 @dataclass
 class _WorkoutQuantitiesTally:
@@ -30,6 +43,9 @@ class _WorkoutQuantitiesTally:
         self.total_distance += other.total_distance
         self.total_energy_burned += other.total_energy_burned
 
+    def copy(self) -> '_WorkoutQuantitiesTally':
+        return _WorkoutQuantitiesTally(self.duration, self.total_distance, self.total_energy_burned)
+
 
 @dataclass
 class WorkoutSummaryRecord:
@@ -79,6 +95,32 @@ class WorkoutSummary(SampleSummary):
                                      wq.total_energy_burned,
                                      self._energy_burned_unit) for day_of_month, wq in self._tally.items()]
 
+    def merge(self, other: 'WorkoutSummary') -> 'WorkoutSummary':
+        self._check_mergeable(other, '_duration_unit', '_distance_unit', '_energy_burned_unit')
+
+        for key, wq in other._tally.items():
+            if key not in self._tally:
+                self._tally[key] = wq.copy()
+            else:
+                self._tally[key] + wq
+
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'duration_unit': self._duration_unit,
+            'distance_unit': self._distance_unit,
+            'energy_burned_unit': self._energy_burned_unit,
+            'tally': {key: [wq.duration, wq.total_distance, wq.total_energy_burned]
+                      for key, wq in self._tally.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> 'WorkoutSummary':
+        summary = cls(state['duration_unit'], state['distance_unit'], state['energy_burned_unit'])
+        summary._tally = {key: _WorkoutQuantitiesTally(*quantities) for key, quantities in state['tally'].items()}
+        return summary
+
 
 @dataclass
 class QuantitySampleSummaryRecord:
@@ -120,6 +162,34 @@ class DiscreteQuantitySampleSummary(SampleSummary):
         return [QuantitySampleSummaryRecord(day_of_month, self._type, value / self._items[day_of_month], self._unit)
                 for day_of_month, value in self._tally.items()]
 
+    def merge(self, other: 'DiscreteQuantitySampleSummary') -> 'DiscreteQuantitySampleSummary':
+        self._check_mergeable(other, '_type', '_unit')
+
+        for key, value in other._tally.items():
+            if key not in self._tally:
+                self._tally[key] = value
+                self._items[key] = other._items[key]
+            else:
+                self._tally[key] += value
+                self._items[key] += other._items[key]
+
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'type': self._type,
+            'unit': self._unit,
+            'tally': self._tally,
+            'items': self._items
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> 'DiscreteQuantitySampleSummary':
+        summary = cls(state['type'], state['unit'])
+        summary._tally = dict(state['tally'])
+        summary._items = dict(state['items'])
+        return summary
+
 
 class CumulativeQuantitySampleSummary(SampleSummary):
     def __init__(self, type: str, unit: str):
@@ -138,3 +208,107 @@ class CumulativeQuantitySampleSummary(SampleSummary):
     def collect(self) -> List[QuantitySampleSummaryRecord]:
         return [QuantitySampleSummaryRecord(day_of_month, self._type, value, self._unit)
                 for day_of_month, value in self._tally.items()]
+
+    def merge(self, other: 'CumulativeQuantitySampleSummary') -> 'CumulativeQuantitySampleSummary':
+        self._check_mergeable(other, '_type', '_unit')
+
+        for key, value in other._tally.items():
+            if key not in self._tally:
+                self._tally[key] = value
+            else:
+                self._tally[key] += value
+
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'type': self._type,
+            'unit': self._unit,
+            'tally': self._tally
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> 'CumulativeQuantitySampleSummary':
+        summary = cls(state['type'], state['unit'])
+        summary._tally = dict(state['tally'])
+        return summary
+
+
+DEFAULT_SUMMARY_QUANTILES = (0.05, 0.5, 0.95)
+
+
+@dataclass
+class QuantileSampleSummaryRecord:
+    date: str
+    type: str
+    quantiles: Dict[float, float]
+    max: float
+    count: int
+    unit: str
+
+    @staticmethod
+    def quantile_field_name(fraction: float) -> str:
+        return f"p{fraction * 100:g}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        row = {hd.csv_date: self.date}
+        row.update((self.quantile_field_name(fraction), value) for fraction, value in self.quantiles.items())
+        row.update({'max': self.max, 'count': self.count, hd.csv_unit: self.unit})
+        return row
+
+
+class QuantileQuantitySampleSummary(SampleSummary):
+    """Tallies the daily distribution of a quantity, e.g., heart rate, in a KllSketch per day, so that a day
+       takes a bounded amount of memory however many samples it has. collect reports the approximate
+       quantiles of each day and its exact max and count; see KllSketch for the error bound.
+    """
+    def __init__(self, type: str, unit: str, quantiles: Sequence[float] = DEFAULT_SUMMARY_QUANTILES,
+                 k: int = DEFAULT_KLL_K):
+        self._type = type
+        self._unit = unit
+        self._quantiles = tuple(quantiles)
+        self._k = k
+        self._tally: Dict[str, KllSketch] = {}
+
+    def _sketch(self, key: str) -> KllSketch:
+        sketch = self._tally.get(key)
+
+        if sketch is None:
+            # seeded by the day, so that a summary file can be reproduced
+            sketch = self._tally[key] = KllSketch(self._k, key)
+
+        return sketch
+
+    def tally(self, record: HKRecord):
+        self._sketch(record.start_date[:10]).update(record.value)
+
+    def collect(self) -> List[QuantileSampleSummaryRecord]:
+        return [QuantileSampleSummaryRecord(day_of_month,
+                                            self._type,
+                                            dict(zip(self._quantiles, sketch.quantiles(self._quantiles))),
+                                            sketch.max,
+                                            len(sketch),
+                                            self._unit) for day_of_month, sketch in self._tally.items()]
+
+    def merge(self, other: 'QuantileQuantitySampleSummary') -> 'QuantileQuantitySampleSummary':
+        self._check_mergeable(other, '_type', '_unit', '_quantiles', '_k')
+
+        for key, sketch in other._tally.items():
+            self._sketch(key).merge(sketch)
+
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'type': self._type,
+            'unit': self._unit,
+            'quantiles': list(self._quantiles),
+            'k': self._k,
+            'tally': {key: sketch.to_dict() for key, sketch in self._tally.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> 'QuantileQuantitySampleSummary':
+        summary = cls(state['type'], state['unit'], state['quantiles'], state['k'])
+        summary._tally = {key: KllSketch.from_dict(sketch, key) for key, sketch in state['tally'].items()}
+        return summary
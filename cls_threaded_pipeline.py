@@ -0,0 +1,213 @@
+from dataclasses import dataclass
+from itertools import islice
+from time import perf_counter
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+import queue
+import threading
+
+__all__ = [
+    'DEFAULT_PIPELINE_BATCH_SIZE',
+    'DEFAULT_PIPELINE_QUEUE_SIZE',
+    'PipelineQueueStats',
+    'ThreadedPipeline'
+]
+
+
+DEFAULT_PIPELINE_BATCH_SIZE = 1000
+DEFAULT_PIPELINE_QUEUE_SIZE = 8
+
+# seconds a blocked thread waits before it checks whether the pipeline is stopped
+_POLL_INTERVAL = 0.1
+
+
+@dataclass
+class PipelineQueueStats:
+    """Metrics of the queue that carries the batches of a stage to the next stage or to the consumer.
+
+       depth is the number of batches in the queue right after a batch is put, producer_blocked the time the
+       stage waited for room in the full queue and consumer_waited the time its reader waited for a batch.
+    """
+    name: str
+    capacity: int
+    batches: int = 0
+    items: int = 0
+    max_depth: int = 0
+    total_depth: int = 0
+    producer_blocked: float = 0.0
+    consumer_waited: float = 0.0
+
+    @property
+    def mean_depth(self) -> float:
+        return self.total_depth / self.batches if self.batches else 0.0
+
+    def __str__(self):
+        return f"{self.name}: {self.batches} batches, {self.items} items, " \
+               f"queue depth mean {self.mean_depth:.1f} max {self.max_depth}/{self.capacity}, " \
+               f"producer blocked {self.producer_blocked:.2f}s, consumer waited {self.consumer_waited:.2f}s"
+
+
+class _StageFailure:
+    def __init__(self, exception: BaseException):
+        self.exception = exception
+
+
+_END = object()
+
+
+class ThreadedPipeline:
+    """Runs the stages of an iterator pipeline in threads connected by bounded queues of batches.
+
+       A thread reads source in batches of batch_size items; each stage maps the batches of the stage
+       before it in a thread of its own. A stage blocks when its queue holds queue_size batches. An exception
+       of a stage is raised again by the iterator of the pipeline, and closing the pipeline stops its threads.
+    """
+    def __init__(self, source: Iterable[Any], name: str = 'source',
+                 batch_size: int = DEFAULT_PIPELINE_BATCH_SIZE,
+                 queue_size: int = DEFAULT_PIPELINE_QUEUE_SIZE):
+        if batch_size < 1 or queue_size < 1:
+            raise ValueError('batch_size and queue_size must be positive.')
+
+        self._source = source
+        self._batch_size = batch_size
+        self._queue_size = queue_size
+        self._stages: List[Tuple[str, Optional[Callable[[List[Any]], List[Any]]]]] = [(name, None)]
+        self._queues: List[queue.Queue] = []
+        self._stats: List[PipelineQueueStats] = []
+        self._threads: List[threading.Thread] = []
+        self._stopped = threading.Event()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def stats(self) -> List[PipelineQueueStats]:
+        return self._stats
+
+    def stage(self, name: str, map_batch: Callable[[List[Any]], List[Any]]) -> 'ThreadedPipeline':
+        """Adds a stage that maps each batch of the previous stage to a batch."""
+        if self._threads:
+            raise RuntimeError('the pipeline is running.')
+
+        self._stages.append((name, map_batch))
+        return self
+
+    def _put(self, out_queue: queue.Queue, stats: PipelineQueueStats, batch: Any) -> bool:
+        start = perf_counter()
+
+        while not self._stopped.is_set():
+            try:
+                out_queue.put(batch, timeout=_POLL_INTERVAL)
+                break
+            except queue.Full:
+                continue
+        else:
+            return False
+
+        stats.producer_blocked += perf_counter() - start
+
+        if isinstance(batch, list):
+            depth = out_queue.qsize()
+            stats.batches += 1
+            stats.items += len(batch)
+            stats.total_depth += depth
+            stats.max_depth = max(stats.max_depth, depth)
+
+        return True
+
+    def _get(self, in_queue: queue.Queue, stats: PipelineQueueStats) -> Any:
+        start = perf_counter()
+
+        while not self._stopped.is_set():
+            try:
+                batch = in_queue.get(timeout=_POLL_INTERVAL)
+                stats.consumer_waited += perf_counter() - start
+                return batch
+            except queue.Empty:
+                continue
+
+        return _END
+
+    def _read_source(self, out_queue: queue.Queue, stats: PipelineQueueStats):
+        try:
+            items = iter(self._source)
+
+            while True:
+                batch = list(islice(items, self._batch_size))
+
+                if not batch:
+                    break
+
+                if not self._put(out_queue, stats, batch):
+                    return
+
+            self._put(out_queue, stats, _END)
+        except BaseException as e:
+            self._put(out_queue, stats, _StageFailure(e))
+
+    def _map_batches(self, map_batch: Callable[[List[Any]], List[Any]],
+                     in_queue: queue.Queue, in_stats: PipelineQueueStats,
+                     out_queue: queue.Queue, out_stats: PipelineQueueStats):
+        try:
+            while True:
+                batch = self._get(in_queue, in_stats)
+
+                if batch is _END or isinstance(batch, _StageFailure):
+                    self._put(out_queue, out_stats, batch)
+                    return
+
+                if not self._put(out_queue, out_stats, map_batch(batch)):
+                    return
+        except BaseException as e:
+            self._put(out_queue, out_stats, _StageFailure(e))
+
+    def _start(self):
+        if self._threads:
+            raise RuntimeError('the pipeline has already run.')
+
+        for name, _ in self._stages:
+            self._queues.append(queue.Queue(self._queue_size))
+            self._stats.append(PipelineQueueStats(name, self._queue_size))
+
+        self._threads.append(threading.Thread(target=self._read_source, args=(self._queues[0], self._stats[0]),
+                                              name=self._stages[0][0], daemon=True))
+
+        for i, (name, map_batch) in enumerate(self._stages[1:], start=1):
+            self._threads.append(threading.Thread(target=self._map_batches,
+                                                  args=(map_batch, self._queues[i - 1], self._stats[i - 1],
+                                                        self._queues[i], self._stats[i]),
+                                                  name=name, daemon=True))
+
+        for thread in self._threads:
+            thread.start()
+
+    def batches(self) -> Iterator[List[Any]]:
+        """Runs the pipeline and returns the batches of its last stage."""
+        self._start()
+
+        try:
+            while True:
+                batch = self._get(self._queues[-1], self._stats[-1])
+
+                if batch is _END:
+                    return
+
+                if isinstance(batch, _StageFailure):
+                    raise batch.exception
+
+                yield batch
+        finally:
+            self.close()
+
+    def __iter__(self) -> Iterator[Any]:
+        for batch in self.batches():
+            yield from batch
+
+    def close(self):
+        self._stopped.set()
+
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join()
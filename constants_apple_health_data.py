@@ -1,3 +1,4 @@
+HEALTH_DATA = 'HealthData'
 EXPORT_DATE = 'ExportDate'
 ME = 'Me'
 RECORD = 'Record'
@@ -6,6 +7,10 @@ WORKOUT = 'Workout'
 ACTIVITY_SUMMARY = 'ActivitySummary'
 CLINICAL_RECORD = 'ClinicalRecord'
 
+EXPORT_XML = 'export.xml'
+EXPORT_CDA_XML = 'export_cda.xml'
+EXPORT_ARCHIVE_FOLDER = 'apple_health_export'
+
 
 HEALTH_ROOT_CHILDREN = {
     EXPORT_DATE,
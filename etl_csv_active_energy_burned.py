@@ -10,6 +10,7 @@ if __name__ == '__main__':
     csv_loader = AppleHealthActiveEnergyBurnedETLCsv(
         args.xml_filepath, args.csv_filepath,
         args.start_date, args.end_date,
-        args.watch_only_data)
+        args.watch_only_data,
+        args.parser_backend)
 
-    csv_loader.serialize(args.sort)
+    csv_loader.serialize(args.sort, args.sort_memory_budget, args.pipelined)
@@ -11,6 +11,7 @@ if __name__ == '__main__':
     loader = AppleHealthActivitySummaryETLCsv(
         args.xml_filepath, args.csv_filepath,
         args.start_date, args.end_date,
-        args.watch_only_data)
+        args.watch_only_data,
+        args.parser_backend)
 
-    loader.serialize(args.sort)
+    loader.serialize(args.sort, pipelined=args.pipelined)
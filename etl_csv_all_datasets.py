@@ -3,6 +3,19 @@ import argparse
 import pathlib
 
 from cls_apple_health_etl_csv import *
+from cls_apple_health_etl_fanout import AppleHealthDataETLFanOut, AppleHealthDataIncrementalCsvSink, \
+    AppleHealthDataPartitionedCsvSink, CsvFilePool
+from cls_apple_health_etl_npy import AppleHealthDataNpySink, AppleHealthRecordETLNpy
+from cls_apple_health_etl_summary import AppleHealthDataSummarySink, QuantitySampleSummaryFile, SummaryFile, \
+    WorkoutSummaryFile
+from cls_apple_health_etl_watermarks import AppleHealthDataWatermarks
+from cls_apple_health_xml_parsers import ETREE_BACKEND, EXPAT_BACKEND, REGEX_BACKEND
+from cls_compressed_files import COMPRESSION_SUFFIXES
+from cls_external_merge_sort import DEFAULT_SORT_MEMORY_BUDGET
+from summary_cumulative_quantity_sample import csv_io_configs as cumulative_csv_io_configs
+from summary_discrete_quantity_sample import csv_io_configs as discrete_csv_io_configs
+from summary_workout_all import run_predicate, walk_predicate
+from utils import always_true
 
 
 DatasetConfig = namedtuple('DatasetConfig', ('filename', 'etl_csv_class'))
@@ -21,28 +34,157 @@ _configs = [
     DatasetConfig(filename='workout.csv', etl_csv_class=AppleHealthWorkoutETLCsv)
 ]
 
+# the summary files of workout.csv; see summary_workout_all.py, summary_workout_run.py and summary_workout_walk.py
+_workout_summary_configs = [
+    ('workout-summary.csv', always_true),
+    ('workout-summary-run.csv', run_predicate),
+    ('workout-summary-walk.csv', walk_predicate)
+]
+
+
+def _summary_files(filename: str, csv_folder: str) -> List[SummaryFile]:
+    """The summary files that the summary scripts generate from the csv file filename of csv_folder."""
+    summary_files: List[SummaryFile] = [
+        QuantitySampleSummaryFile(quantity_sample_type, f"{csv_folder}/{csv_io.output_file}", csv_io.output_fieldnames)
+        for quantity_sample_type, csv_io_configs in (('CumulativeQuantitySampleSummary', cumulative_csv_io_configs),
+                                                     ('DiscreteQuantitySampleSummary', discrete_csv_io_configs))
+        for csv_io in csv_io_configs if csv_io.input_file == filename
+    ]
+
+    if filename == 'workout.csv':
+        summary_files.extend(WorkoutSummaryFile(f"{csv_folder}/{summary_filename}", include_workout)
+                             for summary_filename, include_workout in _workout_summary_configs)
+
+    return summary_files
+
 
 def generate_datasets(xml_filepath: str,
                       csv_folder: str,
                       start_date: Optional[str],
                       end_date: Optional[str],
                       sort_data: bool,
-                      watch_only_data: bool):
+                      watch_only_data: bool,
+                      max_workers: Optional[int] = None,
+                      parser_backend: str = ETREE_BACKEND,
+                      incremental: bool = False,
+                      npy: bool = False,
+                      sort_memory_budget: int = DEFAULT_SORT_MEMORY_BUDGET,
+                      pipelined: bool = False,
+                      compression: Optional[str] = None,
+                      summaries: bool = False,
+                      write_csv: bool = True):
+    """Generates the datasets of _configs in csv_folder. If npy is set, the records of a quantity type are
+       stored as the columns of a folder named after the csv file instead, e.g., heart-rate/ for heart-rate.csv.
+       compression, e.g., '.gz', is appended to the names of the csv files, which are compressed accordingly.
+
+       If summaries is set, the files of the summary scripts, e.g., step-count-summary.csv, are tallied in the
+       same pass over the xml file. The csv files are not written if write_csv is not set.
+    """
+    if incremental and npy:
+        raise ValueError('the columns of the records cannot be loaded incrementally.')
+
+    if incremental and compression:
+        raise ValueError('compressed csv files cannot be loaded incrementally.')
+
+    if incremental and summaries:
+        raise ValueError('the summaries cannot be tallied incrementally.')
+
+    if not write_csv and (npy or not summaries):
+        raise ValueError('write_csv can only be unset when only the summaries are generated.')
+
+    fanout = AppleHealthDataETLFanOut(xml_filepath, max_workers, parser_backend, pipelined)
+    watermarks = AppleHealthDataWatermarks(csv_folder) if incremental else None
+
+    for config in _configs:
+        summary_files = _summary_files(config.filename, csv_folder) if summaries else []
+
+        if not write_csv and not summary_files:
+            continue
+
+        csv_filepath = f"{csv_folder}/{config.filename}{compression or ''}"
+
+        if write_csv:
+            print(f"ETL for {csv_filepath}")
+        else:
+            print(f"Summaries of {config.filename}: {', '.join(summary.filepath for summary in summary_files)}")
+        try:
+            etl = config.etl_csv_class(xml_filepath, csv_filepath, start_date, end_date, watch_only_data,
+                                       parser_backend)
+
+            if npy and isinstance(etl, AppleHealthRecordETLCsv):
+                npy_folder = f"{csv_folder}/{pathlib.PurePath(config.filename).stem}"
+                npy_etl = AppleHealthRecordETLNpy(etl.route_key, xml_filepath, npy_folder, start_date, end_date,
+                                                  watch_only_data, parser_backend)
+                fanout.register(AppleHealthDataNpySink(npy_etl, sort_data, sort_memory_budget))
+
+                if summary_files:
+                    fanout.register(AppleHealthDataSummarySink(etl, summary_files, False, sort_data,
+                                                               sort_memory_budget))
+            elif summary_files:
+                fanout.register(AppleHealthDataSummarySink(etl, summary_files, write_csv, sort_data,
+                                                           sort_memory_budget))
+            elif watermarks is None:
+                fanout.register_etl(etl, sort_data, sort_memory_budget)
+            else:
+                fanout.register(AppleHealthDataIncrementalCsvSink(etl, watermarks, sort_data, sort_memory_budget))
+        except Exception as e:
+            print(f"{e}\n")
+
+    # a single pass over the xml file feeds every dataset
+    fanout.run()
+
+    for stats in fanout.pipeline_stats:
+        print(stats)
+
+    if watermarks is not None:
+        watermarks.save()
+
+
+def generate_datasets_by_month(xml_filepath: str,
+                               csv_prefix_path: str,
+                               start_date: Optional[str],
+                               end_date: Optional[str],
+                               sort_data: bool,
+                               watch_only_data: bool,
+                               max_workers: Optional[int] = None,
+                               parser_backend: str = ETREE_BACKEND,
+                               max_open_files: int = 64,
+                               sort_memory_budget: int = DEFAULT_SORT_MEMORY_BUDGET,
+                               pipelined: bool = False,
+                               compression: Optional[str] = None):
+    """Generates the datasets of _configs in one pass over the xml file; the rows of a month are written
+       to the csv files of the {csv_prefix_path}/{yyyymm} folder of the month. compression, e.g., '.gz',
+       is appended to the names of the csv files, which are compressed accordingly.
+    """
+    fanout = AppleHealthDataETLFanOut(xml_filepath, max_workers, parser_backend, pipelined)
+    pool = CsvFilePool(max_open_files)
+
     for config in _configs:
-        csv_filepath = f"{csv_folder}/{config.filename}"
-        etl = config.etl_csv_class(xml_filepath, csv_filepath, start_date, end_date, watch_only_data)
-        print(f"ETL for {csv_filepath}")
+        filename = f"{config.filename}{compression or ''}"
+        print(f"ETL for {csv_prefix_path}/yyyymm/{filename}")
         try:
-            etl.serialize(sort_data)
+            etl = config.etl_csv_class(xml_filepath, filename, start_date, end_date, watch_only_data,
+                                       parser_backend)
+            fanout.register(AppleHealthDataPartitionedCsvSink(etl, csv_prefix_path, pool, sort_data,
+                                                              sort_memory_budget))
         except Exception as e:
             print(f"{e}\n")
 
+    try:
+        fanout.run()
+    finally:
+        pool.close()
+
+    for stats in fanout.pipeline_stats:
+        print(stats)
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(prog=__file__,
                                      description='generates csv datasets from exported Apple Health xml file.')
 
-    parser.add_argument('-xml-filepath',  type=str, required=True, help='Apple Health Data xml file path')
+    parser.add_argument('-xml-filepath',  type=str, required=True,
+                        help='Apple Health Data xml file path, export.zip or gzip-compressed xml file path')
     parser.add_argument('-csv-dest-path', type=str, required=True, help='csv folder; '
                                                                         'it will be created if it does not exist.')
     parser.add_argument('-begin-date', type=str, help='earliest date of the data to be loaded; '
@@ -51,8 +193,50 @@ if __name__ == '__main__':
                                                     'default is current date and time. Format: yyyy-mm-dd')
     parser.add_argument('-watch-only-data', action='store_true', default=False, help='load only watch-generated data')
     parser.add_argument('-sort', action='store_true', default=False, help='sort before saving to csv')
+    parser.add_argument('-sort-memory-mb', type=int, default=DEFAULT_SORT_MEMORY_BUDGET // (1024 * 1024),
+                        help='memory budget of the sort of each dataset in MB; the rows beyond it are sorted on disk. '
+                             f'Default is {DEFAULT_SORT_MEMORY_BUDGET // (1024 * 1024)}')
+    parser.add_argument('-workers', type=int, help='number of processes that parse the xml file; '
+                                                   'default is a single-process parse')
+    parser.add_argument('-parser-backend', type=str, default=ETREE_BACKEND,
+                        choices=[ETREE_BACKEND, EXPAT_BACKEND, REGEX_BACKEND],
+                        help='xml parser; etree is the fastest for scanning the whole export')
+    parser.add_argument('-pipelined', action='store_true', default=False,
+                        help='parse the xml file in a thread of its own while the data are transformed and saved')
+    parser.add_argument('-incremental', action='store_true', default=False,
+                        help='append only the data that are newer than the watermarks of the previous run '
+                             f'({AppleHealthDataWatermarks.FILENAME} in the csv folder)')
+    parser.add_argument('-npy', action='store_true', default=False,
+                        help='store the records of each quantity type as NumPy column arrays (.npy files) '
+                             'instead of csv')
+    parser.add_argument('-compress', type=str, choices=[suffix[1:] for suffix in COMPRESSION_SUFFIXES],
+                        help='compress the csv files, e.g., heart-rate.csv.gz with -compress gz')
+    parser.add_argument('-summaries', action='store_true', default=False,
+                        help='generate the files of the summary scripts, e.g., step-count-summary.csv, '
+                             'in the same pass over the xml file')
+    parser.add_argument('-summaries-only', action='store_true', default=False,
+                        help='generate only the files of the summary scripts, without the csv datasets')
 
     args = parser.parse_args()
+
+    if args.incremental and args.end_date is not None:
+        raise SystemExit('-end-date cannot be used with -incremental.')
+
+    if args.incremental and args.npy:
+        raise SystemExit('-npy cannot be used with -incremental.')
+
+    if args.incremental and args.compress:
+        raise SystemExit('-compress cannot be used with -incremental.')
+
+    if args.incremental and (args.summaries or args.summaries_only):
+        raise SystemExit('-summaries and -summaries-only cannot be used with -incremental.')
+
+    if args.npy and args.summaries_only:
+        raise SystemExit('-npy cannot be used with -summaries-only.')
+
+    if args.sort_memory_mb < 1:
+        raise SystemExit('-sort-memory-mb must be positive.')
+
     xml_filepath = pathlib.Path(args.xml_filepath)
 
     if not xml_filepath.exists() or not xml_filepath.is_file():
@@ -65,4 +249,8 @@ if __name__ == '__main__':
     elif not csv_folder.is_dir():
         raise SystemExit(f"{args.csv_dest_path} is not a directory.")
 
-    generate_datasets(xml_filepath, csv_folder, args.begin_date, args.end_date, args.sort, args.watch_only_data)
+    generate_datasets(xml_filepath, csv_folder, args.begin_date, args.end_date, args.sort, args.watch_only_data,
+                      args.workers, args.parser_backend, args.incremental, args.npy,
+                      args.sort_memory_mb * 1024 * 1024, args.pipelined,
+                      f".{args.compress}" if args.compress else None,
+                      args.summaries or args.summaries_only, not args.summaries_only)
@@ -4,7 +4,10 @@ import argparse
 import datetime
 import pathlib
 
-from etl_csv_all_datasets import generate_datasets
+from cls_apple_health_xml_parsers import ETREE_BACKEND, EXPAT_BACKEND, REGEX_BACKEND
+from cls_compressed_files import COMPRESSION_SUFFIXES
+from cls_external_merge_sort import DEFAULT_SORT_MEMORY_BUDGET
+from etl_csv_all_datasets import generate_datasets, generate_datasets_by_month
 from utils import ymd_path_str
 
 if __name__ == '__main__':
@@ -12,35 +15,81 @@ if __name__ == '__main__':
                                      description="generates by month and year all csv datasets from the exported "
                                                  "Apple Health xml file.")
 
-    parser.add_argument('-xml-filepath',  type=str, required=True, help='Apple Health Data xml file path')
+    parser.add_argument('-xml-filepath',  type=str, required=True,
+                        help='Apple Health Data xml file path, export.zip or gzip-compressed xml file path')
     parser.add_argument('-csv-prefix-path', type=str, required=True, help='csv prefix path tht precedes the year-month'
                                                                           '(format: yyyymm) part. The csv folder will '
                                                                           'be created if it does not exists.')
-    parser.add_argument('-year', type=int, required=True, help='year of the month.')
-    parser.add_argument('-month', type=int, required=True, help='month')
+    parser.add_argument('-year', type=int, help='year of the month; required unless -partitioned is set.')
+    parser.add_argument('-month', type=int, help='month; required unless -partitioned is set.')
+    parser.add_argument('-partitioned', action='store_true', default=False,
+                        help='generate the datasets of every month, from -begin-date to -end-date, '
+                             'in a single pass over the xml file')
+    parser.add_argument('-begin-date', type=str, help='with -partitioned, earliest date of the data to be loaded; '
+                                                      'default is 1970-01-01. Format: yyyy-mm-dd')
+    parser.add_argument('-end-date', type=str, help='with -partitioned, the end date of the data to be loaded; '
+                                                    'default is current date and time. Format: yyyy-mm-dd')
+    parser.add_argument('-max-open-files', type=int, default=64,
+                        help='with -partitioned, maximum number of csv files kept open; default is 64')
+    parser.add_argument('-workers', type=int, help='number of processes that parse the xml file; '
+                                                   'default is a single-process parse')
     parser.add_argument('-watch-only-data', action='store_true', default=False, help='load only watch-generated data')
     parser.add_argument('-sort', action='store_true', default=False, help='sort before saving to csv')
+    parser.add_argument('-sort-memory-mb', type=int, default=DEFAULT_SORT_MEMORY_BUDGET // (1024 * 1024),
+                        help='memory budget of the sort of each dataset in MB; the rows beyond it are sorted on disk. '
+                             f'Default is {DEFAULT_SORT_MEMORY_BUDGET // (1024 * 1024)}')
+    parser.add_argument('-parser-backend', type=str, default=ETREE_BACKEND,
+                        choices=[ETREE_BACKEND, EXPAT_BACKEND, REGEX_BACKEND],
+                        help='xml parser; etree is the fastest for scanning the whole export')
+    parser.add_argument('-pipelined', action='store_true', default=False,
+                        help='parse the xml file in a thread of its own while the data are transformed and saved')
+    parser.add_argument('-compress', type=str, choices=[suffix[1:] for suffix in COMPRESSION_SUFFIXES],
+                        help='compress the csv files, e.g., heart-rate.csv.gz with -compress gz')
 
     args = parser.parse_args()
+    compression = f".{args.compress}" if args.compress else None
     xml_filepath = pathlib.Path(args.xml_filepath)
 
     if not xml_filepath.exists() or not xml_filepath.is_file():
         raise SystemExit(f"{xml_filepath} is not a regular file or it does not exist.")
 
-    if args.year < 1970:
-        raise SystemExit('The year provided is before 1970.')
+    if args.sort_memory_mb < 1:
+        raise SystemExit('-sort-memory-mb must be positive.')
 
-    if args.month < 1 or args.month > 12:
-        raise SystemExit('The month is not valid.')
+    if args.partitioned:
+        if args.year is not None or args.month is not None:
+            raise SystemExit('-year and -month cannot be used with -partitioned.')
 
-    csv_folder = pathlib.Path(f"{args.csv_prefix_path}/{ymd_path_str(args.year, args.month)}")
+        if args.max_open_files < 1:
+            raise SystemExit('-max-open-files must be positive.')
 
-    if not csv_folder.exists():
-        csv_folder.mkdir(parents=True)
+        generate_datasets_by_month(xml_filepath, args.csv_prefix_path, args.begin_date, args.end_date, args.sort,
+                                   args.watch_only_data, args.workers, args.parser_backend, args.max_open_files,
+                                   args.sort_memory_mb * 1024 * 1024, args.pipelined, compression)
+    else:
+        if args.year is None or args.month is None:
+            raise SystemExit('-year and -month are required unless -partitioned is set.')
 
-    year = args.year
-    month = args.month
-    start_date = datetime.datetime(year, month, 1)
-    end_date = datetime.datetime(year, month, monthrange(year, month)[1], 23, 59, 59)
+        if args.begin_date is not None or args.end_date is not None:
+            raise SystemExit('-begin-date and -end-date require -partitioned.')
 
-    generate_datasets(xml_filepath, csv_folder, start_date, end_date, args.sort, args.watch_only_data)
+        if args.year < 1970:
+            raise SystemExit('The year provided is before 1970.')
+
+        if args.month < 1 or args.month > 12:
+            raise SystemExit('The month is not valid.')
+
+        csv_folder = pathlib.Path(f"{args.csv_prefix_path}/{ymd_path_str(args.year, args.month)}")
+
+        if not csv_folder.exists():
+            csv_folder.mkdir(parents=True)
+
+        year = args.year
+        month = args.month
+        start_date = datetime.datetime(year, month, 1)
+        end_date = datetime.datetime(year, month, monthrange(year, month)[1], 23, 59, 59)
+
+        generate_datasets(xml_filepath, csv_folder, start_date, end_date, args.sort, args.watch_only_data,
+                          args.workers, parser_backend=args.parser_backend,
+                          sort_memory_budget=args.sort_memory_mb * 1024 * 1024, pipelined=args.pipelined,
+                          compression=compression)
@@ -3,6 +3,9 @@ import argparse
 import datetime
 import pathlib
 
+from cls_apple_health_xml_parsers import ETREE_BACKEND, EXPAT_BACKEND, REGEX_BACKEND
+from cls_external_merge_sort import DEFAULT_SORT_MEMORY_BUDGET
+
 
 @dataclass
 class XmlCsvArgs:
@@ -12,21 +15,36 @@ class XmlCsvArgs:
     end_date: datetime.datetime
     sort: bool
     watch_only_data: bool
+    parser_backend: str = ETREE_BACKEND
+    sort_memory_budget: int = DEFAULT_SORT_MEMORY_BUDGET
+    pipelined: bool = False
 
 
 def parse_cmdline(prog: str, description: str) -> XmlCsvArgs:
     parser = argparse.ArgumentParser(prog=prog, description=description)
 
-    parser.add_argument('-xml-path',  type=str, required=True, help='Apple Health Data xml file path')
+    parser.add_argument('-xml-path',  type=str, required=True,
+                        help='Apple Health Data xml file path, export.zip or gzip-compressed xml file path')
     parser.add_argument('-csv-path', type=str, required=True, help='csv output file path')
     parser.add_argument('-begin-date', type=str, help='earliest date of the data to be loaded; '
                                                       'default is 1970-01-01. Format: yyyy-mm-dd')
     parser.add_argument('-end-date', type=str, help='the end date of the data to be loaded; '
                                                     'default is current date and time. Format: yyyy-mm-dd')
     parser.add_argument('-sort', action='store_true', default=False, help='sort before saving to csv')
+    parser.add_argument('-sort-memory-mb', type=int, default=DEFAULT_SORT_MEMORY_BUDGET // (1024 * 1024),
+                        help='memory budget of the sort in MB; the rows beyond it are sorted on disk. '
+                             f'Default is {DEFAULT_SORT_MEMORY_BUDGET // (1024 * 1024)}')
     parser.add_argument('-watch-only-data', action='store_true', default=False, help='load only watch-generated data')
+    parser.add_argument('-parser-backend', type=str, default=ETREE_BACKEND,
+                        choices=[ETREE_BACKEND, EXPAT_BACKEND, REGEX_BACKEND],
+                        help='xml parser; regex is the fastest for the records of a single type')
+    parser.add_argument('-pipelined', action='store_true', default=False,
+                        help='parse the xml file in a thread of its own while the data are transformed and saved')
     args = parser.parse_args()
 
+    if args.sort_memory_mb < 1:
+        raise ValueError('-sort-memory-mb must be positive.')
+
     xml_filepath = pathlib.Path(args.xml_path)
 
     if not xml_filepath.exists():
@@ -37,5 +55,8 @@ def parse_cmdline(prog: str, description: str) -> XmlCsvArgs:
                       args.begin_date,
                       args.end_date,
                       args.sort,
-                      args.watch_only_data
+                      args.watch_only_data,
+                      args.parser_backend,
+                      args.sort_memory_mb * 1024 * 1024,
+                      args.pipelined
                       )
@@ -9,7 +9,8 @@ if __name__ == '__main__':
                          description="Extracts Walking and Running Distance data from Apple Health Data xml file.")
 
     loader = AppleHealthDistanceWalkingRunningETLCsv(args.xml_filepath, args.csv_filepath, args.start_date,
-                                                     args.end_date, args.watch_only_data)
+                                                     args.end_date, args.watch_only_data,
+        args.parser_backend)
 
-    loader.serialize(args.sort)
+    loader.serialize(args.sort, args.sort_memory_budget, args.pipelined)
 
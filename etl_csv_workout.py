@@ -10,7 +10,8 @@ if __name__ == '__main__':
     loader = AppleHealthWorkoutETLCsv(
         args.xml_filepath, args.csv_filepath,
         args.start_date, args.end_date,
-        args.watch_only_data
+        args.watch_only_data,
+        args.parser_backend
     )
 
-    loader.serialize(args.sort)
+    loader.serialize(args.sort, args.sort_memory_budget, args.pipelined)
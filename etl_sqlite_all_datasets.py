@@ -0,0 +1,84 @@
+import argparse
+import pathlib
+
+from cls_apple_health_etl_csv import *
+from cls_apple_health_etl_fanout import AppleHealthDataETLFanOut
+from cls_apple_health_etl_sqlite import AppleHealthDataSqliteDatabase, AppleHealthDataSqliteSink
+from cls_apple_health_xml_parsers import ETREE_BACKEND, EXPAT_BACKEND, REGEX_BACKEND
+from cls_external_merge_sort import DEFAULT_SORT_MEMORY_BUDGET
+from etl_csv_all_datasets import _configs
+
+
+def load_datasets(xml_filepath: str,
+                  db_filepath: str,
+                  start_date: Optional[str],
+                  end_date: Optional[str],
+                  sort_data: bool,
+                  watch_only_data: bool,
+                  max_workers: Optional[int] = None,
+                  parser_backend: str = ETREE_BACKEND,
+                  batch_size: int = 10000,
+                  sort_memory_budget: int = DEFAULT_SORT_MEMORY_BUDGET,
+                  pipelined: bool = False):
+    fanout = AppleHealthDataETLFanOut(xml_filepath, max_workers, parser_backend, pipelined)
+
+    with AppleHealthDataSqliteDatabase(db_filepath, batch_size) as database:
+        for config in _configs:
+            print(f"ETL for {config.filename} into {db_filepath}")
+            try:
+                # the csv filepath of the etl only names its dataset
+                etl = config.etl_csv_class(xml_filepath, config.filename, start_date, end_date, watch_only_data,
+                                           parser_backend)
+                fanout.register(AppleHealthDataSqliteSink(etl, database, sort_data, sort_memory_budget))
+            except Exception as e:
+                print(f"{e}\n")
+
+        # a single pass over the xml file feeds every table
+        fanout.run()
+
+    for stats in fanout.pipeline_stats:
+        print(stats)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog=__file__,
+                                     description='loads the records, workouts and activity summaries of the exported '
+                                                 'Apple Health xml file in a SQLite database.')
+
+    parser.add_argument('-xml-filepath',  type=str, required=True,
+                        help='Apple Health Data xml file path, export.zip or gzip-compressed xml file path')
+    parser.add_argument('-db-filepath', type=str, required=True, help='SQLite database file path; it will be '
+                                                                      'created if it does not exist.')
+    parser.add_argument('-begin-date', type=str, help='earliest date of the data to be loaded; '
+                                                      'default is 1970-01-01. Format: yyyy-mm-dd')
+    parser.add_argument('-end-date', type=str, help='the end date of the data to be loaded; '
+                                                    'default is current date and time. Format: yyyy-mm-dd')
+    parser.add_argument('-watch-only-data', action='store_true', default=False, help='load only watch-generated data')
+    parser.add_argument('-sort', action='store_true', default=False, help='sort before loading')
+    parser.add_argument('-sort-memory-mb', type=int, default=DEFAULT_SORT_MEMORY_BUDGET // (1024 * 1024),
+                        help='memory budget of the sort of each dataset in MB; the rows beyond it are sorted on disk. '
+                             f'Default is {DEFAULT_SORT_MEMORY_BUDGET // (1024 * 1024)}')
+    parser.add_argument('-workers', type=int, help='number of processes that parse the xml file; '
+                                                   'default is a single-process parse')
+    parser.add_argument('-parser-backend', type=str, default=ETREE_BACKEND,
+                        choices=[ETREE_BACKEND, EXPAT_BACKEND, REGEX_BACKEND],
+                        help='xml parser; etree is the fastest for scanning the whole export')
+    parser.add_argument('-pipelined', action='store_true', default=False,
+                        help='parse the xml file in a thread of its own while the data are transformed and saved')
+    parser.add_argument('-batch-size', type=int, default=10000, help='number of rows per insert; default is 10000')
+
+    args = parser.parse_args()
+    xml_filepath = pathlib.Path(args.xml_filepath)
+
+    if not xml_filepath.exists() or not xml_filepath.is_file():
+        raise SystemExit(f"{xml_filepath} is not a regular file or it does not exist.")
+
+    if args.batch_size < 1:
+        raise SystemExit('-batch-size must be positive.')
+
+    if args.sort_memory_mb < 1:
+        raise SystemExit('-sort-memory-mb must be positive.')
+
+    load_datasets(xml_filepath, args.db_filepath, args.begin_date, args.end_date, args.sort, args.watch_only_data,
+                  args.workers, args.parser_backend, args.batch_size, args.sort_memory_mb * 1024 * 1024,
+                  args.pipelined)
@@ -0,0 +1,29 @@
+import argparse
+import pathlib
+
+from cls_apple_health_xml_index import AppleHealthDataSectionIndex
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog=__file__,
+                                     description='builds the section index of the exported Apple Health xml file. '
+                                                 'The record type, workout and activity summary streams read only '
+                                                 'their sections of an indexed xml file.')
+
+    parser.add_argument('-xml-filepath',  type=str, required=True, help='Apple Health Data xml file path')
+    parser.add_argument('-rebuild', action='store_true', default=False, help='rebuild an up-to-date index')
+
+    args = parser.parse_args()
+    xml_filepath = pathlib.Path(args.xml_filepath)
+
+    if not xml_filepath.exists() or not xml_filepath.is_file():
+        raise SystemExit(f"{xml_filepath} is not a regular file or it does not exist.")
+
+    if args.rebuild:
+        index = AppleHealthDataSectionIndex.build(xml_filepath)
+        index.save()
+    else:
+        index = AppleHealthDataSectionIndex.load_or_build(xml_filepath)
+
+    for key in sorted(index.keys()):
+        print(f"{key}: {index.sections(key)}")
@@ -1,8 +1,11 @@
 import abc
+import bisect
 import datetime
 import itertools
 from collections import namedtuple
-from typing import Callable, Iterator, Optional, Sequence, Union
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
 
 __all__ = [
     'IntervalTypes',
@@ -12,6 +15,8 @@ __all__ = [
     'HalfClosedIntervalRight',
     'OpenInterval',
     'map_elements_to_intervals',
+    'IntervalIndex',
+    'interval_ordinals',
     'month_firstdate_intervals',
     'ElementIntervalPair'
 ]
@@ -149,6 +154,149 @@ def map_elements_to_intervals(sorted_elements: Iterator[IntervalTypes],
         pass
 
 
+def _as_array(values: Union[np.ndarray, Sequence[IntervalTypes]]) -> np.ndarray:
+    if isinstance(values, np.ndarray):
+        return values
+
+    values = list(values)
+
+    if values and isinstance(values[0], datetime.datetime):
+        return np.array(values, dtype='datetime64[us]')
+
+    if values and isinstance(values[0], datetime.date):
+        return np.array(values, dtype='datetime64[D]')
+
+    return np.array(values)
+
+
+def _contains_lower_end(interval: Interval) -> bool:
+    return isinstance(interval, (ClosedInterval, HalfClosedIntervalLeft))
+
+
+def _contains_upper_end(interval: Interval) -> bool:
+    return isinstance(interval, (ClosedInterval, HalfClosedIntervalRight))
+
+
+class IntervalIndex:
+    """Finds the interval of an element among disjoint intervals, in any order of the elements and of the
+       intervals, by bisecting the sorted lower ends of the intervals: O(log n) for n intervals.
+
+       The intervals can be of any of the Interval classes, e.g., the adjacent [a, b) and [b, c) of
+       month_firstdate_intervals or (a, b] and (b, c]; an element is in the interval whose ends, open or
+       closed, contain it. Intervals that share an element raise a ValueError.
+    """
+    def __init__(self, intervals: Iterable[Interval]):
+        self._intervals: List[Interval] = sorted(intervals, key=lambda interval: (interval.lower_end,
+                                                                                  interval.upper_end))
+
+        for previous, interval in zip(self._intervals, self._intervals[1:]):
+            if interval.lower_end < previous.upper_end or \
+                    (interval.lower_end == previous.upper_end and _contains_upper_end(previous) and
+                     _contains_lower_end(interval)):
+                raise ValueError(f"The intervals {previous} and {interval} overlap.")
+
+        self._lower_ends = [interval.lower_end for interval in self._intervals]
+        self._end_arrays: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = None
+
+    def __len__(self):
+        return len(self._intervals)
+
+    @property
+    def intervals(self) -> List[Interval]:
+        return list(self._intervals)
+
+    def find(self, element: IntervalTypes) -> Optional[Interval]:
+        """Returns the interval of element, None if element is in none of the intervals."""
+        i = bisect.bisect_right(self._lower_ends, element) - 1
+
+        if i < 0:
+            return None
+
+        interval = self._intervals[i]
+
+        if element in interval:
+            return interval
+
+        # element is the open lower end of the interval and maybe the closed upper end of the previous one
+        if i > 0 and element in self._intervals[i - 1]:
+            return self._intervals[i - 1]
+
+        return None
+
+    def find_many(self, elements: Iterable[IntervalTypes]) -> List[Optional[Interval]]:
+        """Returns the interval of every element, in the order of the elements, like find, but faster for many
+           elements: they are bisected by a single map.
+        """
+        elements = list(elements)
+        lower_ends = self._lower_ends
+        intervals = [None] + self._intervals
+        previous_intervals = [None, None] + self._intervals[:-1]
+        indexes = map(bisect.bisect_right, itertools.repeat(lower_ends), elements)
+        found: List[Optional[Interval]] = []
+        append = found.append
+
+        for element, i in zip(elements, indexes):
+            interval = intervals[i]
+
+            if interval is not None and element in interval:
+                append(interval)
+            else:
+                previous = previous_intervals[i]
+                append(previous if previous is not None and element in previous else None)
+
+        return found
+
+    def ordinals(self, elements: Union[np.ndarray, Sequence[IntervalTypes]]) -> np.ndarray:
+        """Returns the ordinal of each element's interval among the sorted intervals, -1 if the element is in
+           none of them, with a single np.searchsorted over the lower ends.
+
+           elements is an array of numbers, e.g., epochs, of datetime64 or of strings, e.g., yyyy-mm-dd dates,
+           or a sequence of them or of dates, which are converted like the ends of the intervals.
+        """
+        if self._end_arrays is None:
+            self._end_arrays = (_as_array([interval.lower_end for interval in self._intervals]),
+                                _as_array([interval.upper_end for interval in self._intervals]),
+                                np.array([_contains_lower_end(interval) for interval in self._intervals], dtype=bool),
+                                np.array([_contains_upper_end(interval) for interval in self._intervals], dtype=bool))
+
+        lower_ends, upper_ends, closed_lower_ends, closed_upper_ends = self._end_arrays
+        values = _as_array(elements)
+
+        if len(self._intervals) == 0 or values.size == 0:
+            return np.full(values.shape, -1, dtype=np.int64)
+
+        i = np.searchsorted(lower_ends, values, side='right') - 1
+        candidate = np.maximum(i, 0)
+        # lower_ends[candidate] <= values unless i is -1
+        inside = (i >= 0) & ((values != lower_ends[candidate]) | closed_lower_ends[candidate]) & \
+                 ((values < upper_ends[candidate]) | ((values == upper_ends[candidate]) &
+                                                      closed_upper_ends[candidate]))
+        # an element at the open lower end of an interval is in the previous one if it has a closed upper end
+        previous = np.maximum(i - 1, 0)
+        in_previous = ~inside & (i >= 1) & (values == upper_ends[previous]) & closed_upper_ends[previous]
+        return np.where(inside, i, np.where(in_previous, i - 1, -1))
+
+    def map_elements(self, elements: Iterable[IntervalTypes]) -> Iterator[ElementIntervalPair]:
+        """Pairs the elements with their intervals like map_elements_to_intervals, in the order of the
+           elements, which need not be sorted; the elements that are in none of the intervals are skipped.
+        """
+        find = self.find
+
+        for element in elements:
+            interval = find(element)
+
+            if interval is not None:
+                yield ElementIntervalPair(element, interval)
+
+
+def interval_ordinals(elements: Union[np.ndarray, Sequence[IntervalTypes]],
+                      intervals: Sequence[Interval]) -> np.ndarray:
+    """Returns the ordinal of each element's interval among the sorted disjoint intervals, -1 if the element
+       is in none of them; see IntervalIndex.ordinals.
+    """
+    return IntervalIndex(intervals).ordinals(elements)
+
+
 def month_firstdate_intervals(
         dates_iter: Iterator[Union[str, datetime.date]],
         keyfunc: Callable[[IntervalTypes], IntervalTypes],
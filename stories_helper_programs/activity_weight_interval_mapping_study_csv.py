@@ -5,7 +5,7 @@ import pathlib
 from collections import namedtuple
 from typing import List
 
-from intervals import month_firstdate_intervals, map_elements_to_intervals
+from intervals import ElementIntervalPair, IntervalIndex, month_firstdate_intervals
 from utils import weighin_date_group_key
 
 activity_weight_interval_fieldnames = ["Date", "Day", "Activity",
@@ -44,8 +44,13 @@ def tocsv_activity_weight_interval_mapping(weights_csvpath: str,
         weighin_intervals = month_firstdate_intervals(dates_iter, weighin_date_group_key, True)
 
         activities = filter(lambda x: float(x['activeEnergyBurned']) > 0, activity_summary_reader)
-        activities_dates = map(lambda x: x['dateComponents'], activities)
-        activity_weighin_interval_mapping = map_elements_to_intervals(activities_dates, weighin_intervals)
+        activities_dates = [activity['dateComponents'] for activity in activities]
+        index = IntervalIndex(weighin_intervals)
+        indexed_intervals = index.intervals
+        activity_weighin_interval_mapping = iter([
+            ElementIntervalPair(activity_date, indexed_intervals[ordinal])
+            for activity_date, ordinal in zip(activities_dates, index.ordinals(activities_dates).tolist())
+            if ordinal >= 0])
 
         try:
             activity_date, interval = next(activity_weighin_interval_mapping)
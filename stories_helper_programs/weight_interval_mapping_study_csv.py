@@ -5,7 +5,7 @@ import itertools
 import pathlib
 from typing import Any, Dict, Tuple
 
-from intervals import month_firstdate_intervals, map_elements_to_intervals, ElementIntervalPair
+from intervals import month_firstdate_intervals, ElementIntervalPair, IntervalIndex
 from utils import weighin_date_group_key
 
 
@@ -60,9 +60,14 @@ def tocsv_extended_weight_attrs(weights_csvpath: str,
         wrdr1, wrdr2, wrdr3 = itertools.tee(weighin_reader, 3)
         dates_iter = map(lambda x: x['date'], wrdr1)
         intervals = month_firstdate_intervals(dates_iter, weighin_date_group_key, True)
-        weighin_dates = map(lambda x: x['date'], wrdr2)
-
-        zipped = itertools.zip_longest(wrdr3, map_elements_to_intervals(weighin_dates, intervals))
+        weighin_dates = [weight['date'] for weight in wrdr2]
+        index = IntervalIndex(intervals)
+        indexed_intervals = index.intervals
+        ordinals = index.ordinals(weighin_dates).tolist()
+        weighin_interval_pairs = [ElementIntervalPair(weighin_date, indexed_intervals[ordinal]) if ordinal >= 0
+                                  else None for weighin_date, ordinal in zip(weighin_dates, ordinals)]
+
+        zipped = itertools.zip_longest(wrdr3, weighin_interval_pairs)
 
         try:
             while unzipped := next(zipped):
@@ -1,10 +1,16 @@
 import argparse
 import pathlib
+from typing import Optional
 
 from constants_apple_health_data import (csv_fieldnames_distance_walking_running_summary,
                                          csv_fieldnames_step_count_summary)
 
-from summary_quantity_sample import create_cumulative_sample_summary_file, CsvIOQuantitySamples
+from summary_quantity_sample import (create_cumulative_sample_summary_file,
+                                     create_deduplicated_sample_summary_file,
+                                     create_merged_cumulative_sample_summary_file,
+                                     month_partition_filepaths,
+                                     update_cumulative_sample_summary_file,
+                                     CsvIOQuantitySamples)
 
 csv_io_configs = [
     CsvIOQuantitySamples('distance-walking-running.csv', 'distance-walking-running-summary.csv',
@@ -14,12 +20,35 @@ csv_io_configs = [
 ]
 
 
-def generate_cumulative_sample_files(csv_directory: str):
+def generate_cumulative_sample_files(csv_directory: str, incremental: bool = False, partitioned: bool = False,
+                                     max_workers: Optional[int] = None, deduplicate: bool = False):
+    """Generates the summary files of csv_directory; if partitioned is set, those of the monthly csv files of
+       its yyyymm folders, which are tallied by max_workers processes. If deduplicate is set, the samples of
+       every device are summed up, but only once where they overlap.
+    """
+    if deduplicate:
+        for csv_io in csv_io_configs:
+            csv_summary_path = f"{csv_directory}/{csv_io.output_file}"
+            print(f"Generating {csv_summary_path}.")
+            create_deduplicated_sample_summary_file(f"{csv_directory}/{csv_io.input_file}", csv_summary_path,
+                                                    csv_io.output_fieldnames)
+        return
+
+    if partitioned:
+        for csv_io in csv_io_configs:
+            csv_summary_path = f"{csv_directory}/{csv_io.output_file}"
+            print(f"Generating {csv_summary_path}.")
+            create_merged_cumulative_sample_summary_file(month_partition_filepaths(csv_directory, csv_io.input_file),
+                                                         csv_summary_path, csv_io.output_fieldnames, max_workers)
+        return
+
+    create_summary_file = update_cumulative_sample_summary_file if incremental else create_cumulative_sample_summary_file
+
     for csv_io in csv_io_configs:
         csv_file_path = f"{csv_directory}/{csv_io.input_file}"
         csv_summary_path = f"{csv_directory}/{csv_io.output_file}"
         print(f"Generating {csv_summary_path}.")
-        create_cumulative_sample_summary_file(csv_file_path, csv_summary_path, csv_io.output_fieldnames)
+        create_summary_file(csv_file_path, csv_summary_path, csv_io.output_fieldnames)
 
 
 if __name__ == '__main__':
@@ -27,6 +56,16 @@ if __name__ == '__main__':
                                      description='Generates summary datasets of cumulative quantity sample types.')
 
     parser.add_argument('-csv-directory', type=str, required=True, help='directory of csv files')
+    parser.add_argument('-incremental', action='store_true', default=False,
+                        help='tally only the data that an incremental ETL run appended to the csv files')
+    parser.add_argument('-partitioned', action='store_true', default=False,
+                        help='summarize the csv files of the yyyymm folders of -csv-directory, e.g., those of '
+                             'etl_csv_all_datasets_by_month.py -partitioned')
+    parser.add_argument('-workers', type=int, help='with -partitioned, number of processes that tally the monthly '
+                                                   'csv files; default is the number of processors')
+    parser.add_argument('-deduplicate', action='store_true', default=False,
+                        help="sum up the samples of the iPhone and the watch, counting the time they overlap once "
+                             "and preferring the watch's samples; by default only the watch's samples are summed up")
     args = parser.parse_args()
 
     csv_folder = pathlib.Path(args.csv_directory)
@@ -34,6 +73,13 @@ if __name__ == '__main__':
     if not csv_folder.exists() or not csv_folder.is_dir():
         raise SystemExit(f"{args.csv_directory} is not a folder or it doesn't exist.")
 
-    generate_cumulative_sample_files(args.csv_directory)
+    if args.partitioned and args.incremental:
+        raise SystemExit('-incremental cannot be used with -partitioned.')
+
+    if args.deduplicate and (args.partitioned or args.incremental):
+        raise SystemExit('-deduplicate cannot be used with -partitioned or -incremental.')
+
+    generate_cumulative_sample_files(args.csv_directory, args.incremental, args.partitioned, args.workers,
+                                     args.deduplicate)
 
 
@@ -1,12 +1,17 @@
 import argparse
 import pathlib
+from typing import Optional
 
 from constants_apple_health_data import (csv_fieldnames_bodymass_summary,
                                          csv_fieldnames_resting_heart_rate_summary,
                                          csv_fieldnames_vo2max_summary,
                                          csv_fieldnames_waist2piR_summary)
 
-from summary_quantity_sample import create_discrete_sample_summary_file, CsvIOQuantitySamples
+from summary_quantity_sample import (create_discrete_sample_summary_file,
+                                     create_merged_discrete_sample_summary_file,
+                                     month_partition_filepaths,
+                                     update_discrete_sample_summary_file,
+                                     CsvIOQuantitySamples)
 
 csv_io_configs = [
     CsvIOQuantitySamples('body-mass.csv', 'bodymass-summary.csv', csv_fieldnames_bodymass_summary),
@@ -17,12 +22,26 @@ csv_io_configs = [
 ]
 
 
-def generate_discrete_sample_files(csv_directory: str):
+def generate_discrete_sample_files(csv_directory: str, incremental: bool = False, partitioned: bool = False,
+                                   max_workers: Optional[int] = None):
+    """Generates the summary files of csv_directory; if partitioned is set, those of the monthly csv files of
+       its yyyymm folders, which are tallied by max_workers processes.
+    """
+    if partitioned:
+        for csv_io in csv_io_configs:
+            csv_summary_path = f"{csv_directory}/{csv_io.output_file}"
+            print(f"Generating {csv_summary_path}.")
+            create_merged_discrete_sample_summary_file(month_partition_filepaths(csv_directory, csv_io.input_file),
+                                                       csv_summary_path, csv_io.output_fieldnames, max_workers)
+        return
+
+    create_summary_file = update_discrete_sample_summary_file if incremental else create_discrete_sample_summary_file
+
     for csv_io in csv_io_configs:
         csv_file_path = f"{csv_directory}/{csv_io.input_file}"
         csv_summary_path = f"{csv_directory}/{csv_io.output_file}"
         print(f"Generating {csv_summary_path}.")
-        create_discrete_sample_summary_file(csv_file_path, csv_summary_path, csv_io.output_fieldnames)
+        create_summary_file(csv_file_path, csv_summary_path, csv_io.output_fieldnames)
 
 
 if __name__ == '__main__':
@@ -30,6 +49,13 @@ if __name__ == '__main__':
                                      description='Generates summary datasets of discrete quantity sample types.')
 
     parser.add_argument('-csv-directory', type=str, required=True, help='directory of csv files')
+    parser.add_argument('-incremental', action='store_true', default=False,
+                        help='tally only the data that an incremental ETL run appended to the csv files')
+    parser.add_argument('-partitioned', action='store_true', default=False,
+                        help='summarize the csv files of the yyyymm folders of -csv-directory, e.g., those of '
+                             'etl_csv_all_datasets_by_month.py -partitioned')
+    parser.add_argument('-workers', type=int, help='with -partitioned, number of processes that tally the monthly '
+                                                   'csv files; default is the number of processors')
     args = parser.parse_args()
 
     csv_folder = pathlib.Path(args.csv_directory)
@@ -37,4 +63,7 @@ if __name__ == '__main__':
     if not csv_folder.exists() or not csv_folder.is_dir():
         raise SystemExit(f"{args.csv_directory} is not a folder or it doesn't exist.")
 
-    generate_discrete_sample_files(args.csv_directory)
+    if args.partitioned and args.incremental:
+        raise SystemExit('-incremental cannot be used with -partitioned.')
+
+    generate_discrete_sample_files(args.csv_directory, args.incremental, args.partitioned, args.workers)
@@ -0,0 +1,28 @@
+import argparse
+import pathlib
+
+from summary_quantity_sample import DEFAULT_SUMMARY_QUANTILES, create_quantile_summary_file
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog=__file__,
+                                     description='Generates the daily quantiles of heart rate, e.g., the median, '
+                                                 'of heart-rate.csv.')
+
+    parser.add_argument('-csv-directory', type=str, required=True, help='directory of csv files')
+    parser.add_argument('-quantiles', type=float, nargs='+', default=list(DEFAULT_SUMMARY_QUANTILES),
+                        help='fractions of the quantiles; default is '
+                             f"{' '.join(str(fraction) for fraction in DEFAULT_SUMMARY_QUANTILES)}")
+    args = parser.parse_args()
+
+    csv_folder = pathlib.Path(args.csv_directory)
+
+    if not csv_folder.exists() or not csv_folder.is_dir():
+        raise SystemExit(f"{args.csv_directory} is not a folder or it doesn't exist.")
+
+    if any(not 0 <= fraction <= 1 for fraction in args.quantiles):
+        raise SystemExit('-quantiles must be between 0 and 1.')
+
+    csv_summary_path = f"{args.csv_directory}/heart-rate-summary.csv"
+    print(f"Generating {csv_summary_path}.")
+    create_quantile_summary_file(f"{args.csv_directory}/heart-rate.csv", csv_summary_path, args.quantiles)
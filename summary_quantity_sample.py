@@ -1,15 +1,26 @@
 from collections import namedtuple
-from typing import Dict, List
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Union
 import csv
+import json
+import os
 
 from cls_sample_summary import (SampleSummary,
                                 CumulativeQuantitySampleSummary,
-                                DiscreteQuantitySampleSummary)
+                                DiscreteQuantitySampleSummary,
+                                DEFAULT_SUMMARY_QUANTILES,
+                                QuantileQuantitySampleSummary,
+                                QuantileSampleSummaryRecord)
 
+from cls_apple_health_etl_watermarks import AppleHealthDataWatermarks
+from cls_overlap_sweep import CumulativeSampleSweep
+from cls_compressed_files import COMPRESSION_SUFFIXES, is_compressed_file, open_text_input, open_text_output
 from cls_healthkit import HKRecordFactory
 from utils import is_device_watch
 import constants_apple_health_data as hd
 
+SUMMARY_STATE_SUFFIX = '.state.json'
+
 CsvIOQuantitySamples = namedtuple('CsvIOQuantitySamples', ('input_file', 'output_file', 'output_fieldnames'))
 
 quantity_sample_types: Dict[str, SampleSummary] = {
@@ -27,6 +38,58 @@ _value_field_map = {
 }
 
 
+def tally_sample_rows(quantity_sample_type: str, reader: Iterable[Dict[str, str]],
+                      summary: Optional[SampleSummary] = None) -> Optional[SampleSummary]:
+    for record in HKRecordFactory.create_many(reader):
+        if summary is None:
+            summary = quantity_sample_types[quantity_sample_type](record.type, record.unit)
+
+        if is_device_watch(record.device):
+            summary.tally(record)
+
+    return summary
+
+
+def write_sample_summary_file(summary: Union[SampleSummary, CumulativeSampleSweep], csv_output_filepath: str,
+                              csv_output_fieldnames: List[str]):
+    with open_text_output(csv_output_filepath, 'w') as wf:
+        writer = csv.DictWriter(wf, fieldnames=csv_output_fieldnames)
+        writer.writeheader()
+
+        for record in summary.collect():
+            writer.writerow({
+                hd.csv_date: record.date,
+                _value_field_map[record.type]: record.value,
+                hd.csv_unit: record.unit
+            })
+
+
+def create_quantile_summary_file(csv_input_filepath: str, csv_output_filepath: str,
+                                 quantiles: List[float] = DEFAULT_SUMMARY_QUANTILES):
+    """Writes the daily quantiles, max and count of the watch records of the csv input file, e.g., heart-rate.csv."""
+    summary = None
+
+    with open_text_input(csv_input_filepath) as rf:
+        for record in HKRecordFactory.create_many(csv.DictReader(rf)):
+            if summary is None:
+                summary = QuantileQuantitySampleSummary(record.type, record.unit, quantiles)
+
+            if is_device_watch(record.device):
+                summary.tally(record)
+
+    if summary is None:
+        return
+
+    with open_text_output(csv_output_filepath, 'w') as wf:
+        writer = csv.DictWriter(wf, fieldnames=[hd.csv_date] +
+                                [QuantileSampleSummaryRecord.quantile_field_name(fraction) for fraction in quantiles] +
+                                ['max', 'count', hd.csv_unit])
+        writer.writeheader()
+
+        for record in summary.collect():
+            writer.writerow(record.to_dict())
+
+
 def create_sample_summary_file(
         quantity_sample_type: str,
         csv_input_filepath: str,
@@ -36,36 +99,155 @@ def create_sample_summary_file(
     if quantity_sample_type not in quantity_sample_types:
         raise ValueError(f"{quantity_sample_type} is not a valid type.")
 
+    with open_text_input(csv_input_filepath) as rf:
+        summary = tally_sample_rows(quantity_sample_type, csv.DictReader(rf))
+
+    if summary is not None:
+        write_sample_summary_file(summary, csv_output_filepath, csv_output_fieldnames)
+
+
+def month_partition_filepaths(csv_prefix_path: str, filename: str) -> List[str]:
+    """Returns the paths of the filename csv files of the {csv_prefix_path}/{yyyymm} folders, compressed or not,
+       in the order of the months.
+    """
+    filenames = [filename] + [f"{filename}{suffix}" for suffix in COMPRESSION_SUFFIXES]
+    months = sorted(entry.name for entry in os.scandir(csv_prefix_path)
+                    if entry.is_dir() and len(entry.name) == 6 and entry.name.isdigit())
+    return [f"{csv_prefix_path}/{month}/{name}" for month in months for name in filenames
+            if os.path.isfile(f"{csv_prefix_path}/{month}/{name}")]
+
+
+def create_deduplicated_sample_summary_file(csv_input_filepath: str, csv_output_filepath: str,
+                                            csv_output_fieldnames: List[str]):
+    """Writes the daily totals of a cumulative quantity type's csv file, e.g., step-count.csv, counting the
+       samples of every device but only once where they overlap; see CumulativeSampleSweep.
+
+       The rows of a csv file sorted by start date are streamed through the sweep; the rows of another csv
+       file are read again and sorted in memory.
+    """
+    sweep: Optional[CumulativeSampleSweep] = None
+
+    with open_text_input(csv_input_filepath) as rf:
+        try:
+            for record in HKRecordFactory.create_many(csv.DictReader(rf)):
+                if sweep is None:
+                    sweep = CumulativeSampleSweep(record.type, record.unit)
+
+                sweep.tally(record)
+        except ValueError:
+            # not sorted by start date, e.g., written without -sort
+            sweep = None
+        else:
+            if sweep is None:
+                return
+
+    if sweep is None:
+        with open_text_input(csv_input_filepath) as rf:
+            records = list(HKRecordFactory.create_many(csv.DictReader(rf)))
+
+        sweep = CumulativeSampleSweep(records[0].type, records[0].unit)
+        sweep.tally_unsorted(records)
+
+    write_sample_summary_file(sweep, csv_output_filepath, csv_output_fieldnames)
+
+
+def _tally_sample_file(quantity_sample_type: str, csv_input_filepath: str) -> Optional[Dict[str, Any]]:
+    with open_text_input(csv_input_filepath) as rf:
+        summary = tally_sample_rows(quantity_sample_type, csv.DictReader(rf))
+
+    return None if summary is None else summary.to_dict()
+
+
+def merge_sample_files(quantity_sample_type: str, csv_input_filepaths: List[str],
+                       max_workers: Optional[int] = None) -> Optional[SampleSummary]:
+    """Tallies the csv input files, e.g., the monthly files of etl_csv_all_datasets_by_month, in a process pool
+       and merges their summaries in the order of the files.
+    """
+    if quantity_sample_type not in quantity_sample_types:
+        raise ValueError(f"{quantity_sample_type} is not a valid type.")
+
+    summary = None
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for state in executor.map(_tally_sample_file, [quantity_sample_type] * len(csv_input_filepaths),
+                                  csv_input_filepaths):
+            if state is not None:
+                partial = quantity_sample_types[quantity_sample_type].from_dict(state)
+                summary = partial if summary is None else summary.merge(partial)
+
+    return summary
+
+
+def create_merged_sample_summary_file(
+        quantity_sample_type: str,
+        csv_input_filepaths: List[str],
+        csv_output_filepath: str,
+        csv_output_fieldnames: List[str],
+        max_workers: Optional[int] = None):
+
+    summary = merge_sample_files(quantity_sample_type, csv_input_filepaths, max_workers)
+
+    if summary is not None:
+        write_sample_summary_file(summary, csv_output_filepath, csv_output_fieldnames)
+
+
+def update_sample_summary_file(
+        quantity_sample_type: str,
+        csv_input_filepath: str,
+        csv_output_filepath: str,
+        csv_output_fieldnames: List[str]):
+    """Tallies only the rows that an incremental ETL run appended to the csv input file since the last update.
+
+       The daily tallies are saved next to the summary file. The summary is created from scratch if there
+       are no saved tallies or if the input file was rewritten, i.e., its generation in the csv folder's
+       ETL watermarks changed.
+    """
+    if quantity_sample_type not in quantity_sample_types:
+        raise ValueError(f"{quantity_sample_type} is not a valid type.")
+
+    if is_compressed_file(csv_input_filepath):
+        raise ValueError(f"{csv_input_filepath}: the summary of a compressed csv file cannot be updated.")
+
+    watermark = AppleHealthDataWatermarks(os.path.dirname(os.path.abspath(csv_input_filepath))) \
+        .get(csv_input_filepath)
+    generation = None if watermark is None else watermark.generation
+    state_filepath = f"{csv_output_filepath}{SUMMARY_STATE_SUFFIX}"
+    input_size = os.path.getsize(csv_input_filepath)
+    state = None
+
+    if generation is not None and os.path.isfile(state_filepath) and os.path.isfile(csv_output_filepath):
+        with open(state_filepath, 'r', encoding='utf-8') as sf:
+            state = json.load(sf)
+
+        if state['generation'] != generation or state['quantity_sample_type'] != quantity_sample_type or \
+                state['input_size'] > input_size:
+            state = None
+
+    summary = None
+
     with open(csv_input_filepath, "r", encoding='utf-8') as rf:
         reader = csv.DictReader(rf)
-        summary = None
-        try:
-            record = HKRecordFactory.create(next(reader))
-            summary = quantity_sample_types[quantity_sample_type](record.type, record.unit)
 
-            if is_device_watch(record.device):
-                summary.tally(record)
+        if state is not None:
+            fieldnames = reader.fieldnames
+            rf.seek(state['input_size'])
+            reader = csv.DictReader(rf, fieldnames=fieldnames)
 
-            for row in reader:
-                record = HKRecordFactory.create(row)
-                if is_device_watch(record.device):
-                    summary.tally(record)
+            if state['summary'] is not None:
+                summary = quantity_sample_types[quantity_sample_type].from_dict(state['summary'])
 
-        except StopIteration:
-            pass
+        summary = tally_sample_rows(quantity_sample_type, reader, summary)
 
     if summary is not None:
-        with open(csv_output_filepath, 'w', encoding='utf-8') as wf:
-            writer = csv.DictWriter(wf, fieldnames=csv_output_fieldnames)
-            writer.writeheader()
+        write_sample_summary_file(summary, csv_output_filepath, csv_output_fieldnames)
 
-            for record in summary.collect():
-                writer.writerow({
-                    hd.csv_date: record.date,
-                    _value_field_map[record.type]: record.value,
-                    hd.csv_unit: record.unit
-                })
-                # writer.writerow(record.to_dict())
+    with open(state_filepath, 'w', encoding='utf-8') as sf:
+        json.dump({
+            'generation': generation,
+            'quantity_sample_type': quantity_sample_type,
+            'input_size': input_size,
+            'summary': None if summary is None else summary.to_dict()
+        }, sf)
 
 
 def create_cumulative_sample_summary_file(workout_csv_filepath: str, workout_summary_filepath: str,
@@ -80,5 +262,21 @@ def create_discrete_sample_summary_file(workout_csv_filepath: str, workout_summa
                                fieldnames)
 
 
+def create_merged_cumulative_sample_summary_file(csv_filepaths: List[str], summary_filepath: str,
+                                                 fieldnames: List[str], max_workers: Optional[int] = None):
+    create_merged_sample_summary_file('CumulativeQuantitySampleSummary', csv_filepaths, summary_filepath, fieldnames,
+                                      max_workers)
+
+
+def create_merged_discrete_sample_summary_file(csv_filepaths: List[str], summary_filepath: str,
+                                               fieldnames: List[str], max_workers: Optional[int] = None):
+    create_merged_sample_summary_file('DiscreteQuantitySampleSummary', csv_filepaths, summary_filepath, fieldnames,
+                                      max_workers)
+
+
+def update_cumulative_sample_summary_file(csv_filepath: str, summary_filepath: str, fieldnames: List[str]):
+    update_sample_summary_file('CumulativeQuantitySampleSummary', csv_filepath, summary_filepath, fieldnames)
 
 
+def update_discrete_sample_summary_file(csv_filepath: str, summary_filepath: str, fieldnames: List[str]):
+    update_sample_summary_file('DiscreteQuantitySampleSummary', csv_filepath, summary_filepath, fieldnames)
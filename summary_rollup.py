@@ -0,0 +1,67 @@
+from typing import Dict, Iterable, Optional, Sequence
+import argparse
+import csv
+import pathlib
+
+from cls_compressed_files import compression_suffix, open_text_input, open_text_output
+from cls_healthkit import HKRecordFactory
+from cls_rollup_cube import GRANULARITIES, QuantityRollupCube, RollupRecord
+from utils import is_device_watch
+
+
+def tally_rollup_rows(rows: Iterable[Dict[str, str]], watch_only_data: bool = False,
+                      cube: Optional[QuantityRollupCube] = None) -> Optional[QuantityRollupCube]:
+    """Tallies the records of rows in cube; the type and unit of a new cube are those of the first record."""
+    for record in HKRecordFactory.create_many(rows):
+        if cube is None:
+            cube = QuantityRollupCube(record.type, record.unit)
+
+        if not watch_only_data or is_device_watch(record.device):
+            cube.tally(record)
+
+    return cube
+
+
+def create_rollup_file(csv_input_filepath: str, csv_output_filepath: str,
+                       granularities: Sequence[str] = GRANULARITIES, watch_only_data: bool = False):
+    """Writes the aggregates of every period of granularities, e.g., every month, of a quantity type's csv file
+       in a single scan of the file.
+    """
+    with open_text_input(csv_input_filepath) as rf:
+        cube = tally_rollup_rows(csv.DictReader(rf), watch_only_data)
+
+    if cube is None:
+        return
+
+    with open_text_output(csv_output_filepath, 'w') as wf:
+        writer = csv.DictWriter(wf, fieldnames=RollupRecord.field_names())
+        writer.writeheader()
+
+        for granularity in granularities:
+            for record in cube.collect(granularity):
+                writer.writerow(record.to_dict())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog=__file__,
+                                     description='Generates the hourly, daily, weekly (ISO), monthly and yearly '
+                                                 'aggregates of a quantity type csv file, e.g., step-count.csv.')
+
+    parser.add_argument('-csv-filepath', type=str, required=True, help='csv file of a quantity type')
+    parser.add_argument('-granularities', type=str, nargs='+', choices=GRANULARITIES, default=list(GRANULARITIES),
+                        help='periods of the aggregates; default is all of them')
+    parser.add_argument('-watch-only-data', action='store_true', default=False,
+                        help='aggregate only watch-generated data')
+    args = parser.parse_args()
+
+    csv_filepath = pathlib.Path(args.csv_filepath)
+
+    if not csv_filepath.exists() or not csv_filepath.is_file():
+        raise SystemExit(f"{args.csv_filepath} is not a regular file or it does not exist.")
+
+    suffix = compression_suffix(csv_filepath.name) or ''
+    stem = csv_filepath.name[:len(csv_filepath.name) - len(suffix)]
+    stem = stem[:-len('.csv')] if stem.endswith('.csv') else stem
+    rollup_filepath = csv_filepath.with_name(f"{stem}-rollup.csv{suffix}")
+    print(f"Generating {rollup_filepath}.")
+    create_rollup_file(str(csv_filepath), str(rollup_filepath), args.granularities, args.watch_only_data)
@@ -1,11 +1,12 @@
-from typing import Callable
+from typing import Callable, Dict, Iterable, Optional
 import csv
 import pathlib
 
+from cls_compressed_files import open_text_input, open_text_output
 from cls_healthkit import HKWorkout
 from constants_apple_health_data import WORKOUT_RUN, WORKOUT_WALK, csv_fieldnames_workout_summary
 from cls_sample_summary import WorkoutSummary, WorkoutSummaryRecord
-from utils import always_true
+from utils import always_true, is_device_watch
 from summary_workout_argparser import parse_cmdline
 
 
@@ -17,37 +18,42 @@ def walk_predicate(workout_type: str):
     return workout_type == WORKOUT_WALK
 
 
-def create_workout_summary_file(workout_csv_filepath: str,
-                                workout_summary_filepath: str,
-                                include_workout: Callable[[str], bool]):
-    with open(workout_csv_filepath, "r", encoding='utf-8') as rf:
-        reader = csv.DictReader(rf)
-        summary = None
-        try:
-            record = HKWorkout.create(next(reader))
-
+def tally_workout_rows(rows: Iterable[Dict[str, str]],
+                       include_workout: Callable[[str], bool],
+                       watch_only_data: bool = False,
+                       summary: Optional[WorkoutSummary] = None) -> Optional[WorkoutSummary]:
+    """Tallies the workouts of rows in summary; the units of a new summary are those of the first workout."""
+    for record in HKWorkout.create_many(rows):
+        if summary is None:
             summary = WorkoutSummary(record.duration_unit,
                                      record.total_distance_unit,
                                      record.total_energy_burned_unit)
 
-            if include_workout(record.workout_activity_type):
-                summary.tally(record)
+        if include_workout(record.workout_activity_type) and \
+                (not watch_only_data or is_device_watch(record.device)):
+            summary.tally(record)
 
-            for row in reader:
-                record = HKWorkout.create(row)
-                if include_workout(record.workout_activity_type):
-                    summary.tally(record)
+    return summary
 
-        except StopIteration:
-            pass
 
-    if summary is not None:
-        with open(workout_summary_filepath, 'w', encoding='utf-8') as wf:
-            writer = csv.DictWriter(wf, fieldnames=csv_fieldnames_workout_summary)
-            writer.writeheader()
+def write_workout_summary_file(summary: WorkoutSummary, workout_summary_filepath: str):
+    with open_text_output(workout_summary_filepath, 'w') as wf:
+        writer = csv.DictWriter(wf, fieldnames=csv_fieldnames_workout_summary)
+        writer.writeheader()
+
+        for record in summary.collect():
+            writer.writerow(record.to_dict())
 
-            for record in summary.collect():
-                writer.writerow(record.to_dict())
+
+def create_workout_summary_file(workout_csv_filepath: str,
+                                workout_summary_filepath: str,
+                                include_workout: Callable[[str], bool],
+                                watch_only_data: bool = False):
+    with open_text_input(workout_csv_filepath) as rf:
+        summary = tally_workout_rows(csv.DictReader(rf), include_workout, watch_only_data)
+
+    if summary is not None:
+        write_workout_summary_file(summary, workout_summary_filepath)
 
 
 if __name__ == '__main__':
@@ -55,4 +61,4 @@ if __name__ == '__main__':
                          description='Generates workout summary (similar to activity summary).')
 
     workout_summary_path = f"{args.csv_workout_directory}/workout-summary.csv"
-    create_workout_summary_file(args.csv_workout_path, workout_summary_path, always_true)
+    create_workout_summary_file(args.csv_workout_path, workout_summary_path, always_true, args.watch_only_data)
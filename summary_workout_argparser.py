@@ -3,7 +3,8 @@ import argparse
 import pathlib
 
 
-ArgsWorkoutSummary = namedtuple("ArgsWorkoutSummary", ("csv_workout_path", "csv_workout_directory"))
+ArgsWorkoutSummary = namedtuple("ArgsWorkoutSummary", ("csv_workout_path", "csv_workout_directory", "watch_only_data"),
+                                defaults=(False,))
 
 
 def parse_cmdline(prog: str, description: str) -> ArgsWorkoutSummary:
@@ -12,10 +13,13 @@ def parse_cmdline(prog: str, description: str) -> ArgsWorkoutSummary:
 
     parser.add_argument('-csv-workout-filepath', type=str, required=True, help='path of workout csv file generated by '
                                                                                'etl_csv_workout.py')
+    parser.add_argument('-watch-only-data', action='store_true', default=False,
+                        help='summarize only watch-generated workouts')
 
     args = parser.parse_args()
     return ArgsWorkoutSummary(args.csv_workout_filepath,
-                              pathlib.Path(args.csv_workout_filepath).parent)
+                              pathlib.Path(args.csv_workout_filepath).parent,
+                              args.watch_only_data)
 
 
 
@@ -8,6 +8,7 @@ if __name__ == '__main__':
                          description='Generates workout summary of runs (similar to activity summary).')
 
     workout_summary_path = f"{args.csv_workout_directory}/workout-summary-run.csv"
-    create_workout_summary_file(args.csv_workout_path, workout_summary_path, run_predicate)
+    create_workout_summary_file(args.csv_workout_path, workout_summary_path, run_predicate,
+                                args.watch_only_data)
 
 
@@ -8,4 +8,5 @@ if __name__ == '__main__':
                          description='Generates workout summary of runs (similar to activity summary).')
 
     workout_summary_path = f"{args.csv_workout_directory}/workout-summary-walk.csv"
-    create_workout_summary_file(args.csv_workout_path, workout_summary_path, walk_predicate)
+    create_workout_summary_file(args.csv_workout_path, workout_summary_path, walk_predicate,
+                                args.watch_only_data)
@@ -0,0 +1,73 @@
+import gzip
+import os
+import tempfile
+import unittest
+import zipfile
+
+from cls_apple_health_xml_streams import AppleHealthDataElementsStream, AppleHealthDataRecordTypeStream
+from utils import element_to_dict, open_health_export_xml
+
+EXPORT_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<HealthData locale="en_US">
+ <ExportDate value="2020-11-01 10:00:00 -0700"/>
+ <Record type="HKQuantityTypeIdentifierBodyMass" sourceName="Scale" unit="lb" startDate="2020-10-01 08:00:00 -0700" endDate="2020-10-01 08:00:00 -0700" value="170"/>
+ <Record type="HKQuantityTypeIdentifierVO2Max" sourceName="Watch" unit="mL/min\xc2\xb7kg" startDate="2020-10-02 08:00:00 -0700" endDate="2020-10-02 08:00:00 -0700" value="41"/>
+ <ActivitySummary dateComponents="2020-10-01" activeEnergyBurned="500.5" activeEnergyBurnedUnit="Cal"/>
+</HealthData>
+"""
+
+EXPORT_CDA_XML = b'<?xml version="1.0" encoding="UTF-8"?>\n<ClinicalDocument/>\n'
+
+
+class CompressedExportTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.xml_filepath = os.path.join(self.tmpdir.name, 'export.xml')
+        self.gz_filepath = os.path.join(self.tmpdir.name, 'export.xml.gz')
+        self.zip_filepath = os.path.join(self.tmpdir.name, 'export.zip')
+
+        with open(self.xml_filepath, 'wb') as f:
+            f.write(EXPORT_XML)
+
+        with gzip.open(self.gz_filepath, 'wb') as f:
+            f.write(EXPORT_XML)
+
+        with zipfile.ZipFile(self.zip_filepath, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('apple_health_export/export.xml', EXPORT_XML)
+            archive.writestr('apple_health_export/export_cda.xml', EXPORT_CDA_XML)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_open_members(self):
+        for filepath in (self.xml_filepath, self.gz_filepath, self.zip_filepath):
+            with open_health_export_xml(filepath) as f:
+                self.assertEqual(f.read(), EXPORT_XML)
+
+        with open_health_export_xml(self.zip_filepath, 'export_cda.xml') as f:
+            self.assertEqual(f.read(), EXPORT_CDA_XML)
+
+    def test_missing_member(self):
+        with self.assertRaises(ValueError):
+            open_health_export_xml(self.zip_filepath, 'missing.xml')
+
+    def test_elements_stream(self):
+        expected = [element_to_dict(elem) for elem in AppleHealthDataElementsStream(self.xml_filepath)]
+        self.assertEqual(len(expected), 4)
+
+        for filepath in (self.gz_filepath, self.zip_filepath):
+            with AppleHealthDataElementsStream(filepath) as elements:
+                self.assertEqual([element_to_dict(elem) for elem in elements], expected)
+
+    def test_record_type_stream(self):
+        record_type = 'HKQuantityTypeIdentifierVO2Max'
+
+        for filepath in (self.gz_filepath, self.zip_filepath):
+            for backend in ('etree', 'expat', 'regex'):
+                records = [element_to_dict(elem) for elem in
+                           AppleHealthDataRecordTypeStream(filepath, record_type, backend)]
+                self.assertEqual([record['value'] for record in records], ['41'], backend)
+
+
+if __name__ == '__main__':
+    unittest.main()
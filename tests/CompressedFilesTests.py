@@ -0,0 +1,48 @@
+import bz2
+import gzip
+import lzma
+import os
+import tempfile
+import unittest
+
+from cls_compressed_files import compression_suffix, open_text_input, open_text_output
+from utils import csvdict_generator, stream_to_csv
+
+LINES = ''.join(f"{i},2020-10-01 08:00:00 -0700,Joe’s Watch\n" for i in range(2000))
+
+
+class CompressedFilesTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_blocks_are_read_as_one_file(self):
+        for suffix, decompress in (('.gz', gzip.decompress), ('.bz2', bz2.decompress), ('.xz', lzma.decompress)):
+            filepath = os.path.join(self.tmpdir.name, f"lines.csv{suffix}")
+
+            with open_text_output(filepath, block_size=1000) as outf:
+                outf.write(LINES)
+
+            # appending adds blocks after the blocks of the file
+            with open_text_output(filepath, 'a', block_size=1000) as outf:
+                outf.write(LINES)
+
+            with open(filepath, 'rb') as inf:
+                self.assertEqual(decompress(inf.read()), (LINES * 2).encode('utf-8'), suffix)
+
+            with open_text_input(filepath) as inf:
+                self.assertEqual(inf.read(), LINES * 2, suffix)
+
+    def test_csv_helpers(self):
+        rows = [{'value': str(i), 'unit': 'count/min'} for i in range(100)]
+        filepath = os.path.join(self.tmpdir.name, 'heart-rate.csv.GZ')
+        stream_to_csv(filepath, ['value', 'unit'], iter(rows))
+
+        self.assertEqual(compression_suffix(filepath), '.gz')
+        self.assertEqual(list(csvdict_generator(filepath)), rows)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import csv
+import io
+import unittest
+
+from cls_csv_batch_writer import CsvBatchWriter
+
+import constants_apple_health_data as hd
+
+ROWS = [
+    {hd.FIELD_TYPE: 'HKQuantityTypeIdentifierBodyMass', hd.FIELD_UNIT: 'lb', hd.FIELD_VALUE: '170.5',
+     hd.FIELD_SOURCE_NAME: 'Joe’s iPhone', hd.FIELD_CREATION_DATE: '2020-01-01 10:00:00 -0800',
+     hd.FIELD_START_DATE: '2020-01-01 10:00:00 -0800', hd.FIELD_END_DATE: '2020-01-01 10:00:00 -0800'},
+    {hd.FIELD_TYPE: 'HKQuantityTypeIdentifierBodyMass', hd.FIELD_UNIT: 'lb', hd.FIELD_VALUE: 171,
+     hd.FIELD_SOURCE_NAME: 'Scale "A"', hd.FIELD_SOURCE_VERSION: '1',
+     hd.FIELD_DEVICE: '<<HKDevice: 0x0>, name:Scale, manufacturer:Acme, Inc.>',
+     hd.FIELD_CREATION_DATE: '2020-01-02 10:00:00 -0800', hd.FIELD_START_DATE: '2020-01-02 10:00:00 -0800',
+     hd.FIELD_END_DATE: '2020-01-02 10:00:00 -0800'}
+]
+
+MALFORMED = {hd.FIELD_TYPE: 'HKQuantityTypeIdentifierBodyMass', 'note': 'x'}
+
+
+class CsvBatchWriterTestCase(unittest.TestCase):
+    def test_same_csv_as_dictwriter(self):
+        expected = io.StringIO()
+        wrtr = csv.DictWriter(expected, fieldnames=hd.Fieldnames_Record)
+        wrtr.writeheader()
+        wrtr.writerows(ROWS * 3)
+
+        for batch_rows in (1, 2, 1000):
+            outf = io.StringIO()
+            wrtr = CsvBatchWriter(outf, hd.Fieldnames_Record, batch_rows)
+            wrtr.writeheader()
+            wrtr.writerows(ROWS * 3)
+            wrtr.flush()
+            self.assertEqual(outf.getvalue(), expected.getvalue())
+
+    def test_malformed_rows(self):
+        malformed = []
+        outf = io.StringIO()
+        wrtr = CsvBatchWriter(outf, hd.Fieldnames_Record, on_malformed=lambda row, e: malformed.append((row, str(e))))
+        wrtr.writerows([ROWS[0], MALFORMED, ROWS[1]])
+        wrtr.flush()
+
+        self.assertEqual(malformed, [(MALFORMED, "dict contains fields not in fieldnames: 'note'")])
+        self.assertEqual(len(outf.getvalue().splitlines()), 2)
+
+        with self.assertRaises(ValueError):
+            CsvBatchWriter(io.StringIO(), hd.Fieldnames_Record).writerow(MALFORMED)
+
+
+if __name__ == '__main__':
+    unittest.main()
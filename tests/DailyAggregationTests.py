@@ -0,0 +1,134 @@
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from cls_apple_health_etl_npy import AppleHealthRecordColumns
+from cls_daily_aggregation import DailyQuantityAggregation, aggregate_record_columns, local_day_numbers
+from cls_healthkit import HKRecordQuantityTypeIdentifier
+from cls_sample_summary import CumulativeQuantitySampleSummary, DiscreteQuantitySampleSummary
+from etl_csv_all_datasets import generate_datasets
+from utils import epoch_to_local_apple_health_datetime_str, is_device_watch
+import constants_apple_health_data as hd
+import utils
+
+HEAD = """<?xml version="1.0" encoding="UTF-8"?>
+<HealthData locale="en_US">
+ <ExportDate value="2020-11-02 10:00:00 -0800"/>
+"""
+
+HEART_RATE = """ <Record type="HKQuantityTypeIdentifierHeartRate" sourceName="Watch" unit="count/min" device="{2}" creationDate="{0}" startDate="{0}" endDate="{0}" value="{1}"/>
+"""
+
+WATCH = "&lt;&lt;HKDevice: 0x1&gt;, name:Apple Watch, manufacturer:Apple Inc., model:Watch&gt;"
+
+IPHONE = "&lt;&lt;HKDevice: 0x2&gt;, name:iPhone, manufacturer:Apple Inc., model:iPhone&gt;"
+
+TAIL = "</HealthData>\n"
+
+
+def _record(start_date: str, value: float) -> HKRecordQuantityTypeIdentifier:
+    return HKRecordQuantityTypeIdentifier(hd.HK_REC_TYPE_HeartRate, 'count/min', value, 'Watch', '', '',
+                                          start_date, start_date, start_date)
+
+
+class DailyAggregationTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        # the days of the records' epochs are the days of the local time zone
+        self._tz = os.environ.get('TZ')
+        os.environ['TZ'] = 'America/Los_Angeles'
+        time.tzset()
+        utils._local_day.cache_clear()
+
+        rng = random.Random(19)
+        days = [f"2020-10-{day:02}" for day in range(1, 32)]
+        self.records = [_record(f"{rng.choice(days)} {rng.randrange(24):02}:00:00 -0700", rng.uniform(40, 180) / 3)
+                        for _ in range(5000)]
+
+    def tearDown(self) -> None:
+        if self._tz is None:
+            os.environ.pop('TZ', None)
+        else:
+            os.environ['TZ'] = self._tz
+
+        time.tzset()
+        utils._local_day.cache_clear()
+
+    def test_collect_equals_sample_summaries(self):
+        cumulative = CumulativeQuantitySampleSummary(hd.HK_REC_TYPE_HeartRate, 'count/min')
+        discrete = DiscreteQuantitySampleSummary(hd.HK_REC_TYPE_HeartRate, 'count/min')
+
+        for record in self.records:
+            cumulative.tally(record)
+            discrete.tally(record)
+
+        aggregation = DailyQuantityAggregation(hd.HK_REC_TYPE_HeartRate, 'count/min')
+        aggregation.tally_records(self.records, batch_rows=777)
+
+        self.assertEqual(aggregation.collect('sum'), cumulative.collect())
+        self.assertEqual(aggregation.collect('mean'), discrete.collect())
+
+        daily = {}
+
+        for record in self.records:
+            daily.setdefault(record.start_date[:10], []).append(record.value)
+
+        self.assertEqual(aggregation.days, list(daily))
+        self.assertEqual(aggregation.statistic('count').tolist(), [len(values) for values in daily.values()])
+        self.assertEqual(aggregation.statistic('min').tolist(), [min(values) for values in daily.values()])
+        self.assertEqual(aggregation.statistic('max').tolist(), [max(values) for values in daily.values()])
+        np.testing.assert_allclose(aggregation.statistic('std'), [np.std(values) for values in daily.values()])
+
+    def test_selected_statistics(self):
+        aggregation = DailyQuantityAggregation(hd.HK_REC_TYPE_HeartRate, 'count/min', ('sum', 'count'))
+        aggregation.tally_records(self.records)
+
+        with self.assertRaises(ValueError):
+            aggregation.statistic('max')
+
+        with self.assertRaises(ValueError):
+            DailyQuantityAggregation(hd.HK_REC_TYPE_HeartRate, 'count/min', ('median',))
+
+    def test_local_day_numbers(self):
+        # half an hour apart around the end and start of daylight saving time in 2020 in the US
+        epochs = np.concatenate([np.arange(1583650800 - 86400 * 2, 1583650800 + 86400 * 2, 1800),
+                                 np.arange(1604217600 - 86400 * 2, 1604217600 + 86400 * 2, 1800)])
+        days = [epoch_to_local_apple_health_datetime_str(epoch)[:10] for epoch in epochs.tolist()]
+        aggregation = DailyQuantityAggregation(hd.HK_REC_TYPE_HeartRate, 'count/min', ('count',))
+        aggregation.tally_day_numbers(local_day_numbers(epochs), np.ones(len(epochs)))
+
+        self.assertEqual(aggregation.days, list(dict.fromkeys(days)))
+        self.assertEqual(aggregation.statistic('count').tolist(), [days.count(day) for day in aggregation.days])
+
+    def test_aggregate_record_columns(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            xml_filepath = os.path.join(tmpdir, 'export.xml')
+            epochs = range(1604217600 - 86400, 1604217600 + 86400, 900)
+
+            with open(xml_filepath, 'w', encoding='utf-8') as f:
+                f.write(HEAD + ''.join(HEART_RATE.format(epoch_to_local_apple_health_datetime_str(epoch), i % 97 + 0.5,
+                                                         IPHONE if i % 5 == 0 else WATCH)
+                                       for i, epoch in enumerate(epochs)) + TAIL)
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                generate_datasets(xml_filepath, tmpdir, None, None, True, False, npy=True)
+
+            columns = AppleHealthRecordColumns(os.path.join(tmpdir, 'heart-rate'))
+            summary = DiscreteQuantitySampleSummary(hd.HK_REC_TYPE_HeartRate, 'count/min')
+
+            for record in columns.records():
+                if is_device_watch(record.device):
+                    summary.tally(record)
+
+            aggregation = aggregate_record_columns(columns, ('mean',), batch_rows=50)
+            self.assertEqual(aggregation.collect('mean'), summary.collect())
+            self.assertEqual(aggregation.days, ['2020-10-31', '2020-11-01'])
+
+
+if __name__ == '__main__':
+    unittest.main()
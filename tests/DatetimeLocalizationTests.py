@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta, timezone
+import os
+import time
+import unittest
+
+from cls_healthkit import HK_APPLE_DATETIME_FORMAT
+import utils
+
+
+def strptime_localize(dt: str) -> str:
+    return datetime.strptime(dt, HK_APPLE_DATETIME_FORMAT).astimezone().strftime(HK_APPLE_DATETIME_FORMAT)
+
+
+class DatetimeLocalizationTestCase(unittest.TestCase):
+    timezones = ['America/Los_Angeles', 'UTC', 'Australia/Lord_Howe', 'Asia/Kathmandu']
+
+    # around the 2020 transitions of America/Los_Angeles and Australia/Lord_Howe
+    epochs = [1583661600 + seconds for seconds in range(-7200, 7201, 599)] + \
+             [1604221200 + seconds for seconds in range(-7200, 7201, 599)] + \
+             [1585407600 + seconds for seconds in range(-7200, 7201, 599)] + \
+             [0, 1000000000, 1600000000, -86400 * 365 * 50]
+
+    utc_offsets = [timezone(timedelta(minutes=minutes)) for minutes in (-480, -420, 0, 345, 630, 660)]
+
+    def setUp(self) -> None:
+        self._tz = os.environ.get('TZ')
+
+    def tearDown(self) -> None:
+        if self._tz is None:
+            os.environ.pop('TZ', None)
+        else:
+            os.environ['TZ'] = self._tz
+
+        time.tzset()
+        utils._local_day.cache_clear()
+
+    def set_timezone(self, name: str):
+        os.environ['TZ'] = name
+        time.tzset()
+        utils._local_day.cache_clear()
+
+    def test_localize_same_as_strptime(self):
+        for name in self.timezones:
+            self.set_timezone(name)
+
+            for epoch in self.epochs:
+                for utc_offset in self.utc_offsets:
+                    dt = datetime.fromtimestamp(epoch, utc_offset).strftime(HK_APPLE_DATETIME_FORMAT)
+                    self.assertEqual(utils.localize_apple_health_datetime_str(dt), strptime_localize(dt),
+                                     f"{name} {dt}")
+                    self.assertEqual(utils.apple_health_datetime_to_epoch(dt), epoch, f"{name} {dt}")
+
+    def test_epoch_to_local_str(self):
+        self.set_timezone('America/Los_Angeles')
+
+        for epoch in self.epochs:
+            self.assertEqual(utils.epoch_to_local_apple_health_datetime_str(epoch),
+                             datetime.fromtimestamp(epoch).astimezone().strftime(HK_APPLE_DATETIME_FORMAT))
+
+    def test_negative_zero_offset(self):
+        for name in ('UTC', 'Europe/London'):
+            self.set_timezone(name)
+
+            for dt in ('2020-10-01 08:00:00 -0000', '2020-01-01 08:00:00 -0000', '2020-01-01 08:00:00 +0000'):
+                self.assertEqual(utils.localize_apple_health_datetime_str(dt), strptime_localize(dt), f"{name} {dt}")
+
+        self.set_timezone('UTC')
+        self.assertEqual(utils.localize_apple_health_datetime_str('2020-10-01 08:00:00 -0000'),
+                         '2020-10-01 08:00:00 +0000')
+
+    def test_other_layouts(self):
+        for dt in ('2020-01-01 10:00:00 -08:00', '2020-1-01 10:00:00 -0800'):
+            self.assertEqual(utils.localize_apple_health_datetime_str(dt), strptime_localize(dt))
+
+        for dt in ('2020-02-30 10:00:00 -0800', '2020-01-01 24:00:00 -0800', '2020-01-01T10:00:00 -0800', ''):
+            with self.assertRaises(ValueError):
+                utils.localize_apple_health_datetime_str(dt)
+
+    def test_localize_dates_health_data(self):
+        row = {
+            'creationDate': '2020-10-01 08:00:05 -0700',
+            'startDate': '2020-10-01 08:00:00 -0700',
+            'endDate': '2020-10-01 08:00:00 -0700'
+        }
+        localized = utils.localize_dates_health_data(row.copy())
+        self.assertEqual(localized, {key: strptime_localize(value) for key, value in row.items()})
+
+        epochs = utils.localize_dates_health_data(row.copy(), as_epoch=True)
+        self.assertEqual(epochs, {'creationDate': 1601564405, 'startDate': 1601564400, 'endDate': 1601564400})
+
+    def test_between_dates_predicate(self):
+        self.set_timezone('America/Los_Angeles')
+        start_date, end_date = datetime(2020, 11, 1, 1, 30), datetime(2020, 11, 1, 1, 45, 0, 500000)
+        local_start, local_end = start_date.astimezone(), end_date.astimezone()
+        predicate = utils.between_dates_predicate(start_date, end_date)
+
+        for epoch in range(1604219400 - 3600, 1604226600 + 3600, 450):
+            for utc_offset in self.utc_offsets:
+                dt = datetime.fromtimestamp(epoch, utc_offset)
+                expected = local_start <= dt <= local_end
+                self.assertEqual(predicate(dt.strftime(HK_APPLE_DATETIME_FORMAT)), expected, dt)
+                self.assertEqual(predicate(epoch), expected, dt)
+                self.assertEqual(predicate(dt), expected, dt)
+
+        with self.assertRaises(TypeError):
+            predicate(1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
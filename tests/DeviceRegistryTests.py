@@ -0,0 +1,52 @@
+import unittest
+
+from cls_apple_health_devices import (AppleHealthDeviceRegistry, IPHONE_DEVICE, THIRD_PARTY_DEVICE,
+                                      WATCH_DEVICE)
+
+WATCH = '<<HKDevice: 0x283e1a%03x>, name:Apple Watch, manufacturer:Apple Inc., model:Watch, hardware:Watch5,4, ' \
+        'software:7.0.1>>'
+IPHONE = '<<HKDevice: 0x283e1b%03x>, name:iPhone, manufacturer:Apple Inc., model:iPhone, hardware:iPhone12,1, ' \
+         'software:14.0.1>>'
+SCALE = '<<HKDevice: 0x283e1c%03x>, name:Smart Scale, manufacturer:Withings, model:WBS06>>'
+
+
+class DeviceRegistryTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.registry = AppleHealthDeviceRegistry(maxsize=2)
+
+    def test_classify(self):
+        self.assertEqual(self.registry.classify(WATCH % 1), WATCH_DEVICE)
+        self.assertEqual(self.registry.classify(IPHONE % 1), IPHONE_DEVICE)
+        self.assertEqual(self.registry.classify(SCALE % 1), THIRD_PARTY_DEVICE)
+        self.assertTrue(self.registry.is_watch(SCALE % 2))
+        self.assertFalse(self.registry.is_watch(IPHONE % 2))
+        self.assertTrue(self.registry.is_iphone(IPHONE % 3))
+
+    def test_device_addresses_share_classification(self):
+        for address in range(100):
+            self.registry.classify(WATCH % address)
+
+        info = self.registry.cache_info()
+        self.assertEqual((info.hits, info.misses), (99, 1))
+        self.assertEqual(list(self.registry.devices().values()), [WATCH_DEVICE])
+
+    def test_bounded_cache(self):
+        for device in (WATCH, IPHONE, SCALE, WATCH):
+            self.registry.classify(device % 0)
+
+        info = self.registry.cache_info()
+        self.assertEqual((info.misses, info.currsize), (4, 2))
+        self.assertEqual(len(self.registry.devices()), 3)
+
+    def test_device_key(self):
+        self.assertEqual(AppleHealthDeviceRegistry.device_key(WATCH % 10), WATCH.replace('0x283e1a%03x', ''))
+        self.assertEqual(AppleHealthDeviceRegistry.device_key(''), '')
+
+        # the name is not mistaken for an address
+        device = '<<HKDevice: 0x12, name:iPhone, model:iPhone>>'
+        self.assertEqual(AppleHealthDeviceRegistry.device_key(device), device)
+        self.assertEqual(self.registry.classify(device), IPHONE_DEVICE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import random
+import unittest
+
+import cls_external_merge_sort
+from cls_external_merge_sort import ExternalMergeSort, external_sorted
+
+
+def start_date(row):
+    return row['startDate']
+
+
+class ExternalMergeSortTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.chunk_rows = cls_external_merge_sort._CHUNK_ROWS
+        cls_external_merge_sort._CHUNK_ROWS = 10
+        random.seed(0)
+
+    def tearDown(self) -> None:
+        cls_external_merge_sort._CHUNK_ROWS = self.chunk_rows
+
+    @staticmethod
+    def rows(keys):
+        return [{'startDate': key, 'value': str(i)} for i, key in enumerate(keys)]
+
+    def test_sorted_like_sorted(self):
+        rows = self.rows(random.randint(0, 20) for _ in range(500))
+
+        for memory_budget in (1, 2000, 1 << 30):
+            for max_merge_runs in (2, 64):
+                rows_sort = ExternalMergeSort(start_date, memory_budget, max_merge_runs)
+                rows_sort.extend(rows)
+                self.assertFalse(rows_sort.in_order)
+                self.assertEqual(list(rows_sort), sorted(rows, key=start_date))
+                self.assertEqual(len(rows_sort), 0)
+
+    def test_sorted_input_streams_through_one_run(self):
+        rows = self.rows(i // 3 for i in range(95))
+        rows_sort = ExternalMergeSort(start_date, memory_budget=1)
+        rows_sort.extend(rows)
+        self.assertTrue(rows_sort.in_order)
+        self.assertEqual(rows_sort.run_count, 1)
+        self.assertEqual(list(rows_sort), rows)
+
+    def test_sorted_input_within_budget_stays_in_memory(self):
+        rows = self.rows(i // 3 for i in range(95))
+        rows_sort = ExternalMergeSort(start_date, memory_budget=1 << 30)
+        rows_sort.extend(rows)
+        self.assertTrue(rows_sort.in_order)
+        self.assertEqual(rows_sort.run_count, 0)
+        self.assertEqual(list(rows_sort), rows)
+
+    def test_sorted_input_spills_beyond_budget(self):
+        rows = self.rows(i // 3 for i in range(95))
+        memory_budget = sum(map(cls_external_merge_sort._row_size, rows[:40]))
+
+        rows_sort = ExternalMergeSort(start_date, memory_budget)
+        rows_sort.extend(rows)
+        self.assertEqual(rows_sort.run_count, 1)
+        self.assertEqual(len(rows_sort._ordered_rows), 15)
+        self.assertEqual(list(rows_sort), rows)
+
+        rows_sort.extend(rows + self.rows([0]))
+        self.assertFalse(rows_sort.in_order)
+        self.assertEqual(list(rows_sort), sorted(rows + self.rows([0]), key=start_date))
+
+    def test_rows_out_of_order_after_first_run(self):
+        rows = self.rows(list(range(25)) + [3, 40, 1])
+        self.assertEqual(list(external_sorted(rows, start_date, memory_budget=1)), sorted(rows, key=start_date))
+
+
+if __name__ == '__main__':
+    unittest.main()
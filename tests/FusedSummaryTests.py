@@ -0,0 +1,99 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from etl_csv_all_datasets import generate_datasets
+from summary_discrete_quantity_sample import generate_discrete_sample_files
+from summary_cumulative_quantity_sample import generate_cumulative_sample_files
+from summary_workout_all import create_workout_summary_file, run_predicate, walk_predicate
+
+HEAD = """<?xml version="1.0" encoding="UTF-8"?>
+<HealthData locale="en_US">
+ <ExportDate value="2020-11-01 10:00:00 -0700"/>
+"""
+
+WATCH = "&lt;&lt;HKDevice: 0x1&gt;, name:Apple Watch, manufacturer:Apple Inc., model:Watch&gt;"
+
+STEPS = """ <Record type="HKQuantityTypeIdentifierStepCount" sourceName="Watch" unit="count" device="{2}" creationDate="{0} 09:00:00 -0700" startDate="{0} 08:00:00 -0700" endDate="{0} 08:30:00 -0700" value="{1}"/>
+"""
+
+BODY_MASS = """ <Record type="HKQuantityTypeIdentifierBodyMass" sourceName="Watch" unit="lb" device="{2}" creationDate="{0} 09:00:00 -0700" startDate="{0} 07:00:00 -0700" endDate="{0} 07:00:00 -0700" value="{1}"/>
+"""
+
+WORKOUT = """ <Workout workoutActivityType="{1}" duration="30.5" durationUnit="min" totalDistance="3.1" totalDistanceUnit="mi" totalEnergyBurned="300" totalEnergyBurnedUnit="Cal" sourceName="Watch" device="{2}" creationDate="{0} 09:00:00 -0700" startDate="{0} 08:00:00 -0700" endDate="{0} 08:30:00 -0700">
+  <MetadataEntry key="HKIndoorWorkout" value="0"/>
+ </Workout>
+"""
+
+TAIL = "</HealthData>\n"
+
+
+class FusedSummaryTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.xml_filepath = os.path.join(self.tmpdir.name, 'export.xml')
+        days = ['2020-10-02', '2020-10-01', '2020-10-02', '2020-10-03', '2020-10-01']
+
+        with open(self.xml_filepath, 'w', encoding='utf-8') as f:
+            f.write(HEAD +
+                    ''.join(STEPS.format(day, 100 + i, WATCH if i % 4 else 'iPhone') for i, day in enumerate(days)) +
+                    ''.join(BODY_MASS.format(day, 170 + i / 10, WATCH) for i, day in enumerate(days)) +
+                    ''.join(WORKOUT.format(day, 'HKWorkoutActivityTypeRunning' if i % 2 else
+                                           'HKWorkoutActivityTypeWalking', WATCH) for i, day in enumerate(days)) +
+                    TAIL)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def folder_files(self, folder: str):
+        files = {}
+
+        for filename in os.listdir(folder):
+            with open(os.path.join(folder, filename), 'r', encoding='utf-8') as f:
+                files[filename] = f.read()
+
+        return files
+
+    def two_hop_files(self, sort_data: bool):
+        folder = os.path.join(self.tmpdir.name, f"two-hop-{sort_data}")
+        os.makedirs(folder)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_datasets(self.xml_filepath, folder, None, None, sort_data, False)
+            generate_cumulative_sample_files(folder)
+            generate_discrete_sample_files(folder)
+
+        workout_filepath = os.path.join(folder, 'workout.csv')
+        create_workout_summary_file(workout_filepath, os.path.join(folder, 'workout-summary.csv'), lambda _: True)
+        create_workout_summary_file(workout_filepath, os.path.join(folder, 'workout-summary-run.csv'), run_predicate)
+        create_workout_summary_file(workout_filepath, os.path.join(folder, 'workout-summary-walk.csv'), walk_predicate)
+        return self.folder_files(folder)
+
+    def test_summaries_of_single_pass(self):
+        for sort_data in (False, True):
+            expected = self.two_hop_files(sort_data)
+            fused = os.path.join(self.tmpdir.name, f"fused-{sort_data}")
+            summaries_only = os.path.join(self.tmpdir.name, f"summaries-only-{sort_data}")
+            os.makedirs(fused)
+            os.makedirs(summaries_only)
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                generate_datasets(self.xml_filepath, fused, None, None, sort_data, False, summaries=True)
+                generate_datasets(self.xml_filepath, summaries_only, None, None, sort_data, False,
+                                  summaries=True, write_csv=False)
+
+            self.assertEqual(self.folder_files(fused), expected)
+
+            summary_files = self.folder_files(summaries_only)
+            self.assertEqual(sorted(summary_files), ['bodymass-summary.csv', 'step-count-summary.csv',
+                                                     'workout-summary-run.csv', 'workout-summary-walk.csv',
+                                                     'workout-summary.csv'])
+
+            for filename, content in summary_files.items():
+                self.assertEqual(content, expected[filename], filename)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+
+from cls_healthkit import HKRecord, HKRecordFactory, HKRecordQuantityTypeIdentifier, HKWorkout
+
+RECORD = {
+    'type': 'HKQuantityTypeIdentifierHeartRate',
+    'sourceName': 'Apple Watch',
+    'sourceVersion': '7.0.1',
+    'unit': 'count/min',
+    'device': '<<HKDevice: 0x283e1a080>, name:Apple Watch, manufacturer:Apple Inc., model:Watch>>',
+    'creationDate': '2020-10-01 07:05:12 -0700',
+    'startDate': '2020-10-01 07:01:00 -0700',
+    'endDate': '2020-10-01 07:01:00 -0700',
+    'value': '72'
+}
+
+SLEEP = {
+    'type': 'HKCategoryTypeIdentifierSleepAnalysis',
+    'sourceName': 'iPhone',
+    'startDate': '2020-10-01 00:01:00 -0700',
+    'endDate': '2020-10-01 06:31:00 -0700',
+    'value': 'HKCategoryValueSleepAnalysisInBed'
+}
+
+WORKOUT = {
+    'workoutActivityType': 'HKWorkoutActivityTypeRunning',
+    'duration': '30.5',
+    'durationUnit': 'min',
+    'totalDistance': '3.1',
+    'totalDistanceUnit': 'mi',
+    'totalEnergyBurned': '310',
+    'totalEnergyBurnedUnit': 'Cal',
+    'sourceName': 'Apple Watch',
+    'sourceVersion': '7.0.1',
+    'device': '',
+    'creationDate': '2020-10-01 08:05:12 -0700',
+    'startDate': '2020-10-01 07:31:00 -0700',
+    'endDate': '2020-10-01 08:01:30 -0700'
+}
+
+
+class HealthKitRecordsTestCase(unittest.TestCase):
+    def test_record_properties(self):
+        record = HKRecordFactory.create(RECORD)
+        self.assertIsInstance(record, HKRecordQuantityTypeIdentifier)
+        self.assertEqual(record.value, 72.0)
+        self.assertEqual(record.unit, 'count/min')
+        self.assertEqual(record.start_date, RECORD['startDate'])
+
+        with self.assertRaises(AttributeError):
+            record.value = 73.0
+
+    def test_create_many(self):
+        rows = [RECORD, SLEEP, RECORD]
+        records = list(HKRecordFactory.create_many(rows))
+        self.assertEqual(records, [HKRecordFactory.create(row) for row in rows])
+        self.assertEqual([type(record) for record in records],
+                         [HKRecordQuantityTypeIdentifier, HKRecord, HKRecordQuantityTypeIdentifier])
+        self.assertEqual(records[1].creation_date, '')
+
+        with self.assertRaises(ValueError):
+            list(HKRecordFactory.create_many([dict(RECORD, type='HKQuantityTypeIdentifierUnknown')]))
+
+    def test_workout_create_many(self):
+        workout, = HKWorkout.create_many([WORKOUT])
+        self.assertEqual(workout, HKWorkout.create(WORKOUT))
+        self.assertEqual((workout.duration, workout.total_distance, workout.total_energy_burned), (30.5, 3.1, 310.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from cls_apple_health_etl_csv import AppleHealthDataETLCsv
+from constants_apple_health_data import csv_fieldnames_step_count_summary
+from etl_csv_all_datasets import generate_datasets
+from summary_quantity_sample import create_cumulative_sample_summary_file, update_cumulative_sample_summary_file
+
+HEAD = """<?xml version="1.0" encoding="UTF-8"?>
+<HealthData locale="en_US">
+ <ExportDate value="2020-11-01 10:00:00 -0700"/>
+"""
+
+STEPS = """ <Record type="HKQuantityTypeIdentifierStepCount" sourceName="Watch" unit="count" creationDate="{0} {2}:00:00 -0700" startDate="{0} 08:00:00 -0700" endDate="{0} 08:30:00 -0700" value="{1}"/>
+"""
+
+ACTIVITY_SUMMARY = """ <ActivitySummary dateComponents="{0}" activeEnergyBurned="{1}" activeEnergyBurnedGoal="500" activeEnergyBurnedUnit="Cal"/>
+"""
+
+TAIL = "</HealthData>\n"
+
+
+def export_xml(steps, activity_summaries) -> str:
+    return HEAD + ''.join(STEPS.format(*step) for step in steps) + \
+        ''.join(ACTIVITY_SUMMARY.format(*summary) for summary in activity_summaries) + TAIL
+
+
+class IncrementalEtlTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        steps = [('2020-10-01', 100, 9), ('2020-10-01', 200, 10), ('2020-10-02', 300, 9)]
+        new_steps = [('2020-10-02', 400, 12), ('2020-10-03', 500, 9)]
+        self.old_xml = self.write('old.xml', export_xml(steps, [('2020-10-01', 400.5), ('2020-10-02', 10)]))
+        self.new_xml = self.write('new.xml', export_xml(steps + new_steps,
+                                                        [('2020-10-01', 400.5), ('2020-10-02', 520),
+                                                         ('2020-10-03', 30)]))
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def write(self, filename: str, content: str) -> str:
+        filepath = os.path.join(self.tmpdir.name, filename)
+
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+        return filepath
+
+    def generate(self, xml_filepath: str, folder: str, incremental: bool) -> str:
+        csv_folder = os.path.join(self.tmpdir.name, folder)
+        os.makedirs(csv_folder, exist_ok=True)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_datasets(xml_filepath, csv_folder, None, None, False, False, incremental=incremental)
+
+        return csv_folder
+
+    @staticmethod
+    def read(filepath: str) -> str:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def test_incremental_run_equals_full_run(self):
+        incremental_folder = self.generate(self.old_xml, 'incremental', True)
+        self.generate(self.new_xml, 'incremental', True)
+        full_folder = self.generate(self.new_xml, 'full', False)
+
+        for filename in ('step-count.csv', 'activity-summary.csv'):
+            self.assertEqual(self.read(os.path.join(incremental_folder, filename)),
+                             self.read(os.path.join(full_folder, filename)), filename)
+
+        self.assertEqual(self.read(os.path.join(incremental_folder, 'step-count.csv')).count('\n'), 6)
+
+    def test_summary_update_equals_summary(self):
+        incremental_folder = self.generate(self.old_xml, 'incremental', True)
+        update_cumulative_sample_summary_file(os.path.join(incremental_folder, 'step-count.csv'),
+                                              os.path.join(incremental_folder, 'summary.csv'),
+                                              csv_fieldnames_step_count_summary)
+        self.generate(self.new_xml, 'incremental', True)
+        update_cumulative_sample_summary_file(os.path.join(incremental_folder, 'step-count.csv'),
+                                              os.path.join(incremental_folder, 'summary.csv'),
+                                              csv_fieldnames_step_count_summary)
+
+        full_folder = self.generate(self.new_xml, 'full', False)
+        create_cumulative_sample_summary_file(os.path.join(full_folder, 'step-count.csv'),
+                                              os.path.join(full_folder, 'summary.csv'),
+                                              csv_fieldnames_step_count_summary)
+
+        self.assertEqual(self.read(os.path.join(incremental_folder, 'summary.csv')),
+                         self.read(os.path.join(full_folder, 'summary.csv')))
+
+    def test_changed_settings_rewrite_dataset(self):
+        incremental_folder = self.generate(self.new_xml, 'incremental', True)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_datasets(self.new_xml, incremental_folder, '2020-10-02', None, False, False, incremental=True)
+
+        self.assertEqual(self.read(os.path.join(incremental_folder, 'step-count.csv')).count('\n'), 4)
+
+    def test_watermark_key_once_per_row(self):
+        incremental_folder = self.generate(self.old_xml, 'incremental', True)
+
+        with mock.patch.object(AppleHealthDataETLCsv, 'watermark_key', autospec=True,
+                               side_effect=AppleHealthDataETLCsv.watermark_key) as watermark_key:
+            self.generate(self.new_xml, 'incremental', True)
+
+        # the previous watermark of step-count.csv and each of its 5 rows
+        self.assertEqual(watermark_key.call_count, 6)
+        self.assertEqual(self.read(os.path.join(incremental_folder, 'step-count.csv')).count('\n'), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import datetime
+import random
+import unittest
+
+from intervals import (ClosedInterval, ElementIntervalPair, HalfClosedIntervalLeft, HalfClosedIntervalRight,
+                       IntervalIndex, OpenInterval, map_elements_to_intervals, month_firstdate_intervals)
+
+
+class IntervalIndexTestCase(unittest.TestCase):
+    def test_open_and_closed_ends(self):
+        intervals = [HalfClosedIntervalRight(10, 20), OpenInterval(20, 30), ClosedInterval(30, 40),
+                     OpenInterval(40, 50), HalfClosedIntervalLeft(50, 60), HalfClosedIntervalRight(0, 10)]
+        index = IntervalIndex(intervals)
+        elements = list(range(-5, 66)) + [10.5, 29.99]
+        random.Random(24).shuffle(elements)
+
+        for element in elements:
+            expected = [interval for interval in intervals if element in interval]
+            self.assertEqual(index.find(element), expected[0] if expected else None, element)
+
+        self.assertEqual(index.find_many(elements), [index.find(element) for element in elements])
+
+        self.assertEqual(index.find(20), HalfClosedIntervalRight(10, 20))
+        self.assertEqual(index.find(30), ClosedInterval(30, 40))
+        self.assertEqual(index.find(40), ClosedInterval(30, 40))
+        self.assertEqual(index.find_many(iter([0, 10, 50, 60])), [None, HalfClosedIntervalRight(0, 10),
+                                                            HalfClosedIntervalLeft(50, 60), None])
+
+    def test_overlapping_intervals(self):
+        with self.assertRaises(ValueError):
+            IntervalIndex([ClosedInterval(0, 10), ClosedInterval(10, 20)])
+
+        with self.assertRaises(ValueError):
+            IntervalIndex([HalfClosedIntervalLeft(0, 10), HalfClosedIntervalLeft(5, 20)])
+
+        self.assertEqual(len(IntervalIndex([ClosedInterval(0, 10), HalfClosedIntervalRight(10, 20)])), 2)
+
+    def test_map_elements_in_any_order(self):
+        dates = [datetime.date(2020, 1, 1) + datetime.timedelta(days=day) for day in range(0, 200, 3)]
+        intervals = month_firstdate_intervals(iter(dates), lambda d: (d.year, d.month))
+        index = IntervalIndex(reversed(intervals))
+        sorted_pairs = list(map_elements_to_intervals(iter(dates), intervals))
+
+        shuffled = list(dates)
+        random.Random(24).shuffle(shuffled)
+        pairs = list(index.map_elements(shuffled))
+
+        self.assertEqual(sorted(pairs), sorted_pairs)
+        self.assertEqual([pair.element for pair in pairs],
+                         [d for d in shuffled if intervals[0].lower_end <= d < intervals[-1].upper_end])
+        self.assertIsInstance(pairs[0], ElementIntervalPair)
+
+
+if __name__ == '__main__':
+    unittest.main()
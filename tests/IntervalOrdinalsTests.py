@@ -0,0 +1,64 @@
+import datetime
+import random
+import unittest
+
+import numpy as np
+
+from intervals import (ClosedInterval, HalfClosedIntervalLeft, HalfClosedIntervalRight, IntervalIndex, OpenInterval,
+                       interval_ordinals, month_firstdate_intervals)
+
+
+def _expected_ordinals(index: IntervalIndex, elements) -> list:
+    ordinals = {id(interval): ordinal for ordinal, interval in enumerate(index.intervals)}
+    return [ordinals[id(interval)] if interval is not None else -1 for interval in index.find_many(elements)]
+
+
+class IntervalOrdinalsTestCase(unittest.TestCase):
+    def test_open_and_closed_ends(self):
+        intervals = [HalfClosedIntervalRight(10, 20), OpenInterval(20, 30), ClosedInterval(30, 40),
+                     OpenInterval(40, 50), HalfClosedIntervalLeft(50, 60), HalfClosedIntervalRight(0, 10)]
+        index = IntervalIndex(intervals)
+        elements = list(range(-5, 66)) + [10.5, 29.99]
+        random.Random(25).shuffle(elements)
+
+        self.assertEqual(index.ordinals(elements).tolist(), _expected_ordinals(index, elements))
+        self.assertEqual(index.ordinals(np.array([0, 10, 20, 30, 40, 50, 60])).tolist(), [-1, 0, 1, 3, 3, 5, -1])
+        self.assertEqual(IntervalIndex([]).ordinals([1, 2]).tolist(), [-1, -1])
+        self.assertEqual(index.ordinals([]).tolist(), [])
+
+    def test_dates(self):
+        dates = [datetime.date(2020, 1, 1) + datetime.timedelta(days=day) for day in range(0, 400, 3)]
+        intervals = month_firstdate_intervals(iter(dates), lambda d: (d.year, d.month))
+        elements = [datetime.date(2019, 12, 1) + datetime.timedelta(days=day) for day in range(450)]
+
+        ordinals = interval_ordinals(elements, intervals)
+        self.assertEqual(ordinals.tolist(), _expected_ordinals(IntervalIndex(intervals), elements))
+
+        # yyyy-mm-dd strings, like the dates of the csv files
+        str_intervals = [HalfClosedIntervalLeft(interval.lower_end.isoformat(), interval.upper_end.isoformat())
+                         for interval in intervals]
+        self.assertEqual(interval_ordinals([d.isoformat() for d in elements], str_intervals).tolist(),
+                         ordinals.tolist())
+
+        self.assertEqual(interval_ordinals(np.array(elements, dtype='datetime64[D]'), intervals).tolist(),
+                         ordinals.tolist())
+
+    def test_epochs(self):
+        first = int(datetime.datetime(2016, 1, 1).timestamp())
+        intervals = [HalfClosedIntervalLeft(first + month * 30 * 86400, first + (month + 1) * 30 * 86400)
+                     for month in range(60)]
+        # every minute of 5 years and a day past the intervals
+        epochs = np.arange(first - 3600, first + (5 * 365 + 1) * 86400, 60)
+
+        ordinals = interval_ordinals(epochs, intervals)
+        self.assertEqual(ordinals[0], -1)
+        self.assertEqual(ordinals[60], 0)
+        self.assertEqual(ordinals[-1], -1)
+        self.assertTrue(np.array_equal(ordinals[ordinals >= 0], (epochs[ordinals >= 0] - first) // (30 * 86400)))
+
+        sample = epochs[::997].tolist()
+        self.assertEqual(ordinals[::997].tolist(), _expected_ordinals(IntervalIndex(intervals), sample))
+
+
+if __name__ == '__main__':
+    unittest.main()
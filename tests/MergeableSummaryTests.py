@@ -0,0 +1,132 @@
+import contextlib
+import io
+import os
+import random
+import tempfile
+import unittest
+
+from cls_healthkit import HKRecordQuantityTypeIdentifier, HKWorkout
+from cls_sample_summary import CumulativeQuantitySampleSummary, DiscreteQuantitySampleSummary, WorkoutSummary
+from etl_csv_all_datasets import generate_datasets, generate_datasets_by_month
+from summary_cumulative_quantity_sample import generate_cumulative_sample_files
+from summary_discrete_quantity_sample import generate_discrete_sample_files
+import constants_apple_health_data as hd
+
+HEAD = """<?xml version="1.0" encoding="UTF-8"?>
+<HealthData locale="en_US">
+ <ExportDate value="2020-12-01 10:00:00 -0800"/>
+"""
+
+WATCH = "&lt;&lt;HKDevice: 0x1&gt;, name:Apple Watch, manufacturer:Apple Inc., model:Watch&gt;"
+
+STEPS = """ <Record type="HKQuantityTypeIdentifierStepCount" sourceName="Watch" unit="count" device="{2}" creationDate="{0} 09:00:00 -0700" startDate="{0} 08:00:00 -0700" endDate="{0} 08:30:00 -0700" value="{1}"/>
+"""
+
+BODY_MASS = """ <Record type="HKQuantityTypeIdentifierBodyMass" sourceName="Watch" unit="lb" device="{2}" creationDate="{0} 09:00:00 -0700" startDate="{0} 07:00:00 -0700" endDate="{0} 07:00:00 -0700" value="{1}"/>
+"""
+
+TAIL = "</HealthData>\n"
+
+
+def _record(start_date: str, value: float) -> HKRecordQuantityTypeIdentifier:
+    return HKRecordQuantityTypeIdentifier(hd.HK_REC_TYPE_StepCount, 'count', value, 'Watch', '', '',
+                                          start_date, start_date, start_date)
+
+
+class MergeableSummaryTestCase(unittest.TestCase):
+    def test_merge_equals_single_scan(self):
+        rng = random.Random(20)
+        records = [_record(f"2020-10-{day:02} 08:00:00 -0700", rng.uniform(0, 100))
+                   for day in range(1, 29) for _ in range(rng.randrange(1, 5))]
+
+        for summary_class in (CumulativeQuantitySampleSummary, DiscreteQuantitySampleSummary):
+            expected = summary_class(hd.HK_REC_TYPE_StepCount, 'count')
+
+            for record in records:
+                expected.tally(record)
+
+            # shards of whole days, as the months of a partitioned csv folder
+            shards = [summary_class(hd.HK_REC_TYPE_StepCount, 'count') for _ in range(4)]
+
+            for record in records:
+                shards[(int(record.start_date[8:10]) - 1) // 7].tally(record)
+
+            merged = summary_class.from_dict(shards[0].to_dict())
+
+            for shard in shards[1:]:
+                merged.merge(summary_class.from_dict(shard.to_dict()))
+
+            self.assertEqual(merged.collect(), expected.collect(), summary_class.__name__)
+
+    def test_merge_of_split_days(self):
+        summary = DiscreteQuantitySampleSummary(hd.HK_REC_TYPE_StepCount, 'count')
+        other = DiscreteQuantitySampleSummary(hd.HK_REC_TYPE_StepCount, 'count')
+        summary.tally(_record('2020-10-02 08:00:00 -0700', 10))
+        other.tally(_record('2020-10-01 08:00:00 -0700', 4))
+        other.tally(_record('2020-10-02 09:00:00 -0700', 20))
+
+        self.assertIs(summary.merge(other), summary)
+        self.assertEqual([(record.date, record.value) for record in summary.collect()],
+                         [('2020-10-02', 15), ('2020-10-01', 4)])
+
+        with self.assertRaises(ValueError):
+            summary.merge(DiscreteQuantitySampleSummary(hd.HK_REC_TYPE_StepCount, 'km'))
+
+        with self.assertRaises(ValueError):
+            summary.merge(CumulativeQuantitySampleSummary(hd.HK_REC_TYPE_StepCount, 'count'))
+
+    def test_workout_summary_merge(self):
+        rows = [{hd.FIELD_WORKOUT_ACTIVITY: hd.WORKOUT_RUN, hd.FIELD_DURATION: '30',
+                 hd.FIELD_DURATION_UNIT: 'min', hd.FIELD_TOTAL_DISTANCE: '3', hd.FIELD_TOTAL_DISTANCE_UNIT: 'mi',
+                 hd.FIELD_TOTAL_ENERGY_BURNED: '300', hd.FIELD_TOTAL_ENERGY_BURNED_UNIT: 'Cal',
+                 hd.FIELD_SOURCE_NAME: 'Watch', hd.FIELD_SOURCE_VERSION: '', hd.FIELD_DEVICE: '',
+                 hd.FIELD_CREATION_DATE: date, hd.FIELD_START_DATE: date, hd.FIELD_END_DATE: date}
+                for date in ('2020-10-01 08:00:00 -0700', '2020-10-02 08:00:00 -0700', '2020-10-02 18:00:00 -0700')]
+        workouts = list(HKWorkout.create_many(rows))
+        expected = WorkoutSummary('min', 'mi', 'Cal')
+        first = WorkoutSummary('min', 'mi', 'Cal')
+        second = WorkoutSummary('min', 'mi', 'Cal')
+
+        for i, workout in enumerate(workouts):
+            expected.tally(workout)
+            (first if i < 2 else second).tally(workout)
+
+        merged = WorkoutSummary.from_dict(first.to_dict()).merge(WorkoutSummary.from_dict(second.to_dict()))
+        self.assertEqual(merged.collect(), expected.collect())
+        # merging does not change the tallies of other
+        self.assertEqual(second.collect()[0].duration, 30)
+
+    def test_partitioned_summary_files(self):
+        days = [f"2020-{month:02}-{day:02}" for month in (9, 10, 11) for day in (3, 1, 3, 28)]
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            xml_filepath = os.path.join(tmpdir, 'export.xml')
+
+            with open(xml_filepath, 'w', encoding='utf-8') as f:
+                f.write(HEAD +
+                        ''.join(STEPS.format(day, 100 + i, WATCH if i % 4 else 'iPhone') for i, day in enumerate(days)) +
+                        ''.join(BODY_MASS.format(day, 170 + i / 10, WATCH) for i, day in enumerate(days)) +
+                        TAIL)
+
+            csv_folder = os.path.join(tmpdir, 'csv')
+            partitioned_folder = os.path.join(tmpdir, 'partitioned')
+            os.makedirs(csv_folder)
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                generate_datasets(xml_filepath, csv_folder, None, None, True, False)
+                generate_cumulative_sample_files(csv_folder)
+                generate_discrete_sample_files(csv_folder)
+                generate_datasets_by_month(xml_filepath, partitioned_folder, None, None, True, False)
+                generate_cumulative_sample_files(partitioned_folder, partitioned=True, max_workers=2)
+                generate_discrete_sample_files(partitioned_folder, partitioned=True, max_workers=2)
+
+            for filename in ('step-count-summary.csv', 'bodymass-summary.csv'):
+                with open(os.path.join(csv_folder, filename), 'r', encoding='utf-8') as f:
+                    expected = f.read()
+
+                with open(os.path.join(partitioned_folder, filename), 'r', encoding='utf-8') as f:
+                    self.assertEqual(f.read(), expected, filename)
+
+
+if __name__ == '__main__':
+    unittest.main()
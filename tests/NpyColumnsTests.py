@@ -0,0 +1,78 @@
+import contextlib
+import csv
+import io
+import os
+import tempfile
+import unittest
+
+from cls_apple_health_devices import device_registry
+from cls_apple_health_etl_npy import AppleHealthRecordColumns, AppleHealthRecordETLNpy
+from cls_healthkit import HKRecordFactory
+from etl_csv_all_datasets import generate_datasets
+import constants_apple_health_data as hd
+
+HEAD = """<?xml version="1.0" encoding="UTF-8"?>
+<HealthData locale="en_US">
+ <ExportDate value="2020-11-01 10:00:00 -0700"/>
+"""
+
+HEART_RATE = """ <Record type="HKQuantityTypeIdentifierHeartRate" sourceName="{2}" sourceVersion="7.0.1" device="&lt;&lt;HKDevice: 0x283e1a{3:03x}&gt;, name:Apple Watch, manufacturer:Apple Inc., model:Watch&gt;&gt;" unit="count/min" creationDate="{0} 09:00:00 -0400" startDate="{0} 08:0{1}:00 -0400" endDate="{0} 08:0{1}:00 -0400" value="{4}"/>
+"""
+
+TAIL = "</HealthData>\n"
+
+
+class NpyColumnsTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.xml_filepath = os.path.join(self.tmpdir.name, 'export.xml')
+        samples = [('2020-10-02', 5, 'Watch', 1, 71), ('2020-10-01', 1, 'Watch', 2, 64.5),
+                   ('2020-10-01', 3, 'Phone', 3, 80)]
+
+        with open(self.xml_filepath, 'w', encoding='utf-8') as f:
+            f.write(HEAD + ''.join(HEART_RATE.format(*sample) for sample in samples) + TAIL)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def generate(self, folder: str, npy: bool) -> str:
+        csv_folder = os.path.join(self.tmpdir.name, folder)
+        os.makedirs(csv_folder)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_datasets(self.xml_filepath, csv_folder, None, None, True, False, npy=npy)
+
+        return csv_folder
+
+    def test_columns_equal_csv(self):
+        columns = AppleHealthRecordColumns(os.path.join(self.generate('npy', True), 'heart-rate'))
+        csv_folder = self.generate('csv', False)
+
+        with open(os.path.join(csv_folder, 'heart-rate.csv'), 'r', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+
+        for row in rows:
+            row[hd.FIELD_DEVICE] = device_registry.device_key(row[hd.FIELD_DEVICE])
+
+        self.assertEqual(columns.record_type, hd.HK_REC_TYPE_HeartRate)
+        self.assertEqual(len(columns), 3)
+        self.assertEqual(list(columns.records()), list(HKRecordFactory.create_many(rows)))
+        self.assertEqual(columns[hd.FIELD_VALUE].tolist(), [64.5, 80.0, 71.0])
+        self.assertEqual(columns[hd.FIELD_START_DATE][0], 1601553660)
+        self.assertEqual(columns.dictionary(hd.FIELD_SOURCE_NAME), ['Watch', 'Phone'])
+        self.assertEqual(columns.decode(hd.FIELD_SOURCE_NAME).tolist(), ['Watch', 'Phone', 'Watch'])
+        self.assertEqual(len(columns.dictionary(hd.FIELD_DEVICE)), 1)
+        self.assertEqual(columns.code(hd.FIELD_SOURCE_NAME, 'Phone'), 1)
+        self.assertIsNone(columns.code(hd.FIELD_SOURCE_NAME, 'Scale'))
+
+    def test_empty_columns(self):
+        npy_folder = os.path.join(self.tmpdir.name, 'step-count')
+        AppleHealthRecordETLNpy(hd.HK_REC_TYPE_StepCount, self.xml_filepath, npy_folder, None, None).serialize()
+        columns = AppleHealthRecordColumns(npy_folder)
+        self.assertEqual(len(columns), 0)
+        self.assertEqual(columns[hd.FIELD_END_DATE].shape, (0,))
+        self.assertEqual(list(columns.records()), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import csv
+import os
+import random
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from cls_healthkit import HKRecordQuantityTypeIdentifier
+from cls_overlap_sweep import CumulativeSampleSweep
+from cls_sample_summary import CumulativeQuantitySampleSummary
+from summary_quantity_sample import create_deduplicated_sample_summary_file
+from utils import apple_health_datetime_to_epoch, epoch_to_local_apple_health_datetime_str
+import constants_apple_health_data as hd
+import utils
+
+WATCH = '<<HKDevice: 0x1>, name:Apple Watch, manufacturer:Apple Inc., model:Watch>'
+
+IPHONE = '<<HKDevice: 0x2>, name:iPhone, manufacturer:Apple Inc., model:iPhone>'
+
+
+def _record(start_date: str, end_date: str, value: float, device: str) -> HKRecordQuantityTypeIdentifier:
+    return HKRecordQuantityTypeIdentifier(hd.HK_REC_TYPE_StepCount, 'count', value, 'Watch', '', device,
+                                          start_date, start_date, end_date)
+
+
+class OverlapSweepTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tz = os.environ.get('TZ')
+        os.environ['TZ'] = 'America/Los_Angeles'
+        time.tzset()
+        utils._local_day.cache_clear()
+
+    def tearDown(self) -> None:
+        if self._tz is None:
+            os.environ.pop('TZ', None)
+        else:
+            os.environ['TZ'] = self._tz
+
+        time.tzset()
+        utils._local_day.cache_clear()
+
+    def test_watch_samples_replace_overlapping_iphone_samples(self):
+        sweep = CumulativeSampleSweep(hd.HK_REC_TYPE_StepCount, 'count')
+        sweep.tally_unsorted([
+            _record('2020-10-01 08:30:00 -0700', '2020-10-01 08:45:00 -0700', 300, WATCH),
+            # only its 45 minutes that the watch did not record count
+            _record('2020-10-01 08:00:00 -0700', '2020-10-01 09:00:00 -0700', 600, IPHONE),
+            # prorated between the days
+            _record('2020-10-01 23:30:00 -0700', '2020-10-02 00:30:00 -0700', 100, WATCH),
+            # during a watch sample, so it does not count
+            _record('2020-10-02 00:00:00 -0700', '2020-10-02 00:00:00 -0700', 7, IPHONE),
+            _record('2020-10-02 00:10:00 -0700', '2020-10-02 00:10:00 -0700', 9, WATCH),
+            _record('2020-10-02 00:20:00 -0700', '2020-10-02 01:00:00 -0700', 40, WATCH)
+        ])
+
+        # the second watch sample counts once the first one ends
+        self.assertEqual(sweep.totals(), {'2020-10-01': 800, '2020-10-02': 50 + 9 + 30})
+
+        with self.assertRaises(ValueError):
+            sweep.tally(_record('2020-10-01 08:00:00 -0700', '2020-10-01 09:00:00 -0700', 1, WATCH))
+
+        # the sweep goes on after the totals
+        sweep.tally(_record('2020-10-02 00:40:00 -0700', '2020-10-02 00:50:00 -0700', 5, IPHONE))
+        sweep.tally(_record('2020-10-03 07:00:00 -0700', '2020-10-03 07:10:00 -0700', 5, IPHONE))
+        self.assertEqual(sweep.totals(), {'2020-10-01': 800, '2020-10-02': 89, '2020-10-03': 5})
+
+    def test_daylight_saving_time_days(self):
+        sweep = CumulativeSampleSweep(hd.HK_REC_TYPE_StepCount, 'count', lambda device: 0)
+        # the night of 2020-11-01 is 25 hours long in the US
+        start = apple_health_datetime_to_epoch('2020-10-31 23:00:00 -0700')
+        end = apple_health_datetime_to_epoch('2020-11-02 01:00:00 -0800')
+        sweep.tally_sample(start, end, 2700, 0, -7 * 3600, -8 * 3600)
+
+        self.assertEqual(sweep.totals(), {'2020-10-31': 100, '2020-11-01': 2500, '2020-11-02': 100})
+
+    def test_disjoint_samples_equal_cumulative_summary(self):
+        rng = random.Random(23)
+        epoch = apple_health_datetime_to_epoch('2020-10-01 00:00:00 -0700')
+        records = []
+
+        for _ in range(3000):
+            start = epoch + rng.randrange(1, 600)
+            epoch = start + rng.randrange(0, 600)
+            start_date = epoch_to_local_apple_health_datetime_str(start)
+            end_date = epoch_to_local_apple_health_datetime_str(epoch)
+
+            # the sweep prorates the samples across midnight, while the summary counts them on their start date
+            if end_date[:10] != start_date[:10]:
+                end_date = start_date
+
+            records.append(_record(start_date, end_date, rng.randrange(1, 100), rng.choice([WATCH, IPHONE])))
+
+        summary = CumulativeQuantitySampleSummary(hd.HK_REC_TYPE_StepCount, 'count')
+        sweep = CumulativeSampleSweep(hd.HK_REC_TYPE_StepCount, 'count')
+
+        for record in records:
+            summary.tally(record)
+            sweep.tally(record)
+
+        self.assertEqual(sweep.collect(), summary.collect())
+
+    @staticmethod
+    def write_step_count_csv(csv_filepath: str, samples):
+        with open(csv_filepath, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=hd.Fieldnames_Record)
+            writer.writeheader()
+
+            for start_date, end_date, value, device in samples:
+                writer.writerow({hd.FIELD_TYPE: hd.HK_REC_TYPE_StepCount, hd.FIELD_UNIT: 'count',
+                                 hd.FIELD_VALUE: value, hd.FIELD_SOURCE_NAME: 'Watch',
+                                 hd.FIELD_SOURCE_VERSION: '', hd.FIELD_DEVICE: device,
+                                 hd.FIELD_CREATION_DATE: start_date, hd.FIELD_START_DATE: start_date,
+                                 hd.FIELD_END_DATE: end_date})
+
+    def test_deduplicated_summary_file(self):
+        samples = [('2020-10-01 08:30:00 -0700', '2020-10-01 08:45:00 -0700', 300, WATCH),
+                   ('2020-10-01 08:00:00 -0700', '2020-10-01 09:00:00 -0700', 600, IPHONE)]
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            csv_filepath = os.path.join(tmpdir, 'step-count.csv')
+            summary_filepath = os.path.join(tmpdir, 'step-count-summary.csv')
+
+            # unsorted rows are sorted in memory; sorted rows are streamed
+            for rows, unsorted_calls in ((samples, 1), (samples[::-1], 0)):
+                self.write_step_count_csv(csv_filepath, rows)
+
+                with mock.patch.object(CumulativeSampleSweep, 'tally_unsorted', autospec=True,
+                                       side_effect=CumulativeSampleSweep.tally_unsorted) as tally_unsorted:
+                    create_deduplicated_sample_summary_file(csv_filepath, summary_filepath,
+                                                            hd.csv_fieldnames_step_count_summary)
+
+                self.assertEqual(tally_unsorted.call_count, unsorted_calls)
+
+                with open(summary_filepath, 'r', encoding='utf-8') as f:
+                    self.assertEqual(list(csv.DictReader(f)), [{'date': '2020-10-01', 'step_count': '750.0',
+                                                                'unit': 'count'}])
+
+            self.write_step_count_csv(csv_filepath, [])
+            os.remove(summary_filepath)
+            create_deduplicated_sample_summary_file(csv_filepath, summary_filepath,
+                                                    hd.csv_fieldnames_step_count_summary)
+            self.assertFalse(os.path.exists(summary_filepath))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from cls_apple_health_etl_csv import AppleHealthHeartRateETLCsv, AppleHealthWorkoutETLCsv
+from cls_apple_health_etl_fanout import AppleHealthDataETLFanOut
+from cls_apple_health_xml_parallel import AppleHealthDataParallelElementsStream, xml_chunk_boundaries
+from cls_apple_health_xml_streams import AppleHealthDataElementsStream
+from utils import element_to_dict
+
+RECORD = ' <Record type="HKQuantityTypeIdentifierHeartRate" sourceName="Watch" unit="count/min" ' \
+         'creationDate="2020-10-01 08:{0:02}:00 -0700" startDate="2020-10-01 08:{0:02}:00 -0700" ' \
+         'endDate="2020-10-01 08:{0:02}:00 -0700" value="{1}"/>\n'
+
+WORKOUT = ' <Workout workoutActivityType="HKWorkoutActivityTypeRunning" sourceName="Watch" ' \
+          'creationDate="2020-10-01 07:30:00 -0700" startDate="2020-10-01 07:00:00 -0700" ' \
+          'endDate="2020-10-01 07:30:00 -0700">\n' \
+          '  <MetadataEntry key="HKIndoorWorkout" value="0"/>\n' \
+          ' </Workout>\n'
+
+CORRELATION = ' <Correlation type="HKCorrelationTypeIdentifierBloodPressure" sourceName="x" ' \
+              'startDate="2020-10-01 07:00:00 -0700" endDate="2020-10-01 07:00:00 -0700">\n' \
+              '  <Record type="HKQuantityTypeIdentifierBloodPressureSystolic" sourceName="x" unit="mmHg" ' \
+              'startDate="2020-10-01 07:00:00 -0700" endDate="2020-10-01 07:00:00 -0700" value="120"/>\n' \
+              ' </Correlation>\n'
+
+
+class ParallelElementsStreamTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.xml_filepath = os.path.join(self.tmpdir.name, 'export.xml')
+
+        with open(self.xml_filepath, 'w', encoding='utf-8') as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                    '<!DOCTYPE HealthData [\n<!ELEMENT HealthData (ExportDate,Me,(Record|Workout)*)>\n]>\n'
+                    '<HealthData locale="en_US">\n <ExportDate value="2020-11-01 10:00:00 -0700"/>\n')
+
+            for i in range(60):
+                f.write(RECORD.format(i, 60 + i))
+
+            f.write(CORRELATION)
+            f.write(WORKOUT * 5)
+            f.write('</HealthData>\n')
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_chunk_boundaries(self):
+        boundaries = xml_chunk_boundaries(self.xml_filepath, 512)
+        self.assertGreater(len(boundaries), 1)
+
+        with open(self.xml_filepath, 'rb') as f:
+            for start, end in boundaries[1:]:
+                f.seek(start)
+                self.assertIn(f.read(3), (b' <R', b' <W', b' <C'))
+
+    def test_same_elements(self):
+        expected = [(elem.tag, element_to_dict(elem), len(elem))
+                    for elem in AppleHealthDataElementsStream(self.xml_filepath)]
+
+        with AppleHealthDataParallelElementsStream(self.xml_filepath, max_workers=2, chunk_size=512) as stream:
+            elements = [(elem.tag, element_to_dict(elem), len(elem)) for elem in stream]
+
+        self.assertEqual(elements, expected)
+
+    def test_converter(self):
+        expected = list(map(element_to_dict, AppleHealthDataElementsStream(self.xml_filepath)))
+        rows = list(AppleHealthDataParallelElementsStream(self.xml_filepath, converter=element_to_dict,
+                                                          max_workers=2, chunk_size=1024))
+        self.assertEqual(rows, expected)
+
+    def test_fanout_workers(self):
+        contents = {}
+
+        for max_workers in (None, 2):
+            folder = os.path.join(self.tmpdir.name, str(max_workers))
+            os.mkdir(folder)
+            fanout = AppleHealthDataETLFanOut(self.xml_filepath, max_workers)
+            fanout.register_etl(AppleHealthHeartRateETLCsv(self.xml_filepath, os.path.join(folder, 'heart-rate.csv'),
+                                                           None, None))
+            fanout.register_etl(AppleHealthWorkoutETLCsv(self.xml_filepath, os.path.join(folder, 'workout.csv'),
+                                                         None, None), sort_data=True)
+            fanout.run()
+
+            for filename in ('heart-rate.csv', 'workout.csv'):
+                with open(os.path.join(folder, filename), 'r', encoding='utf-8') as f:
+                    contents.setdefault(filename, []).append(f.read())
+
+        self.assertEqual(contents['heart-rate.csv'][1], contents['heart-rate.csv'][0])
+        self.assertEqual(contents['heart-rate.csv'][0].count('\n'), 61)
+        self.assertEqual(contents['workout.csv'][1], contents['workout.csv'][0])
+
+    def test_fanout_sink_open_failure(self):
+        workouts = sum(elem.tag == 'Workout' for elem in AppleHealthDataElementsStream(self.xml_filepath))
+
+        for max_workers in (None, 2):
+            folder = os.path.join(self.tmpdir.name, f"failure-{max_workers}")
+            os.mkdir(folder)
+            heart_rate_filepath = os.path.join(folder, 'missing', 'heart-rate.csv')
+            fanout = AppleHealthDataETLFanOut(self.xml_filepath, max_workers)
+            fanout.register_etl(AppleHealthHeartRateETLCsv(self.xml_filepath, heart_rate_filepath, None, None))
+            fanout.register_etl(AppleHealthWorkoutETLCsv(self.xml_filepath, os.path.join(folder, 'workout.csv'),
+                                                         None, None))
+            output = io.StringIO()
+
+            with contextlib.redirect_stdout(output):
+                fanout.run()
+
+            self.assertIn(heart_rate_filepath, output.getvalue())
+            self.assertFalse(os.path.exists(heart_rate_filepath))
+
+            with open(os.path.join(folder, 'workout.csv'), 'r', encoding='utf-8') as f:
+                self.assertEqual(f.read().count('\n'), workouts + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import contextlib
+import datetime
+import io
+import os
+import tempfile
+import unittest
+
+from cls_apple_health_etl_fanout import CsvFilePool
+from etl_csv_all_datasets import generate_datasets, generate_datasets_by_month
+
+HEAD = """<?xml version="1.0" encoding="UTF-8"?>
+<HealthData locale="en_US">
+ <ExportDate value="2020-11-01 10:00:00 -0700"/>
+"""
+
+STEPS = """ <Record type="HKQuantityTypeIdentifierStepCount" sourceName="Watch" unit="count" creationDate="{0} 09:00:00 -0700" startDate="{0} 08:00:00 -0700" endDate="{0} 08:30:00 -0700" value="{1}"/>
+"""
+
+ACTIVITY_SUMMARY = """ <ActivitySummary dateComponents="{0}" activeEnergyBurned="{1}" activeEnergyBurnedGoal="500" activeEnergyBurnedUnit="Cal"/>
+"""
+
+TAIL = "</HealthData>\n"
+
+
+class PartitionedEtlTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.xml_filepath = os.path.join(self.tmpdir.name, 'export.xml')
+        # the months of the steps are interleaved to make the pool reopen the csv files
+        steps = [('2020-09-30', 100), ('2020-10-01', 200), ('2020-09-15', 300), ('2020-11-02', 400),
+                 ('2020-10-20', 500)]
+        summaries = [('2020-09-30', 10), ('2020-10-01', 20)]
+
+        with open(self.xml_filepath, 'w', encoding='utf-8') as f:
+            f.write(HEAD + ''.join(STEPS.format(*step) for step in steps) +
+                    ''.join(ACTIVITY_SUMMARY.format(*summary) for summary in summaries) + TAIL)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    @staticmethod
+    def read(filepath: str) -> str:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def test_partitions_equal_monthly_datasets(self):
+        prefix = os.path.join(self.tmpdir.name, 'partitioned')
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_datasets_by_month(self.xml_filepath, prefix, None, None, False, False, max_open_files=1)
+
+        self.assertEqual(sorted(os.listdir(prefix)), ['202009', '202010', '202011'])
+        self.assertEqual(sorted(os.listdir(os.path.join(prefix, '202011'))), ['step-count.csv'])
+
+        for month, last_day in (('09', 30), ('10', 31)):
+            csv_folder = os.path.join(self.tmpdir.name, f"2020{month}")
+            os.makedirs(csv_folder)
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                generate_datasets(self.xml_filepath, csv_folder, datetime.datetime(2020, int(month), 1),
+                                  datetime.datetime(2020, int(month), last_day, 23, 59, 59), False, False)
+
+            for filename in ('step-count.csv', 'activity-summary.csv'):
+                self.assertEqual(self.read(os.path.join(prefix, f"2020{month}", filename)),
+                                 self.read(os.path.join(csv_folder, filename)), filename)
+
+    def test_pool_reopens_evicted_files(self):
+        pool = CsvFilePool(max_open=1)
+        filepaths = [os.path.join(self.tmpdir.name, 'pool', name) for name in ('a.csv', 'b.csv')]
+
+        for value in range(3):
+            for filepath in filepaths:
+                pool.writer(filepath, ['value']).writerow({'value': value})
+
+        pool.close()
+
+        for filepath in filepaths:
+            self.assertEqual(self.read(filepath).split(), ['value', '0', '1', '2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
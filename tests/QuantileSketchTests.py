@@ -0,0 +1,131 @@
+import bisect
+import csv
+import math
+import os
+import random
+import tempfile
+import unittest
+
+from cls_healthkit import HKRecordQuantityTypeIdentifier
+from cls_quantile_sketch import KllSketch
+from cls_sample_summary import QuantileQuantitySampleSummary
+from summary_quantity_sample import create_quantile_summary_file
+import constants_apple_health_data as hd
+
+FRACTIONS = [fraction / 100 for fraction in range(1, 100)]
+
+# the rank error bound of KllSketch's docstring for the default k
+RANK_ERROR = 0.02
+
+
+def _record(start_date: str, value: float) -> HKRecordQuantityTypeIdentifier:
+    return HKRecordQuantityTypeIdentifier(hd.HK_REC_TYPE_HeartRate, 'count/min', value, 'Watch', '', '',
+                                          start_date, start_date, start_date)
+
+
+class QuantileSketchTestCase(unittest.TestCase):
+    def assertRankError(self, sketch: KllSketch, values: list):
+        values = sorted(values)
+
+        for fraction, quantile in zip(FRACTIONS, sketch.quantiles(FRACTIONS)):
+            rank = bisect.bisect_right(values, quantile) / len(values)
+            self.assertLessEqual(abs(rank - fraction), RANK_ERROR, fraction)
+
+    def test_small_sketch_is_exact(self):
+        rng = random.Random(21)
+        values = [rng.uniform(40, 180) for _ in range(150)]
+        sketch = KllSketch(seed=1)
+        sketch.update_many(values)
+        ordered = sorted(values)
+
+        self.assertEqual(sketch.quantiles(FRACTIONS),
+                         [ordered[math.ceil(fraction * len(values)) - 1] for fraction in FRACTIONS])
+        self.assertEqual(sketch.quantiles([0, 1]), [min(values), max(values)])
+        self.assertEqual(sketch.rank(ordered[74]), 0.5)
+
+    def test_error_and_memory_are_bounded(self):
+        rng = random.Random(21)
+
+        for values in ([rng.gauss(70, 12) for _ in range(100000)],
+                       sorted(rng.expovariate(0.2) for _ in range(100000))):
+            sketch = KllSketch(seed=2)
+            sketch.update_many(values)
+
+            self.assertEqual(len(sketch), len(values))
+            self.assertLessEqual(sketch.retained, 3 * sketch.k)
+            self.assertEqual((sketch.min, sketch.max), (min(values), max(values)))
+            self.assertRankError(sketch, values)
+
+    def test_merged_shards(self):
+        rng = random.Random(21)
+        values = [rng.gauss(70, 12) for _ in range(60000)]
+        shards = [KllSketch(seed=i) for i in range(6)]
+
+        for i, value in enumerate(values):
+            shards[i % 6].update(value)
+
+        merged = KllSketch(seed=6)
+
+        for shard in shards:
+            merged.merge(KllSketch.from_dict(shard.to_dict()))
+
+        self.assertEqual(len(merged), len(values))
+        self.assertLessEqual(merged.retained, 3 * merged.k)
+        self.assertRankError(merged, values)
+
+        with self.assertRaises(ValueError):
+            merged.merge(KllSketch(100))
+
+    def test_daily_quantile_summary(self):
+        rng = random.Random(21)
+        records = [_record(f"2020-10-{day:02} 08:00:00 -0700", rng.gauss(60 + day, 10))
+                   for _ in range(2000) for day in (2, 1)]
+        summary = QuantileQuantitySampleSummary(hd.HK_REC_TYPE_HeartRate, 'count/min')
+        first = QuantileQuantitySampleSummary(hd.HK_REC_TYPE_HeartRate, 'count/min')
+        second = QuantileQuantitySampleSummary(hd.HK_REC_TYPE_HeartRate, 'count/min')
+
+        for i, record in enumerate(records):
+            summary.tally(record)
+            (first if i < 1000 else second).tally(record)
+
+        merged = QuantileQuantitySampleSummary.from_dict(first.to_dict()).merge(second)
+
+        for collected in (summary.collect(), merged.collect()):
+            self.assertEqual([record.date for record in collected], ['2020-10-02', '2020-10-01'])
+
+            for record in collected:
+                values = sorted(r.value for r in records if r.start_date.startswith(record.date))
+                self.assertEqual((record.count, record.max), (len(values), values[-1]))
+                self.assertEqual(list(record.quantiles), [0.05, 0.5, 0.95])
+
+                for fraction, quantile in record.quantiles.items():
+                    self.assertLessEqual(abs(bisect.bisect_right(values, quantile) / len(values) - fraction),
+                                         RANK_ERROR)
+
+    def test_quantile_summary_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            csv_filepath = os.path.join(tmpdir, 'heart-rate.csv')
+            summary_filepath = os.path.join(tmpdir, 'heart-rate-summary.csv')
+
+            with open(csv_filepath, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=hd.Fieldnames_Record)
+                writer.writeheader()
+
+                for i, device in enumerate(['Apple Watch', 'iPhone', 'Apple Watch', 'Apple Watch']):
+                    writer.writerow({hd.FIELD_TYPE: hd.HK_REC_TYPE_HeartRate, hd.FIELD_UNIT: 'count/min',
+                                     hd.FIELD_VALUE: 60 + i, hd.FIELD_SOURCE_NAME: 'Watch',
+                                     hd.FIELD_SOURCE_VERSION: '',
+                                     hd.FIELD_DEVICE: f"<<HKDevice: 0x1>, name:{device}, model:{device}>",
+                                     hd.FIELD_CREATION_DATE: '2020-10-01 08:00:00 -0700',
+                                     hd.FIELD_START_DATE: '2020-10-01 08:00:00 -0700',
+                                     hd.FIELD_END_DATE: '2020-10-01 08:00:00 -0700'})
+
+            create_quantile_summary_file(csv_filepath, summary_filepath, [0.5])
+
+            with open(summary_filepath, 'r', encoding='utf-8') as f:
+                self.assertEqual(list(csv.DictReader(f)), [{'date': '2020-10-01', 'p50': '62.0', 'max': '63.0',
+                                                            'count': '3', 'unit': 'count/min'}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import csv
+import os
+import random
+import tempfile
+import unittest
+from datetime import date
+
+from cls_healthkit import HKRecordQuantityTypeIdentifier
+from cls_rollup_cube import GRANULARITIES, QuantityRollupCube, RollupCell
+from summary_rollup import create_rollup_file
+import constants_apple_health_data as hd
+
+
+def _record(start_date: str, value: float) -> HKRecordQuantityTypeIdentifier:
+    return HKRecordQuantityTypeIdentifier(hd.HK_REC_TYPE_StepCount, 'count', value, 'Watch', '', '',
+                                          start_date, start_date, start_date)
+
+
+def _period(granularity: str, start_date: str) -> str:
+    if granularity == 'week':
+        year, week, _ = date.fromisoformat(start_date[:10]).isocalendar()
+        return f"{year:04}-W{week:02}"
+
+    return start_date[:{'hour': 13, 'day': 10, 'month': 7, 'year': 4}[granularity]]
+
+
+class RollupCubeTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = random.Random(22)
+        days = [date.fromordinal(date(2019, 12, 20).toordinal() + i).isoformat() for i in range(400)]
+        # whole values, so that the sums of any grouping are exact
+        self.records = [_record(f"{rng.choice(days)} {rng.randrange(24):02}:{rng.randrange(60):02}:00 -0700",
+                                float(rng.randrange(1000))) for _ in range(5000)]
+
+    def test_levels_equal_grouped_records(self):
+        cube = QuantityRollupCube(hd.HK_REC_TYPE_StepCount, 'count')
+
+        for record in self.records:
+            cube.tally(record)
+
+        for granularity in GRANULARITIES:
+            expected = {}
+
+            for record in self.records:
+                expected.setdefault(_period(granularity, record.start_date), RollupCell()).add(record.value)
+
+            self.assertEqual(cube.cells(granularity), sorted(expected.items()), granularity)
+
+        # the ISO week 53 of 2020 ends in 2021
+        week = RollupCell()
+
+        for _, cell in cube.cells('day', '2020-12-28', '2021-01-03'):
+            week.merge(cell)
+
+        self.assertEqual(cube.cell('week', '2020-W53'), week)
+        self.assertEqual([period for period, _ in cube.cells('month', '2020-02', '2020-04')],
+                         ['2020-02', '2020-03', '2020-04'])
+        self.assertEqual(cube.periods('year'), ['2019', '2020', '2021'])
+
+        records = cube.collect('year')
+        self.assertEqual(sum(record.count for record in records), len(self.records))
+        self.assertEqual(records[0].mean, records[0].sum / records[0].count)
+
+    def test_levels_follow_tallies(self):
+        cube = QuantityRollupCube(hd.HK_REC_TYPE_StepCount, 'count')
+        cube.tally(_record('2020-12-31 23:00:00 -0800', 10))
+        self.assertEqual(cube.periods('week'), ['2020-W53'])
+
+        cube.tally(_record('2021-01-04 00:30:00 -0800', 5))
+        self.assertEqual(cube.periods('week'), ['2020-W53', '2021-W01'])
+        self.assertEqual(cube.cell('year', '2021'), RollupCell(1, 5.0, 5.0, 5.0))
+
+        with self.assertRaises(ValueError):
+            cube.periods('quarter')
+
+    def test_merge(self):
+        cube = QuantityRollupCube(hd.HK_REC_TYPE_StepCount, 'count')
+        first = QuantityRollupCube(hd.HK_REC_TYPE_StepCount, 'count')
+        second = QuantityRollupCube(hd.HK_REC_TYPE_StepCount, 'count')
+
+        for i, record in enumerate(self.records):
+            cube.tally(record)
+            (first if i % 3 else second).tally(record)
+
+        merged = QuantityRollupCube.from_dict(first.to_dict()).merge(second)
+
+        for granularity in GRANULARITIES:
+            self.assertEqual(merged.cells(granularity), cube.cells(granularity), granularity)
+
+        with self.assertRaises(ValueError):
+            merged.merge(QuantityRollupCube(hd.HK_REC_TYPE_StepCount, 'km'))
+
+    def test_rollup_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            csv_filepath = os.path.join(tmpdir, 'step-count.csv')
+            rollup_filepath = os.path.join(tmpdir, 'step-count-rollup.csv')
+
+            with open(csv_filepath, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=hd.Fieldnames_Record)
+                writer.writeheader()
+
+                for record in self.records[:100]:
+                    writer.writerow({hd.FIELD_TYPE: record.type, hd.FIELD_UNIT: record.unit,
+                                     hd.FIELD_VALUE: record.value, hd.FIELD_SOURCE_NAME: record.source_name,
+                                     hd.FIELD_SOURCE_VERSION: '', hd.FIELD_DEVICE: '',
+                                     hd.FIELD_CREATION_DATE: record.start_date,
+                                     hd.FIELD_START_DATE: record.start_date, hd.FIELD_END_DATE: record.end_date})
+
+            create_rollup_file(csv_filepath, rollup_filepath, ['month', 'year'])
+
+            with open(rollup_filepath, 'r', encoding='utf-8') as f:
+                rows = list(csv.DictReader(f))
+
+            self.assertEqual({row['granularity'] for row in rows}, {'month', 'year'})
+            self.assertEqual(sum(int(row['count']) for row in rows if row['granularity'] == 'year'), 100)
+            self.assertEqual(sum(float(row['sum']) for row in rows if row['granularity'] == 'month'),
+                             sum(record.value for record in self.records[:100]))
+
+
+if __name__ == '__main__':
+    unittest.main()
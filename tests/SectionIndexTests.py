@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+
+from cls_apple_health_xml_index import AppleHealthDataSectionIndex
+from cls_apple_health_xml_streams import AppleHealthDataRecordTypeStream, AppleHealthDataWorkoutStream
+
+EXPORT_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE HealthData [
+<!ELEMENT HealthData (ExportDate,Me,(Record|Correlation|Workout|ActivitySummary|ClinicalRecord)*)>
+]>
+<HealthData locale="en_US">
+ <ExportDate value="2020-11-01 10:00:00 -0700"/>
+ <Record type="HKQuantityTypeIdentifierHeartRate" sourceName="Watch" unit="count/min" startDate="2020-10-01 08:00:00 -0700" endDate="2020-10-01 08:00:00 -0700" value="61"/>
+ <Record type="HKQuantityTypeIdentifierHeartRate" sourceName="Watch" unit="count/min" startDate="2020-10-01 08:05:00 -0700" endDate="2020-10-01 08:05:00 -0700" value="62">
+  <MetadataEntry key="HKMetadataKeyHeartRateMotionContext" value="0"/>
+ </Record>
+ <Record type="HKQuantityTypeIdentifierVO2Max" sourceName="Watch" unit="mL/min·kg" startDate="2020-10-01 09:00:00 -0700" endDate="2020-10-01 09:00:00 -0700" value="45.1"/>
+ <Record type="HKQuantityTypeIdentifierHeartRate" sourceName="Watch" unit="count/min" startDate="2020-10-02 08:00:00 -0700" endDate="2020-10-02 08:00:00 -0700" value="63"/>
+ <Workout workoutActivityType="HKWorkoutActivityTypeRunning" sourceName="Watch" startDate="2020-10-01 07:00:00 -0700" endDate="2020-10-01 07:30:00 -0700">
+  <MetadataEntry key="HKIndoorWorkout" value="0"/>
+ </Workout>
+</HealthData>
+"""
+
+
+class SectionIndexTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.xml_filepath = os.path.join(self.tmpdir.name, 'export.xml')
+
+        with open(self.xml_filepath, 'w', encoding='utf-8') as f:
+            f.write(EXPORT_XML)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_sections(self):
+        index = AppleHealthDataSectionIndex.build(self.xml_filepath)
+        self.assertEqual(len(index.sections('HKQuantityTypeIdentifierHeartRate')), 2)
+        self.assertEqual(len(index.sections('HKQuantityTypeIdentifierVO2Max')), 1)
+        self.assertEqual(len(index.sections('Workout')), 1)
+        self.assertEqual(index.sections('ActivitySummary'), [])
+
+    def test_section_bytes(self):
+        index = AppleHealthDataSectionIndex.build(self.xml_filepath)
+        start, end = index.sections('HKQuantityTypeIdentifierVO2Max')[0]
+
+        with open(self.xml_filepath, 'rb') as f:
+            f.seek(start)
+            self.assertTrue(f.read(end - start).strip().startswith(b'<Record type="HKQuantityTypeIdentifierVO2Max"'))
+
+    def test_load_missing_index(self):
+        self.assertIsNone(AppleHealthDataSectionIndex.load(self.xml_filepath))
+
+    def test_load_stale_index(self):
+        AppleHealthDataSectionIndex.load_or_build(self.xml_filepath)
+        self.assertIsNotNone(AppleHealthDataSectionIndex.load(self.xml_filepath))
+
+        with open(self.xml_filepath, 'a', encoding='utf-8') as f:
+            f.write('\n')
+
+        self.assertIsNone(AppleHealthDataSectionIndex.load(self.xml_filepath))
+
+    def test_indexed_record_stream(self):
+        values = [elem.get('value') for elem in
+                  AppleHealthDataRecordTypeStream(self.xml_filepath, 'HKQuantityTypeIdentifierHeartRate')]
+        AppleHealthDataSectionIndex.load_or_build(self.xml_filepath)
+        indexed_values = [elem.get('value') for elem in
+                          AppleHealthDataRecordTypeStream(self.xml_filepath, 'HKQuantityTypeIdentifierHeartRate')]
+
+        # without the index, the stream stops at the end of the first cluster
+        self.assertEqual(values, ['61', '62'])
+        self.assertEqual(indexed_values, ['61', '62', '63'])
+
+    def test_indexed_workout_stream(self):
+        AppleHealthDataSectionIndex.load_or_build(self.xml_filepath)
+        workouts = list(AppleHealthDataWorkoutStream(self.xml_filepath))
+        self.assertEqual(len(workouts), 1)
+        self.assertEqual(len(workouts[0].findall('MetadataEntry')), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import contextlib
+import io
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from cls_apple_health_etl_sqlite import AppleHealthDataSqliteDatabase, RECORD_TABLE
+from etl_sqlite_all_datasets import load_datasets
+
+EXPORT_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<HealthData locale="en_US">
+ <ExportDate value="2020-11-01 10:00:00 -0700"/>
+ <Record type="HKQuantityTypeIdentifierStepCount" sourceName="Watch" unit="count" creationDate="2020-10-01 09:00:00 -0700" startDate="2020-10-01 08:00:00 -0700" endDate="2020-10-01 08:30:00 -0700" value="100"/>
+ <Record type="HKQuantityTypeIdentifierStepCount" sourceName="Watch" unit="count" creationDate="2020-10-02 09:00:00 -0700" startDate="2020-10-02 08:00:00 -0700" endDate="2020-10-02 08:30:00 -0700" value="250"/>
+ <Record type="HKQuantityTypeIdentifierHeartRate" sourceName="Watch" unit="count/min" creationDate="2020-10-01 09:00:00 -0700" startDate="2020-10-01 08:00:00 -0700" endDate="2020-10-01 08:00:00 -0700" value="64.5"/>
+ <Workout workoutActivityType="HKWorkoutActivityTypeRunning" duration="30.5" durationUnit="min" totalDistance="3.1" totalDistanceUnit="mi" totalEnergyBurned="310" totalEnergyBurnedUnit="Cal" sourceName="Watch" sourceVersion="7.0.1" creationDate="2020-10-01 08:05:12 -0700" startDate="2020-10-01 07:31:00 -0700" endDate="2020-10-01 08:01:30 -0700">
+  <MetadataEntry key="HKIndoorWorkout" value="0"/>
+  <MetadataEntry key="HKTimeZone" value="America/Los_Angeles"/>
+ </Workout>
+ <ActivitySummary dateComponents="2020-10-01" activeEnergyBurned="400.5" activeEnergyBurnedGoal="500" activeEnergyBurnedUnit="Cal"/>
+</HealthData>
+"""
+
+
+class SqliteEtlTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.xml_filepath = os.path.join(self.tmpdir.name, 'export.xml')
+        self.db_filepath = os.path.join(self.tmpdir.name, 'health.db')
+
+        with open(self.xml_filepath, 'w', encoding='utf-8') as f:
+            f.write(EXPORT_XML)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def load(self, batch_size: int):
+        with contextlib.redirect_stdout(io.StringIO()):
+            load_datasets(self.xml_filepath, self.db_filepath, None, None, False, False, batch_size=batch_size)
+
+    def query(self, sql: str):
+        connection = sqlite3.connect(self.db_filepath)
+
+        try:
+            return connection.execute(sql).fetchall()
+        finally:
+            connection.close()
+
+    def test_load(self):
+        self.load(batch_size=1)
+        # loading again replaces the rows of the previous load
+        self.load(batch_size=1000)
+
+        self.assertEqual(self.query("SELECT type, SUM(value) FROM record GROUP BY type ORDER BY type"),
+                         [('HKQuantityTypeIdentifierHeartRate', 64.5), ('HKQuantityTypeIdentifierStepCount', 350.0)])
+        self.assertEqual(self.query("SELECT duration, HKIndoorWorkout, HKTimeZone, HKAverageMETs FROM workout"),
+                         [(30.5, '0', 'America/Los_Angeles', None)])
+        self.assertEqual(self.query("SELECT dateComponents, activeEnergyBurned FROM activity_summary"),
+                         [('2020-10-01', 400.5)])
+        self.assertEqual(sorted(name for name, in self.query("SELECT name FROM sqlite_master WHERE type = 'index'")),
+                         ['activity_summary_date', 'record_type_start_date', 'workout_activity_start_date'])
+
+    def test_rollback(self):
+        self.load(batch_size=1000)
+
+        with self.assertRaises(RuntimeError):
+            with AppleHealthDataSqliteDatabase(self.db_filepath) as database:
+                database.delete(RECORD_TABLE)
+                raise RuntimeError('failed load')
+
+        self.assertEqual(self.query("SELECT COUNT(*) FROM record"), [(3,)])
+
+
+if __name__ == '__main__':
+    unittest.main()
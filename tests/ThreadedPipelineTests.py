@@ -0,0 +1,76 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from cls_apple_health_etl_csv import AppleHealthStepCountETLCsv
+from cls_threaded_pipeline import ThreadedPipeline
+
+EXPORT_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<HealthData locale="en_US">
+ <ExportDate value="2020-11-01 10:00:00 -0700"/>
+{0}</HealthData>
+"""
+
+STEPS = """ <Record type="HKQuantityTypeIdentifierStepCount" sourceName="Watch" unit="count" creationDate="2020-10-01 09:00:00 -0700" startDate="2020-10-01 08:00:{0:02} -0700" endDate="2020-10-01 08:30:00 -0700" value="{0}"/>
+"""
+
+
+def failing_source(count: int):
+    yield from range(count)
+    raise KeyError('source failed')
+
+
+class ThreadedPipelineTestCase(unittest.TestCase):
+    def test_stages_keep_order(self):
+        pipeline = ThreadedPipeline(range(1000), batch_size=7, queue_size=2)
+        pipeline.stage('square', lambda batch: [i * i for i in batch])
+        pipeline.stage('odd', lambda batch: [i for i in batch if i % 2])
+        self.assertEqual(list(pipeline), [i * i for i in range(1000) if i % 2])
+
+        source, square, odd = pipeline.stats
+        self.assertEqual((source.name, source.batches, source.items), ('source', 143, 1000))
+        self.assertEqual(odd.items, 500)
+        self.assertLessEqual(square.max_depth, 2)
+
+    def test_exceptions_propagate(self):
+        with self.assertRaises(KeyError):
+            list(ThreadedPipeline(failing_source(10), batch_size=3))
+
+        pipeline = ThreadedPipeline(range(10), batch_size=3).stage('divide', lambda batch: [1 / i for i in batch])
+
+        with self.assertRaises(ZeroDivisionError):
+            list(pipeline)
+
+    def test_close_stops_blocked_stages(self):
+        thread_count = threading.active_count()
+
+        with ThreadedPipeline(iter(range(1000000)), batch_size=1, queue_size=1) as pipeline:
+            self.assertEqual(next(iter(pipeline)), 0)
+
+        self.assertEqual(threading.active_count(), thread_count)
+
+    def test_pipelined_serialize(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            xml_filepath = os.path.join(tmpdir, 'export.xml')
+
+            with open(xml_filepath, 'w', encoding='utf-8') as f:
+                f.write(EXPORT_XML.format(''.join(STEPS.format(i) for i in range(60))))
+
+            contents = []
+
+            for pipelined in (False, True):
+                csv_filepath = os.path.join(tmpdir, f"steps-{pipelined}.csv")
+                etl = AppleHealthStepCountETLCsv(xml_filepath, csv_filepath, None, None)
+                etl.serialize(pipelined=pipelined)
+
+                with open(csv_filepath, 'r', encoding='utf-8') as f:
+                    contents.append(f.read())
+
+            self.assertEqual(contents[0], contents[1])
+            self.assertEqual(contents[1].count('\n'), 61)
+            self.assertEqual(etl.pipeline_stats[0].items, 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
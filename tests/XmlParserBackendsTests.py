@@ -0,0 +1,118 @@
+import io
+import os
+import tempfile
+import unittest
+
+from cls_apple_health_xml_parsers import ETREE_BACKEND, EXPAT_BACKEND, REGEX_BACKEND, regex_record_rows
+from cls_apple_health_xml_streams import (AppleHealthDataElementsStream, AppleHealthDataRecordTypeRowsStream,
+                                          AppleHealthDataRecordTypeStream)
+from utils import element_to_dict
+
+EXPORT_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE HealthData [
+<!-- Note: Any Records that appear as children of a correlation also appear as top-level records. -->
+<!ELEMENT HealthData (ExportDate,Me,(Record|Correlation|Workout|ActivitySummary|ClinicalRecord)*)>
+<!ATTLIST HealthData
+  locale CDATA #REQUIRED
+>
+]>
+<HealthData locale="en_US">
+ <ExportDate value="2020-11-01 10:00:00 -0700"/>
+ <Me HKCharacteristicTypeIdentifierDateOfBirth="" HKCharacteristicTypeIdentifierBiologicalSex="HKBiologicalSexMale"/>
+ <Record type="HKQuantityTypeIdentifierHeartRate" sourceName="Joe&#8217;s Watch &amp; Co" unit="count/min" device="&lt;&lt;HKDevice: 0x283e&gt;, name:Apple Watch&gt;&gt;" startDate="2020-10-01 08:00:00 -0700" endDate="2020-10-01 08:00:00 -0700" value="61"/>
+ <Record type="HKQuantityTypeIdentifierHeartRate" sourceName="Watch" unit="count/min" startDate="2020-10-01 08:05:00 -0700" endDate="2020-10-01 08:05:00 -0700" value="62">
+  <MetadataEntry key="HKMetadataKeyHeartRateMotionContext" value="line&#10;break	tab"/>
+ </Record>
+ <Record type="HKQuantityTypeIdentifierHeartRateVariabilitySDNN" sourceName="Watch" unit="ms" startDate="2020-10-01 08:06:00 -0700" endDate="2020-10-01 08:07:00 -0700" value="41.5">
+  <HeartRateVariabilityMetadataList>
+   <InstantaneousBeatsPerMinute bpm="64" time="8:06:01.23 AM"/>
+  </HeartRateVariabilityMetadataList>
+ </Record>
+ <Correlation type="HKCorrelationTypeIdentifierBloodPressure" sourceName="x" startDate="2020-10-01 07:00:00 -0700" endDate="2020-10-01 07:00:00 -0700">
+  <Record type="HKQuantityTypeIdentifierHeartRate" sourceName="x" unit="count/min" startDate="2020-10-01 07:00:00 -0700" endDate="2020-10-01 07:00:00 -0700" value="70"/>
+ </Correlation>
+ <Workout workoutActivityType="HKWorkoutActivityTypeRunning" sourceName="Watch" startDate="2020-10-01 07:00:00 -0700" endDate="2020-10-01 07:30:00 -0700">
+  <MetadataEntry key="HKIndoorWorkout" value="0"/>
+  <WorkoutEvent type="HKWorkoutEventTypeSegment" date="2020-10-01 07:10:00 -0700"/>
+ </Workout>
+ <ActivitySummary dateComponents="2020-10-01" activeEnergyBurned="500.5" activeEnergyBurnedUnit="Cal"/>
+</HealthData>
+"""
+
+
+def describe(elem):
+    return elem.tag, element_to_dict(elem), [describe(child) for child in elem]
+
+
+class XmlParserBackendsTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.xml_filepath = os.path.join(self.tmpdir.name, 'export.xml')
+
+        with open(self.xml_filepath, 'w', encoding='utf-8') as f:
+            f.write(EXPORT_XML)
+
+        self.expected = [describe(elem) for elem in AppleHealthDataElementsStream(self.xml_filepath)]
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_expat_backend(self):
+        elements = [describe(elem) for elem in AppleHealthDataElementsStream(self.xml_filepath, EXPAT_BACKEND)]
+        self.assertEqual(elements, self.expected)
+
+    def test_regex_backend(self):
+        elements = [describe(elem) for elem in AppleHealthDataElementsStream(self.xml_filepath, REGEX_BACKEND)]
+        self.assertEqual(elements, self.expected)
+
+    def test_regex_backend_file_object(self):
+        with open(self.xml_filepath, 'rb') as f:
+            elements = [describe(elem) for elem in
+                        AppleHealthDataElementsStream(io.BytesIO(f.read()), REGEX_BACKEND)]
+
+        self.assertEqual(elements, self.expected)
+
+    def test_record_type_stream(self):
+        record_type = 'HKQuantityTypeIdentifierHeartRate'
+        expected = [describe(elem) for elem in AppleHealthDataRecordTypeStream(self.xml_filepath, record_type)]
+        self.assertEqual(len(expected), 2)
+
+        for backend in (EXPAT_BACKEND, REGEX_BACKEND):
+            elements = [describe(elem) for elem in
+                        AppleHealthDataRecordTypeStream(self.xml_filepath, record_type, backend)]
+            self.assertEqual(elements, expected, backend)
+
+    def test_record_type_rows_stream(self):
+        for record_type in ('HKQuantityTypeIdentifierHeartRate', 'HKQuantityTypeIdentifierHeartRateVariabilitySDNN',
+                            'HKQuantityTypeIdentifierStepCount'):
+            expected = [element_to_dict(elem) for elem in
+                        AppleHealthDataRecordTypeStream(self.xml_filepath, record_type)]
+
+            for backend in (ETREE_BACKEND, EXPAT_BACKEND, REGEX_BACKEND):
+                with AppleHealthDataRecordTypeRowsStream(self.xml_filepath, record_type, backend) as rows:
+                    self.assertEqual(list(rows), expected, (record_type, backend))
+
+    def test_regex_record_rows_blocks(self):
+        record_type = 'HKQuantityTypeIdentifierHeartRate'
+        expected = [element_to_dict(elem) for elem in AppleHealthDataRecordTypeStream(self.xml_filepath, record_type)]
+        self.assertEqual(expected[0]['sourceName'], 'Joe\u2019s Watch & Co')
+        self.assertEqual(expected[0]['device'], '<<HKDevice: 0x283e>, name:Apple Watch>>')
+
+        with open(self.xml_filepath, 'rb') as f:
+            data = f.read()
+
+        for block_size in (7, 64, 1024):
+            self.assertEqual(list(regex_record_rows(io.BytesIO(data), record_type, block_size)), expected, block_size)
+            self.assertEqual(list(regex_record_rows(self.xml_filepath, record_type, block_size)), expected, block_size)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            AppleHealthDataElementsStream(self.xml_filepath, 'sax')
+
+    def test_etree_backend_is_default(self):
+        elements = [describe(elem) for elem in AppleHealthDataElementsStream(self.xml_filepath, ETREE_BACKEND)]
+        self.assertEqual(elements, self.expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,17 @@
 from calendar import monthrange
-from datetime import datetime
-from typing import Any, Callable, Dict, Generator, Set, Optional, Union
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, BinaryIO, Callable, Dict, Generator, List, Set, Optional, Tuple, Union
 import csv
-import re
+import gzip
+import math
+import os
+import time
 import xml.etree.ElementTree as et
+import zipfile
 
+from cls_apple_health_devices import device_registry
+from cls_compressed_files import open_text_input, open_text_output
 from cls_healthkit import HK_APPLE_DATETIME_FORMAT
 import constants_apple_health_data as hd
 
@@ -16,22 +23,26 @@ __all__ = [
     'is_device_watch',
     'ymd_path_str',
     'localize_apple_health_datetime_str',
+    'apple_health_datetime_to_epoch',
+    'epoch_to_local_apple_health_datetime_str',
     'get_apple_health_metadata_entries',
     'workout_element_to_dict',
     'localize_dates_health_data',
     'element_to_dict',
     'weighin_date_group_key',
-    'csvdict_generator'
+    'csvdict_generator',
+    'is_compressed_export',
+    'open_health_export_xml'
 ]
 
 
-_re_iPhone_device = re.compile(r'.+HKDevice:.+, name:iPhone,')
-
-
 def between_dates_predicate(start_date: datetime, end_date: datetime) \
-        -> Callable[[datetime], bool]:
+        -> Callable[[Union[str, int, datetime]], bool]:
     """Returns a function that tests if a date is between two dates.
        Dates are converted to local timezone
+
+       The bounds are converted to epochs once, so a date string in HK_APPLE_DATETIME_FORMAT
+       or an epoch is tested by integer comparisons.
     """
     if start_date > end_date:
         raise ValueError('start_date is later than end_date.')
@@ -39,13 +50,19 @@ def between_dates_predicate(start_date: datetime, end_date: datetime) \
     local_start: datetime = start_date.astimezone()
     local_end: datetime = end_date.astimezone()
 
-    def _between_local_dates(given_date: Union[str, datetime]) -> bool:
+    # the dates of the strings and epochs are whole seconds
+    start_epoch = math.ceil(local_start.timestamp())
+    end_epoch = math.floor(local_end.timestamp())
+
+    def _between_local_dates(given_date: Union[str, int, datetime]) -> bool:
         if isinstance(given_date, str):
-            given_date = datetime.strptime(given_date, HK_APPLE_DATETIME_FORMAT)
-        elif not isinstance(given_date, datetime):
-            raise TypeError("date's type must be a str or datetime.datetime object.")
+            return start_epoch <= apple_health_datetime_to_epoch(given_date) <= end_epoch
+        elif isinstance(given_date, datetime):
+            return local_start <= given_date.astimezone() <= local_end
+        elif isinstance(given_date, int):
+            return start_epoch <= given_date <= end_epoch
 
-        return local_start <= given_date.astimezone() <= local_end
+        raise TypeError("date's type must be a str, int or datetime.datetime object.")
     return _between_local_dates
 
 
@@ -56,12 +73,12 @@ def date_in_month_predicate(year: int, month: int) -> Callable[[datetime], bool]
 
 
 def is_device_iphone(device: str) -> bool:
-    return _re_iPhone_device.search(device) is not None
+    return device_registry.is_iphone(device)
 
 
 def is_device_watch(device: str) -> bool:
     """Apple watch can also transmit exercise data from exercise equipment, e.g., treadmill"""
-    return not is_device_iphone(device)
+    return device_registry.is_watch(device)
 
 
 def always_true(x: Any) -> bool:
@@ -74,14 +91,122 @@ def ymd_path_str(year, month, day: Optional[int] = None):
     return ym if day is None else f'{ym}{day:02}'
 
 
+# HK_APPLE_DATETIME_FORMAT has a fixed layout, e.g., 2020-10-01 08:00:00 -0700, so the dates are parsed by slicing.
+# The local timezone's utc offset is memoized per day and utc offset of the dates; a date whose utc offset is the
+# local one is already localized.
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_SECONDS_PER_DAY = 86400
+
+_times_of_day: List[str] = []
+_seconds_of_day: Dict[str, int] = {}
+
+
+def _load_times_of_day():
+    _times_of_day.extend(f"{hour:02}:{minute:02}:{second:02}"
+                         for hour in range(24) for minute in range(60) for second in range(60))
+    _seconds_of_day.update((time_of_day, seconds) for seconds, time_of_day in enumerate(_times_of_day))
+
+
+@lru_cache(maxsize=1 << 16)
+def _days_to_ymd(days: int) -> str:
+    return date.fromordinal(days + _EPOCH_ORDINAL).isoformat()
+
+
+@lru_cache(maxsize=256)
+def _utc_offset_str(seconds: int) -> str:
+    sign = '-' if seconds < 0 else '+'
+    hours, seconds = divmod(abs(seconds), 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{sign}{hours:02}{minutes:02}{seconds:02}" if seconds else f"{sign}{hours:02}{minutes:02}"
+
+
+@lru_cache(maxsize=1 << 16)
+def _local_day(ymd: str, utc_offset: str) -> Optional[Tuple[int, int, Optional[int]]]:
+    """Returns the epoch of the start of the day in utc_offset, utc_offset in seconds and the local timezone's
+       utc offset throughout the day, None if it changes during the day. Returns None if the strings do not
+       have the layout of HK_APPLE_DATETIME_FORMAT.
+    """
+    if len(ymd) != 10 or ymd[4] != '-' or ymd[7] != '-' or ymd[:4] < '1900' or \
+            len(utc_offset) != 6 or utc_offset[0] != ' ' or utc_offset[1] not in '+-':
+        return None
+
+    digits = ymd[:4] + ymd[5:7] + ymd[8:] + utc_offset[2:]
+
+    if not (digits.isascii() and digits.isdigit()) or int(utc_offset[2:4]) > 23 or int(utc_offset[4:]) > 59:
+        return None
+
+    try:
+        days = date(int(ymd[:4]), int(ymd[5:7]), int(ymd[8:])).toordinal() - _EPOCH_ORDINAL
+    except ValueError:
+        return None
+
+    offset = int(utc_offset[2:4]) * 3600 + int(utc_offset[4:]) * 60
+    offset = -offset if utc_offset[1] == '-' else offset
+    day_start = days * _SECONDS_PER_DAY - offset
+    local_offset = time.localtime(day_start).tm_gmtoff
+
+    if time.localtime(day_start + _SECONDS_PER_DAY - 1).tm_gmtoff != local_offset:
+        local_offset = None
+
+    return day_start, offset, local_offset
+
+
+def _format_local_datetime(epoch: int, local_offset: int) -> str:
+    days, seconds = divmod(epoch + local_offset, _SECONDS_PER_DAY)
+    return f"{_days_to_ymd(days)} {_times_of_day[seconds]} {_utc_offset_str(local_offset)}"
+
+
+def apple_health_datetime_to_epoch(dt: str) -> int:
+    if not _times_of_day:
+        _load_times_of_day()
+
+    day = _local_day(dt[:10], dt[19:])
+    seconds = _seconds_of_day.get(dt[11:19])
+
+    if day is None or seconds is None or dt[10] != ' ':
+        return int(datetime.strptime(dt, HK_APPLE_DATETIME_FORMAT).timestamp())
+
+    return day[0] + seconds
+
+
+def epoch_to_local_apple_health_datetime_str(epoch: int) -> str:
+    """Formats epoch in the local timezone like datetime.astimezone().strftime(HK_APPLE_DATETIME_FORMAT)."""
+    if not _times_of_day:
+        _load_times_of_day()
+
+    return _format_local_datetime(epoch, time.localtime(epoch).tm_gmtoff)
+
+
 def localize_apple_health_datetime_str(dt: str):
-    return datetime.strptime(dt, HK_APPLE_DATETIME_FORMAT).astimezone().strftime(HK_APPLE_DATETIME_FORMAT)
+    if not _times_of_day:
+        _load_times_of_day()
+
+    day = _local_day(dt[:10], dt[19:])
+    seconds = _seconds_of_day.get(dt[11:19])
+
+    if day is None or seconds is None or dt[10] != ' ':
+        return datetime.strptime(dt, HK_APPLE_DATETIME_FORMAT).astimezone().strftime(HK_APPLE_DATETIME_FORMAT)
 
+    day_start, offset, local_offset = day
 
-def localize_dates_health_data(health_data: Dict[str, str]):
-    health_data[hd.FIELD_CREATION_DATE] = localize_apple_health_datetime_str(health_data[hd.FIELD_CREATION_DATE])
-    health_data[hd.FIELD_START_DATE] = localize_apple_health_datetime_str(health_data[hd.FIELD_START_DATE])
-    health_data[hd.FIELD_END_DATE] = localize_apple_health_datetime_str(health_data[hd.FIELD_END_DATE])
+    if local_offset == offset and dt[20:] == _utc_offset_str(local_offset):
+        # dt is in local time, written as strftime writes it, e.g., not -0000 for +0000
+        return dt
+
+    if local_offset is None:
+        return epoch_to_local_apple_health_datetime_str(day_start + seconds)
+
+    return _format_local_datetime(day_start + seconds, local_offset)
+
+
+def localize_dates_health_data(health_data: Dict[str, str], as_epoch: bool = False):
+    """Localizes the creation, start and end dates of the health data; if as_epoch is set,
+       the dates are replaced by their epoch instead.
+    """
+    convert = apple_health_datetime_to_epoch if as_epoch else localize_apple_health_datetime_str
+    health_data[hd.FIELD_CREATION_DATE] = convert(health_data[hd.FIELD_CREATION_DATE])
+    health_data[hd.FIELD_START_DATE] = convert(health_data[hd.FIELD_START_DATE])
+    health_data[hd.FIELD_END_DATE] = convert(health_data[hd.FIELD_END_DATE])
     return health_data
 
 
@@ -105,7 +230,8 @@ def get_apple_health_metadata_entries(elem: et.Element,
 
 
 def stream_to_csv(csv_path: str, fieldnames, generator: Generator[Dict[str, str], None, None], encoding: str = 'utf-8'):
-    with open(csv_path, 'w', encoding=encoding) as ostream:
+    # a .gz, .bz2 or .xz csv_path is compressed
+    with open_text_output(csv_path, 'w', encoding=encoding) as ostream:
         wrtr = csv.DictWriter(ostream, fieldnames=fieldnames)
         wrtr.writeheader()
 
@@ -138,7 +264,48 @@ def weighin_date_group_key(ymd_date: str) -> str:
 
 
 def csvdict_generator(filepath: str) -> Generator[Dict[str, Any], None, None]:
-    with open(filepath, "r") as f1:
+    # a .gz, .bz2 or .xz file is decompressed as it is read
+    with open_text_input(filepath) as f1:
         rdr = csv.DictReader(f1)
         for row in rdr:
             yield row
+
+
+def is_compressed_export(filepath: Union[str, os.PathLike]) -> bool:
+    return str(filepath).lower().endswith(('.zip', '.gz'))
+
+
+def _export_archive_member(archive: zipfile.ZipFile, member: str) -> str:
+    default_name = f"{hd.EXPORT_ARCHIVE_FOLDER}/{member}"
+    names = archive.namelist()
+
+    if default_name in names:
+        return default_name
+
+    # the export folder is named differently in some exports
+    candidates = sorted((name for name in names if name == member or name.endswith(f"/{member}")), key=len)
+
+    if not candidates:
+        raise ValueError(f'{member} is not found in {archive.filename}.')
+
+    return candidates[0]
+
+
+def open_health_export_xml(filepath: Union[str, os.PathLike], member: str = hd.EXPORT_XML) -> BinaryIO:
+    """Opens an xml file of the Apple Health export as a binary stream.
+
+       filepath can be the xml file, a gzip-compressed xml file (.gz) or the export archive (.zip);
+       member selects the xml file of the archive, e.g., export.xml or export_cda.xml.
+       Compressed files are decompressed as they are read.
+    """
+    lower_filepath = str(filepath).lower()
+
+    if lower_filepath.endswith('.gz'):
+        return gzip.open(filepath, 'rb')
+
+    if lower_filepath.endswith('.zip'):
+        # the member keeps the archive's file open after the archive is closed
+        with zipfile.ZipFile(filepath) as archive:
+            return archive.open(_export_archive_member(archive, member))
+
+    return open(filepath, 'rb')